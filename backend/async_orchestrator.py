@@ -0,0 +1,606 @@
+"""
+async_orchestrator.py - asyncio path for the Mapper / Linker / Sentinel pipeline
+
+The thread path (orchestrator.discover_relations_orchestrated) parks one
+thread per in-flight Bedrock call in three ThreadPoolExecutors (5 + 5 + 6
+workers per job). This module runs the same streaming dataflow
+(orchestrator.StreamingRun) as tasks on ONE process-wide event loop:
+
+  - AsyncBedrockClient — Converse over a pooled keep-alive HTTP/1.1
+    connection per request, SigV4-signed with botocore; no thread per call
+  - a semaphore per role bounds in-flight Mapper / Linker / Sentinel calls
+  - the process-wide AdaptiveRateLimiter (rate_limiter.py), shared with the
+    thread path: per-model budgets, backs off on ThrottlingException
+  - run_orchestration(job_id, ...) submits a job to the loop and blocks the
+    calling pipeline thread; cancel_orchestration(job_id) cancels the job's
+    task, which cancels every in-flight request (their sockets are closed)
+
+Everything between the LLM calls (triage, tier buckets, taint gate, result
+cache, edge dedupe) is StreamingRun, so both paths produce the same node
+updates and edges.
+
+Selected in main.py with ORCHESTRATOR_MODE=async. Limits:
+  ASYNC_CONCURRENCY_MAPPER / _LINKER / _SENTINEL  in-flight calls per role
+  ASYNC_MAX_CONNECTIONS                            pooled connections per client
+  BEDROCK_CALLS_PER_SECOND / _TOKENS_PER_MINUTE    per-model quota (both paths)
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import ssl
+import threading
+import time
+import weakref
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import quote, urlsplit
+
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from botocore.credentials import Credentials
+from botocore.eventstream import EventStreamBuffer
+from langsmith import traceable
+
+import orchestrator as orch
+from orchestrator import (
+    MODEL_ROLES, SYSTEM_PROMPT_MAPPER, SYSTEM_PROMPT_LINKER, SYSTEM_PROMPT_SENTINEL,
+)
+from json_stream import JsonStream, OffSchema
+from rate_limiter import AdaptiveRateLimiter, backoff_delay, estimate_tokens, is_throttle, is_transient
+from reachability import ReachabilityIndex
+from snippet_store import SnippetStore
+
+ROLE_CONCURRENCY = {
+    "mapper":   int(os.getenv("ASYNC_CONCURRENCY_MAPPER", 32)),
+    "linker":   int(os.getenv("ASYNC_CONCURRENCY_LINKER", 64)),
+    "sentinel": int(os.getenv("ASYNC_CONCURRENCY_SENTINEL", 256)),
+}
+MAX_CONNECTIONS = int(os.getenv("ASYNC_MAX_CONNECTIONS", 512))
+
+# ---------------------------------------------------------------------------
+# ASYNC BEDROCK CLIENT
+# ---------------------------------------------------------------------------
+
+class BedrockError(Exception):
+    """Non-2xx Converse response; `code` is the AWS error type (e.g. ThrottlingException)."""
+
+    def __init__(self, status: int, code: str, message: str):
+        super().__init__(f"{code} ({status}): {message}")
+        self.status  = status
+        self.code    = code
+        self.message = message
+
+    @property
+    def retryable(self) -> bool:
+        return self.status == 429 or self.status >= 500 or self.code == "ThrottlingException"
+
+
+class AsyncBedrockClient:
+    """
+    Minimal Bedrock Runtime Converse client on asyncio streams. Idle
+    keep-alive connections are pooled; a request that is cancelled or fails
+    closes its connection instead of returning it.
+    """
+
+    def __init__(self, region: Optional[str] = None, endpoint_url: Optional[str] = None,
+                 access_key: Optional[str] = None, secret_key: Optional[str] = None,
+                 session_token: Optional[str] = None, max_connections: int = MAX_CONNECTIONS):
+        self.region   = region or os.getenv("AWS_REGION", "us-east-1")
+        endpoint_url  = endpoint_url or os.getenv("BEDROCK_ENDPOINT_URL") \
+            or f"https://bedrock-runtime.{self.region}.amazonaws.com"
+        parts         = urlsplit(endpoint_url)
+        self.endpoint = endpoint_url.rstrip("/")
+        self.host     = parts.hostname
+        self.tls      = parts.scheme == "https"
+        self.port     = parts.port or (443 if self.tls else 80)
+        self.netloc   = parts.netloc
+        self._signer  = SigV4Auth(Credentials(
+            access_key or os.getenv("AWS_ACCESS_KEY_ID"),
+            secret_key or os.getenv("AWS_SECRET_ACCESS_KEY"),
+            session_token or os.getenv("AWS_SESSION_TOKEN"),
+        ), "bedrock", self.region)
+        self._ssl     = ssl.create_default_context() if self.tls else None
+        self._idle: List[Tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+        self._slots   = asyncio.Semaphore(max_connections)
+
+    def _request(self, modelId: str, operation: str, body: Dict[str, Any]) -> bytes:
+        """Signed HTTP/1.1 request bytes for a Converse / ConverseStream call."""
+        path    = f"/model/{quote(modelId, safe='')}/{operation}"
+        payload = json.dumps(body, separators=(",", ":")).encode()
+        request = AWSRequest(method="POST", url=self.endpoint + path, data=payload,
+                             headers={"Content-Type": "application/json", "Accept": "application/json"})
+        self._signer.add_auth(request)
+        headers = {**dict(request.headers.items()), "Host": self.netloc,
+                   "Content-Length": str(len(payload)), "Connection": "keep-alive"}
+        head = f"POST {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in headers.items()) + "\r\n"
+        return head.encode("latin-1") + payload
+
+    @staticmethod
+    def _error(status: int, headers: Dict[str, str], data: bytes) -> BedrockError:
+        code = headers.get("x-amzn-errortype", "").split(":")[0] or f"HTTP{status}"
+        try:
+            message = json.loads(data).get("message", "")
+        except (ValueError, AttributeError):
+            message = data[:200].decode("utf-8", "replace")
+        return BedrockError(status, code, message)
+
+    async def converse(self, modelId: str, **body) -> Dict[str, Any]:
+        """Same arguments and response shape as boto3's client.converse."""
+        raw = self._request(modelId, "converse", body)
+        async with self._slots:
+            status, response_headers, data = await self._send(raw)
+        if status >= 300:
+            raise self._error(status, response_headers, data)
+        return json.loads(data)
+
+    async def converse_stream(self, modelId: str, **body) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Same arguments as boto3's client.converse_stream; yields the same
+        events ({"contentBlockDelta": ...}, {"messageStop": ...}, {"metadata": ...})
+        as they arrive. Closing the generator early closes the connection.
+        """
+        raw = self._request(modelId, "converse-stream", body)
+        async with self._slots:
+            reader, writer, status, headers = await self._open(raw)
+            complete = False
+            try:
+                if status >= 300:
+                    data = b"".join([chunk async for chunk in self._body(reader, headers)])
+                    complete = True
+                    raise self._error(status, headers, data)
+                buffer = EventStreamBuffer()
+                async for chunk in self._body(reader, headers):
+                    buffer.add_data(chunk)
+                    for message in buffer:
+                        yield self._event(message)
+                complete = True
+            finally:
+                self._release(reader, writer, headers, complete)
+
+    @staticmethod
+    def _event(message) -> Dict[str, Any]:
+        headers = message.headers
+        payload = json.loads(message.payload or b"{}")
+        if headers.get(":message-type") == "event":
+            return {headers.get(":event-type"): payload}
+        # An exception inside the stream (e.g. throttlingException mid-answer)
+        code = headers.get(":exception-type") or headers.get(":error-code") or "ModelStreamErrorException"
+        raise BedrockError(200, code[:1].upper() + code[1:],
+                           payload.get("message", "") if isinstance(payload, dict) else "")
+
+    async def _send(self, raw: bytes) -> Tuple[int, Dict[str, str], bytes]:
+        reader, writer, status, headers = await self._open(raw)
+        complete = False
+        try:
+            data = b"".join([chunk async for chunk in self._body(reader, headers)])
+            complete = True
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            raise ConnectionError(f"Bedrock connection failed: {e}") from e
+        finally:
+            self._release(reader, writer, headers, complete)
+        return status, headers, data
+
+    async def _open(self, raw: bytes) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, int, Dict[str, str]]:
+        """Send `raw`; (reader, writer, status, headers) once the response head is in."""
+        # A pooled connection may have been closed by the server while idle:
+        # retry once on a fresh one when nothing at all came back
+        for attempt in range(2):
+            pooled = bool(self._idle)
+            reader, writer = self._idle.pop() if pooled else await asyncio.open_connection(
+                self.host, self.port, ssl=self._ssl, server_hostname=self.host if self.tls else None)
+            try:
+                writer.write(raw)
+                await writer.drain()
+                status, headers = await self._read_head(reader)
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                writer.close()
+                if pooled and attempt == 0:
+                    continue
+                raise ConnectionError(f"Bedrock connection failed: {e}") from e
+            except BaseException:   # cancelled / timed out mid-response: the socket is unusable
+                writer.close()
+                raise
+            return reader, writer, status, headers
+        raise ConnectionError("Bedrock connection failed")
+
+    def _release(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 headers: Dict[str, str], complete: bool):
+        """Pool the connection if its response was read to the end, else close it."""
+        if complete and headers.get("connection", "").lower() != "close":
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader) -> Tuple[int, Dict[str, str]]:
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError("connection closed")
+        status = int(status_line.split(b" ", 2)[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    @staticmethod
+    async def _body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> AsyncIterator[bytes]:
+        """The response body as it arrives (chunked or Content-Length)."""
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await reader.readline()).split(b";")[0].strip(), 16)
+                if size == 0:
+                    await reader.readline()
+                    return
+                yield await reader.readexactly(size)
+                await reader.readexactly(2)
+        remaining = int(headers.get("content-length", 0))
+        while remaining:
+            chunk = await reader.read(min(remaining, 65536))
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", remaining)
+            remaining -= len(chunk)
+            yield chunk
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+# ---------------------------------------------------------------------------
+# LIMITS — per-role semaphores + the shared adaptive rate limiter
+# ---------------------------------------------------------------------------
+
+class AsyncLimits:
+    """Concurrency and rate bounds shared by every job on one event loop."""
+
+    def __init__(self, concurrency: Optional[Dict[str, int]] = None,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None):
+        self.concurrency = {**ROLE_CONCURRENCY, **(concurrency or {})}
+        self.roles  = {role: asyncio.Semaphore(n) for role, n in self.concurrency.items()}
+        self._rate  = rate_limiter
+        self.in_flight      = 0
+        self.peak_in_flight = 0
+
+    @property
+    def rate(self) -> AdaptiveRateLimiter:
+        # Thread-safe and loop-agnostic: by default the same per-model budgets
+        # as the thread path, so both modes back off together on throttling
+        return self._rate or orch.rate_limiter
+
+
+# asyncio primitives belong to the loop they are first used on
+_loop_limits: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncLimits]" = weakref.WeakKeyDictionary()
+
+def _limits_for_loop() -> AsyncLimits:
+    loop = asyncio.get_running_loop()
+    limits = _loop_limits.get(loop)
+    if limits is None:
+        limits = _loop_limits[loop] = AsyncLimits()
+    return limits
+
+
+@traceable(run_type="llm", project_name="CodeForge")
+async def _call_model_async(client: AsyncBedrockClient, limits: AsyncLimits, role: str,
+                            model_id: str, system_prompt: str, user_prompt: Union[str, List[str]],
+                            temperature: float = 0.1, nodes: int = 0,
+                            stream: Optional[JsonStream] = None) -> str:
+    """
+    Async counterpart of orchestrator._call_model (role semaphore, shared
+    rate, role timeout); with `stream`, through converse_stream.
+    """
+    key      = role.lower()
+    request  = orch._converse_request(model_id, system_prompt, user_prompt, temperature,
+                                      MODEL_ROLES[key]["max_tokens"], orch._use_prompt_cache(client, model_id))
+    estimate = estimate_tokens(request)
+    async with limits.roles[key]:
+        for attempt in range(orch.THROTTLE_RETRIES + 1):
+            await limits.rate.wait_async(model_id, estimate)
+            sent_at = time.monotonic()
+            limits.in_flight += 1
+            limits.peak_in_flight = max(limits.peak_in_flight, limits.in_flight)
+            try:
+                if stream is None:
+                    call = client.converse(**request)
+                else:
+                    stream.reset()
+                    call = _read_stream_async(client.converse_stream(**request), stream)
+                response = await asyncio.wait_for(call, timeout=MODEL_ROLES[key]["timeout_seconds"])
+                break
+            except BedrockError as e:
+                if orch._cache_rejected(request, e) and attempt < orch.THROTTLE_RETRIES:
+                    request = orch._without_cache(request, model_id)
+                    continue
+                throttled = is_throttle(e)
+                if throttled:
+                    limits.rate.record_throttle(model_id, sent_at)
+                if attempt == orch.THROTTLE_RETRIES or not (throttled or is_transient(e)):
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+            finally:
+                limits.in_flight -= 1
+    limits.rate.record_success(model_id, estimate, orch._used_tokens(response))
+    text = orch._response_text(role, model_id, response, nodes,
+                               orch._prompt_chars(system_prompt, user_prompt))
+    if response.get("stopReason") == "aborted":
+        raise OffSchema(response["error"])
+    return text
+
+
+async def _read_stream_async(events: AsyncIterator[Dict[str, Any]], stream: JsonStream) -> Dict[str, Any]:
+    """orch._read_stream over AsyncBedrockClient.converse_stream."""
+    response: Dict[str, Any] = {"stopReason": "end_turn"}
+    text: List[str] = []
+    try:
+        async for event in events:
+            orch._stream_event(response, text, event, stream)
+    except OffSchema as e:
+        response.update(stopReason="aborted", error=str(e))
+    finally:
+        await events.aclose()   # closes the connection unless the stream was read to the end
+    return orch._stream_response(response, text)
+
+# ---------------------------------------------------------------------------
+# PHASES
+# ---------------------------------------------------------------------------
+
+async def _classify_batch(client, limits, batch: List[Dict], ctx: orch.OrchestratorContext,
+                          on_item: Optional[Callable[[Dict], None]] = None) -> Dict[str, Dict]:
+    cfg    = MODEL_ROLES["mapper"]
+    stream = orch._answer_stream("mapper", batch, on_item)
+    try:
+        try:
+            raw = await _call_model_async(client, limits, "Mapper", cfg["model_id"], SYSTEM_PROMPT_MAPPER,
+                                          orch._mapper_prompt(batch, ctx), cfg["temperature"],
+                                          len(batch), stream)
+        except OffSchema:
+            raw = stream.answer()
+        return orch._mapper_result(raw, batch)
+    except Exception as e:
+        print(f"[Mapper] Batch failed ({[n['id'] for n in batch[:3]]}…): {e}")
+        return {n["id"]: orch._default_classification() for n in batch}
+
+
+async def _extract_batch(client, limits, batch: List[Dict], ctx: orch.OrchestratorContext) -> Dict[str, Any]:
+    cfg    = MODEL_ROLES["linker"]
+    stream = orch._answer_stream("linker", batch)
+    try:
+        try:
+            raw = await _call_model_async(client, limits, "linker", cfg["model_id"], SYSTEM_PROMPT_LINKER,
+                                          orch._linker_prompt(batch, ctx), cfg["temperature"],
+                                          len(batch), stream)
+        except OffSchema:
+            raw = stream.answer()
+        return orch._linker_result(raw, batch)
+    except Exception as e:
+        print(f"[Linker] Batch failed ({[n['id'] for n in batch[:3]]}…): {e}")
+        return {"results": [], "relationships": []}
+
+
+async def analyze_risk_deep_async(client, limits, node: Dict, attack_paths: List[str],
+                                  relations: Optional[List[Dict]] = None) -> Dict:
+    cfg    = MODEL_ROLES["sentinel"]
+    prompt = orch._sentinel_prompt(node, attack_paths, relations)
+    for attempt in range(cfg["max_retries"]):
+        try:
+            raw    = await _call_model_async(client, limits, "sentinel", cfg["model_id"],
+                                             SYSTEM_PROMPT_SENTINEL, prompt, cfg["temperature"], 1)
+            parsed = orch._parse_json_response(raw)
+            if parsed and "risk_breakdown" in parsed:
+                return parsed
+        except Exception as e:
+            print(f"[Sentinel] Attempt {attempt + 1} failed: {e}")
+            await asyncio.sleep(2 ** attempt)
+    return orch._sentinel_failure()
+
+
+async def analyze_risk_batch_async(client, limits, items: List[Tuple[Dict, List[str], List[Dict]]]) -> Dict[str, Dict]:
+    """orch.analyze_risk_batch on the event loop: one call, then concurrent per-node retries of invalid ids."""
+    cfg     = MODEL_ROLES["sentinel"]
+    reports: Dict[str, Dict] = {}
+    try:
+        raw     = await _call_model_async(client, limits, "sentinel", cfg["model_id"], SYSTEM_PROMPT_SENTINEL,
+                                          orch._sentinel_batch_prompt(items), cfg["temperature"], len(items))
+        reports = orch._sentinel_batch_result(raw, [context["id"] for context, _, _ in items])
+    except Exception as e:
+        print(f"[Sentinel] Batch of {len(items)} failed: {e}")
+    retry = [context["id"] for context, _, _ in items if context["id"] not in reports]
+    if retry:
+        print(f"[Sentinel] Retrying {len(retry)}/{len(items)} nodes individually.")
+    results = await asyncio.gather(*(_sentinel_retry_async(client, limits, items, nid) for nid in retry))
+    reports.update(zip(retry, results))
+    return reports
+
+
+async def _sentinel_retry_async(client, limits, items: List[Tuple[Dict, List[str], List[Dict]]],
+                                nid: str) -> Dict:
+    cfg = MODEL_ROLES["sentinel"]
+    for attempt in range(cfg["max_retries"]):
+        try:
+            raw    = await _call_model_async(client, limits, "sentinel", cfg["model_id"], SYSTEM_PROMPT_SENTINEL,
+                                             orch._sentinel_batch_prompt(items, only=nid), cfg["temperature"], 1)
+            report = orch._sentinel_batch_result(raw, [nid]).get(nid)
+            if report:
+                return report
+        except Exception as e:
+            print(f"[Sentinel] Retry {attempt + 1} for {nid} failed: {e}")
+            await asyncio.sleep(2 ** attempt)
+    return orch._sentinel_failure()
+
+
+async def discover_relations_async(nodes: List[Dict[str, Any]],
+                                   reach_index: Optional[ReachabilityIndex] = None,
+                                   snippets: Optional[SnippetStore] = None,
+                                   client: Optional[AsyncBedrockClient] = None,
+                                   limits: Optional[AsyncLimits] = None) -> Dict[str, Any]:
+    """
+    discover_relations_orchestrated on the running event loop. Every Mapper
+    batch, Linker batch and Sentinel batch is a task, started as soon as the
+    StreamingRun releases it and bounded only by the role semaphores and
+    the shared rate limiter. Cancelling the awaiting task cancels all
+    in-flight calls.
+    """
+    if not os.getenv("AWS_ACCESS_KEY_ID") or not os.getenv("AWS_SECRET_ACCESS_KEY"):
+        print("Warning: No AWS credentials. Skipping orchestrated analysis.")
+        return orch._no_llm_result(nodes)
+
+    valid_nodes = [n for n in nodes if n.get("id")]
+    if not valid_nodes:
+        return {"edges": [], "node_updates": {}}
+    run = orch.StreamingRun(valid_nodes, reach_index, snippets)
+    mapper_batches, linker_batches, sentinel_batches = run.start()
+
+    limits     = limits or _limits_for_loop()
+    own_client = client is None
+    client     = client or AsyncBedrockClient()
+    tasks: Dict[asyncio.Task, Tuple[str, Any]] = {}
+
+    async def _sentinel(batch):
+        try:
+            items = [run.sentinel_inputs(node) for node in batch]
+            if len(items) == 1:
+                return {batch[0]["id"]: await analyze_risk_deep_async(client, limits, *items[0])}
+            return await analyze_risk_batch_async(client, limits, items)
+        except Exception as e:
+            print(f"[Sentinel] Async analysis failed for {[n['id'] for n in batch[:3]]}: {e}")
+            return None
+
+    def classified(batch):
+        # Called from inside a Mapper task, on this loop's thread and without
+        # awaiting, so it cannot interleave with the loop below
+        def on_item(classification):
+            for linker_batch in run.on_classified(batch, classification):
+                spawn("linker", linker_batch)
+        return on_item
+
+    def spawn(stage: str, item):
+        if stage == "mapper":
+            coro = _classify_batch(client, limits, item, run.context, classified(item))
+        elif stage == "linker":
+            coro = _extract_batch(client, limits, item, run.context)
+        else:
+            coro = _sentinel(item)
+        tasks[asyncio.ensure_future(coro)] = (stage, item)
+
+    for batch in mapper_batches:
+        spawn("mapper", batch)
+    for batch in linker_batches:
+        spawn("linker", batch)
+    for batch in sentinel_batches:
+        spawn("sentinel", batch)
+
+    try:
+        # Only this coroutine (and the streamed-classification callback)
+        # touches `run`; the tasks just make the LLM calls
+        while tasks:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage, item = tasks.pop(task)
+                if stage == "mapper":
+                    for batch in run.on_mapper(item, task.result()):
+                        spawn("linker", batch)
+                elif stage == "linker":
+                    for batch in run.on_linker(item, task.result()):
+                        spawn("sentinel", batch)
+                else:
+                    for node in item:
+                        run.on_sentinel(node, (task.result() or {}).get(node["id"]))
+    finally:
+        for task in tasks:   # cancelled (or failed): abort whatever is still in flight
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        if own_client:
+            await client.close()
+
+    result = run.finish()
+    result["rate_limits"] = limits.rate.metrics()
+    return result
+
+# ---------------------------------------------------------------------------
+# SHARED EVENT LOOP + CANCELLATION
+# ---------------------------------------------------------------------------
+
+class JobCancelled(Exception):
+    """Raised by run_orchestration when the job was cancelled while running."""
+
+
+class _LoopRunner:
+    """One daemon thread running the event loop every async job shares."""
+
+    def __init__(self):
+        self._lock   = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._client: Optional[AsyncBedrockClient] = None
+        self.jobs: Dict[str, concurrent.futures.Future] = {}
+
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="orchestrator-loop", daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    async def _job(self, nodes, reach_index, snippets):
+        if self._client is None:   # created on the loop; its pool is shared by all jobs
+            self._client = AsyncBedrockClient()
+        return await discover_relations_async(nodes, reach_index, snippets, client=self._client)
+
+    def submit(self, job_id: str, nodes, reach_index, snippets) -> concurrent.futures.Future:
+        future = asyncio.run_coroutine_threadsafe(self._job(nodes, reach_index, snippets), self.loop())
+        with self._lock:
+            self.jobs[job_id] = future
+        future.add_done_callback(lambda f: self._forget(job_id, f))
+        return future
+
+    def _forget(self, job_id: str, future):
+        with self._lock:
+            if self.jobs.get(job_id) is future:
+                del self.jobs[job_id]
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            future = self.jobs.get(job_id)
+        # Cancelling the concurrent future cancels the task on the loop
+        return future is not None and future.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        limits = _loop_limits.get(self._loop) if self._loop is not None else None
+        return {"jobs": len(self.jobs),
+                "in_flight": limits.in_flight if limits else 0,
+                "peak_in_flight": limits.peak_in_flight if limits else 0}
+
+
+_runner = _LoopRunner()
+
+
+def run_orchestration(job_id: str, nodes: List[Dict[str, Any]],
+                      reach_index: Optional[ReachabilityIndex] = None,
+                      snippets: Optional[SnippetStore] = None) -> Dict[str, Any]:
+    """
+    Run a job's LLM analysis on the shared loop, blocking the calling
+    (pipeline) thread until it finishes. Raises JobCancelled if
+    cancel_orchestration(job_id) was called meanwhile.
+    """
+    future = _runner.submit(job_id, nodes, reach_index, snippets)
+    try:
+        return future.result()
+    except concurrent.futures.CancelledError:
+        raise JobCancelled(job_id)
+
+
+def cancel_orchestration(job_id: str) -> bool:
+    """Cancel a running async job; False when none is running under that id."""
+    cancelled = _runner.cancel(job_id)
+    if cancelled:
+        print(f"[Orchestrator] Job {job_id} cancelled — in-flight requests aborted.")
+    return cancelled
+
+
+def loop_stats() -> Dict[str, Any]:
+    return _runner.stats()
@@ -0,0 +1,159 @@
+"""
+attack_paths.py - Bounded entry → node → sink path enumeration
+
+Gives the Sentinel the handful of concrete paths that make a node risky
+instead of every edge touching it. Built once per job:
+  - one multi-source BFS forward from all entry points and one backward
+    from all sink nodes, each cut off at max_len hops
+  - the BFS predecessor / successor lists form shortest-path DAGs, so the
+    search meets in the middle at whichever node is being analysed
+  - prefixes (entry → v) and suffixes (v → sink) are memoised per node and
+    capped at max_paths, so paths sharing a prefix reuse the same work
+Only shortest prefixes / suffixes are enumerated; longer detours through a
+node are deliberately dropped to keep the prompt small.
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Structural edges say nothing about how data or control reaches a sink
+NON_FLOW_EDGE_TYPES = {"contains", "structural", "depends_on"}
+
+
+class AttackPathEngine:
+    """Enumerates up to k shortest entry-to-sink paths through a given node."""
+
+    def __init__(self, edges: Iterable[Dict], entry_ids: Iterable[str],
+                 sink_ids: Iterable[str], max_len: int = 8, max_paths: int = 5):
+        self.max_len   = max_len
+        self.max_paths = max_paths
+        self._succ: Dict[str, List[str]] = {}
+        self._pred: Dict[str, List[str]] = {}
+        seen = set()
+        for e in edges:
+            src, tgt = e.get("source"), e.get("target")
+            if not src or not tgt or src == tgt or e.get("type") in NON_FLOW_EDGE_TYPES:
+                continue
+            if (src, tgt) in seen:
+                continue
+            seen.add((src, tgt))
+            self._succ.setdefault(src, []).append(tgt)
+            self._pred.setdefault(tgt, []).append(src)
+
+        self._entries = set(entry_ids)
+        self._sinks   = set(sink_ids)
+        self._from_entry, self._entry_parents = self._bfs(self._entries, self._succ)
+        self._to_sink,    self._sink_children = self._bfs(self._sinks, self._pred)
+        self._prefix_cache: Dict[str, List[Tuple[str, ...]]] = {}
+        self._suffix_cache: Dict[str, List[Tuple[str, ...]]] = {}
+
+    def _bfs(self, starts: Set[str], adj: Dict[str, List[str]]):
+        """Multi-source BFS; returns (dist, parents) where parents lie on a shortest path."""
+        dist    = {s: 0 for s in starts}
+        parents: Dict[str, List[str]] = {s: [] for s in starts}
+        queue   = deque(starts)
+        while queue:
+            u = queue.popleft()
+            if dist[u] >= self.max_len:
+                continue
+            for w in adj.get(u, []):
+                if w not in dist:
+                    dist[w] = dist[u] + 1
+                    parents[w] = [u]
+                    queue.append(w)
+                elif dist[w] == dist[u] + 1:
+                    parents[w].append(u)
+        return dist, parents
+
+    # ------------------------------------------------------------------
+    # Memoised halves
+    # ------------------------------------------------------------------
+
+    def _prefixes(self, v: str) -> List[Tuple[str, ...]]:
+        """Up to max_paths shortest entry → v paths (v included)."""
+        if v in self._prefix_cache:
+            return self._prefix_cache[v]
+        if v not in self._from_entry:
+            out = []
+        elif v in self._entries:
+            out = [(v,)]
+        else:
+            out = []
+            for p in self._entry_parents[v]:
+                for prefix in self._prefixes(p):
+                    out.append(prefix + (v,))
+                    if len(out) >= self.max_paths:
+                        break
+                if len(out) >= self.max_paths:
+                    break
+        self._prefix_cache[v] = out
+        return out
+
+    def _suffixes(self, v: str) -> List[Tuple[str, ...]]:
+        """Up to max_paths shortest v → sink paths (v included)."""
+        if v in self._suffix_cache:
+            return self._suffix_cache[v]
+        if v not in self._to_sink:
+            out = []
+        elif v in self._sinks:
+            out = [(v,)]
+        else:
+            out = []
+            for c in self._sink_children[v]:
+                for suffix in self._suffixes(c):
+                    out.append((v,) + suffix)
+                    if len(out) >= self.max_paths:
+                        break
+                if len(out) >= self.max_paths:
+                    break
+        self._suffix_cache[v] = out
+        return out
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def paths_through(self, node_id: str, k: Optional[int] = None) -> List[List[str]]:
+        """
+        Up to k shortest simple entry → node → sink paths, shortest first.
+        Empty when the node is not between an entry point and a sink
+        within max_len hops on either side.
+        """
+        k = k or self.max_paths
+        prefixes = self._prefixes(node_id)
+        suffixes = self._suffixes(node_id)
+        candidates = sorted(
+            ((len(p) + len(s) - 1, p, s) for p in prefixes for s in suffixes),
+            key=lambda t: t[0],
+        )
+        out = []
+        for _, prefix, suffix in candidates:
+            path = list(prefix) + list(suffix[1:])
+            if len(set(path)) != len(path):   # prefix and suffix cross in a cycle
+                continue
+            out.append(path)
+            if len(out) >= k:
+                break
+        return out
+
+    def format_paths(self, node_id: str, names: Dict[str, str],
+                     sink_labels: Optional[Dict[str, List[str]]] = None,
+                     k: Optional[int] = None) -> List[str]:
+        """Paths through a node as compact 'a -> b -> c [shell]' strings."""
+        sink_labels = sink_labels or {}
+        out = []
+        for path in self.paths_through(node_id, k):
+            text   = " -> ".join(names.get(n, n) for n in path)
+            labels = sink_labels.get(path[-1])
+            out.append(f"{text} [{', '.join(labels)}]" if labels else text)
+        return out
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries":          len(self._entries),
+            "sinks":            len(self._sinks),
+            "entry_reachable":  len(self._from_entry),
+            "sink_reaching":    len(self._to_sink),
+            "cached_prefixes":  len(self._prefix_cache),
+            "cached_suffixes":  len(self._suffix_cache),
+        }
@@ -0,0 +1,181 @@
+"""
+batch_packer.py - Token-aware batching for the Mapper and Linker
+
+Fixed batch sizes ignore what each node summary costs: a batch of large
+modules / classes overruns the model's maxTokens, the JSON answer is cut
+off and the whole batch falls back to defaults. pack_batches() instead
+fills each batch up to a token budget:
+
+  - input:  each node's summary (the JSON the prompt embeds) in tokens,
+            plus the system prompt and instructions, within the role's
+            batch_input_tokens
+  - output: expected answer tokens per node, within OUTPUT_HEADROOM of
+            the role's max_tokens, so the answer is never truncated
+
+Both estimates come from TokenLedger, which learns them from the token
+ledger (token_usage.txt): every call appends its node count, prompt size
+and stop reason (and prompt-cache reads / writes) next to the token
+counts, and the ledger keeps a running mean / deviation per role and model. Packing is next-fit in the given
+order — nodes stay next to their file neighbours, which the Linker needs
+to see relations — and never exceeds the role's node cap.
+"""
+
+import os
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+# Most nodes per Mapper / Linker batch; token packing may split batches further
+MAPPER_BATCH_SIZE = 20
+LINKER_BATCH_SIZE = 8
+
+OUTPUT_HEADROOM = 0.8     # fill at most 80% of maxTokens with expected output
+EWMA_ALPHA      = 0.2     # weight of the newest observation
+DEVIATIONS      = 2       # output estimate = mean + 2 × mean deviation
+HISTORY_BYTES   = 256_000 # tail of the ledger file read at start-up
+
+# Priors until the ledger has observations for a role / model
+DEFAULT_CHARS_PER_TOKEN = 3.2   # indented JSON tokenises densely
+DEFAULT_OUTPUT_PER_NODE = {"mapper": 150.0, "linker": 300.0, "sentinel": 900.0}
+
+_LINE_RE = re.compile(
+    r"role=(?P<role>\w+) \| model=(?P<model>\S+) \| input=(?P<input>\d+) \| output=(?P<output>\d+)"
+    r" \| total=\d+ \| nodes=(?P<nodes>\d+) \| chars=(?P<chars>\d+) \| stop=(?P<stop>\w+)"
+    r"(?: \| cache_read=(?P<cache_read>\d+) \| cache_write=(?P<cache_write>\d+))?"
+)
+
+
+class _Estimate:
+    """Running mean and mean absolute deviation (EWMA)."""
+
+    def __init__(self, mean: float):
+        self.mean = mean
+        self.dev  = mean * 0.25
+        self.n    = 0
+
+    def update(self, value: float):
+        if self.n == 0:
+            self.mean, self.dev = value, value * 0.25
+        else:
+            self.dev  += EWMA_ALPHA * (abs(value - self.mean) - self.dev)
+            self.mean += EWMA_ALPHA * (value - self.mean)
+        self.n += 1
+
+    def upper(self) -> float:
+        return self.mean + DEVIATIONS * self.dev
+
+
+class TokenLedger:
+    """Per (role, model) token costs learned from recorded calls. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chars_per_token: Dict[Tuple[str, str], _Estimate] = {}
+        self._output_per_node: Dict[Tuple[str, str], _Estimate] = {}
+        self._counts: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> "TokenLedger":
+        """Seed from the tail of a token_usage.txt ledger (lines without node counts are skipped)."""
+        ledger = cls()
+        if not os.path.exists(path):
+            return ledger
+        with open(path, "rb") as f:
+            f.seek(max(0, os.path.getsize(path) - HISTORY_BYTES))
+            tail = f.read().decode("utf-8", errors="replace")
+        for m in _LINE_RE.finditer(tail):
+            ledger.record(m["role"], m["model"], int(m["nodes"]), int(m["chars"]),
+                          int(m["input"]), int(m["output"]), m["stop"],
+                          int(m["cache_read"] or 0), int(m["cache_write"] or 0))
+        return ledger
+
+    def record(self, role: str, model_id: str, nodes: int, prompt_chars: int,
+               input_tokens: int, output_tokens: int, stop_reason: str = "end_turn",
+               cache_read: int = 0, cache_write: int = 0):
+        """`input_tokens` is the uncached part; prompt-cache reads / writes come on top."""
+        key = (role.lower(), model_id)
+        with self._lock:
+            counts = self._counts.setdefault(key, {"calls": 0, "truncated": 0, "aborted": 0,
+                                                   "prompt_tokens": 0, "cache_read": 0, "cache_write": 0})
+            counts["calls"] += 1
+            if stop_reason == "aborted":
+                # Stream cut short off-schema: its usage is an estimate, nothing to learn
+                counts["aborted"] += 1
+                return
+            prompt_tokens = input_tokens + cache_read + cache_write
+            counts["prompt_tokens"] += prompt_tokens
+            counts["cache_read"]    += cache_read
+            counts["cache_write"]   += cache_write
+            if prompt_tokens and prompt_chars:
+                self._chars_per_token.setdefault(key, _Estimate(DEFAULT_CHARS_PER_TOKEN)).update(
+                    prompt_chars / prompt_tokens)
+            if nodes and output_tokens:
+                per_node = output_tokens / nodes
+                if stop_reason == "max_tokens":
+                    # Cut off: the real answer was longer than what we saw
+                    counts["truncated"] += 1
+                    per_node *= 1.5
+                self._output_per_node.setdefault(key, _Estimate(self._default_output(key[0]))).update(per_node)
+
+    @staticmethod
+    def _default_output(role: str) -> float:
+        return DEFAULT_OUTPUT_PER_NODE.get(role, DEFAULT_OUTPUT_PER_NODE["linker"])
+
+    def chars_per_token(self, role: str, model_id: str) -> float:
+        with self._lock:
+            est = self._chars_per_token.get((role.lower(), model_id))
+            return est.mean if est else DEFAULT_CHARS_PER_TOKEN
+
+    def output_per_node(self, role: str, model_id: str) -> float:
+        """Conservative (mean + deviations) answer tokens per node."""
+        with self._lock:
+            est = self._output_per_node.get((role.lower(), model_id))
+            return est.upper() if est else self._default_output(role.lower())
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            out = {}
+            for key, counts in self._counts.items():
+                cpt = self._chars_per_token.get(key)
+                opn = self._output_per_node.get(key)
+                out[f"{key[0]}:{key[1]}"] = {
+                    **counts,
+                    "cache_hit_rate":  round(counts["cache_read"] / counts["prompt_tokens"], 3)
+                                       if counts["prompt_tokens"] else 0.0,
+                    "chars_per_token": round(cpt.mean, 2) if cpt else None,
+                    "output_per_node": round(opn.upper(), 1) if opn else None,
+                }
+            return out
+
+
+def pack_batches(nodes: List[Dict], node_chars: List[int], ledger: TokenLedger, role: str,
+                 model_id: str, max_nodes: int, input_budget: int, max_tokens: int,
+                 overhead_chars: int = 0) -> List[List[Dict]]:
+    """
+    Next-fit packing of `nodes` (in order) into batches whose estimated
+    prompt stays within `input_budget` tokens and whose expected answer
+    stays within OUTPUT_HEADROOM × `max_tokens`. `node_chars[i]` is the
+    size of node i's summary as embedded in the prompt; `overhead_chars`
+    the system prompt and fixed instructions. A node too large for any
+    batch goes alone.
+    """
+    cpt          = ledger.chars_per_token(role, model_id)
+    out_per_node = ledger.output_per_node(role, model_id)
+    # Output budget alone bounds the node count
+    out_cap   = max(1, int(max_tokens * OUTPUT_HEADROOM // out_per_node))
+    cap       = max(1, min(max_nodes, out_cap))
+    in_budget = input_budget - overhead_chars / cpt
+
+    batches: List[List[Dict]] = []
+    batch: List[Dict] = []
+    used = 0.0
+    for node, chars in zip(nodes, node_chars):
+        cost = chars / cpt
+        if batch and (len(batch) >= cap or used + cost > in_budget):
+            batches.append(batch)
+            batch, used = [], 0.0
+        batch.append(node)
+        used += cost
+    if batch:
+        batches.append(batch)
+    return batches
@@ -0,0 +1,113 @@
+"""
+bench_orchestrator.py - Thread-pool vs asyncio orchestrator against a mock Bedrock
+
+Starts mock_bedrock.MockBedrock with a fixed per-request latency, points
+both orchestrator paths at it through BEDROCK_ENDPOINT_URL and runs the same
+synthetic node set through each. Reports wall time, peak concurrent requests
+seen by the endpoint and peak thread count, and checks both paths produce
+the same node updates and edges.
+
+Run from the backend directory:
+    python bench_orchestrator.py [--nodes 600] [--latency 1.0] [--rate 200] [--quota 0]
+
+--quota gives the mock a per-model request quota; the adaptive rate limiter
+starts at --rate and backs off to it on ThrottlingException.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+import orchestrator
+import async_orchestrator
+from mock_bedrock import MockBedrock
+from rate_limiter import AdaptiveRateLimiter
+
+
+def synthetic(n: int):
+    """Functions with enough complexity to pass the heuristic pre-filter, some with sinks."""
+    nodes = []
+    for i in range(n):
+        node = {
+            "id": f"pkg/mod{i // 25}.py::fn{i}", "name": f"fn{i}", "type": "function",
+            "file": f"pkg/mod{i // 25}.py", "line_start": 1 + (i % 25) * 10, "loc": 12,
+            "cyclomatic_complexity": 6, "cognitive_complexity": 8, "max_nesting": 3,
+            "calls": [f"fn{i + 1}"], "parameters": ["request"], "variables": ["data"],
+            "content_hash": f"bench-{i}",
+        }
+        if i % 7 == 0:
+            node["has_shell_call"] = True
+        if i % 11 == 0:
+            node["is_entry_point"], node["entry_type"] = True, "http"
+        nodes.append(node)
+    return nodes
+
+
+class ThreadSampler:
+    """Peak threading.active_count() while the block runs."""
+
+    def __enter__(self):
+        self.peak, self._stop = threading.active_count(), threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _run(label, fn, mock):
+    mock.reset_stats()
+    with ThreadSampler() as threads, contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+    print(f"[Bench] {label:<7}: {elapsed:6.2f}s  {mock.stats['requests']:4d} requests  "
+          f"peak in-flight {mock.stats['peak_in_flight']:4d}  peak threads {threads.peak - 1:3d}  "
+          f"throttled {mock.stats['throttled']:4d}")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--nodes", type=int, default=600)
+    parser.add_argument("--latency", type=float, default=1.0, help="mock seconds per request")
+    parser.add_argument("--rate", type=float, default=200, help="per-model calls/second ceiling")
+    parser.add_argument("--quota", type=float, default=0, help="mock per-model quota, req/s (0 = none)")
+    args = parser.parse_args()
+
+    with MockBedrock(latency=args.latency, jitter=args.latency * 0.2, quota_rps=args.quota) as mock, \
+            tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "BEDROCK_ENDPOINT_URL": mock.url, "AWS_ACCESS_KEY_ID": "bench",
+            "AWS_SECRET_ACCESS_KEY": "bench", "LLM_CACHE_PATH": "off",
+        })
+        orchestrator.TOKEN_LOG_FILE = os.path.join(tmp, "token_usage.txt")
+        orchestrator.rate_limiter = AdaptiveRateLimiter(args.rate, tokens_per_minute=10**9)
+        print(f"[Bench] {args.nodes} nodes, mock latency {args.latency}s, {args.rate:g} req/s ceiling")
+
+        threaded, t_thread = _run("thread", lambda: orchestrator.discover_relations_orchestrated(synthetic(args.nodes)), mock)
+        orchestrator.rate_limiter = AdaptiveRateLimiter(args.rate, tokens_per_minute=10**9)
+
+        async def _async():
+            return await async_orchestrator.discover_relations_async(
+                synthetic(args.nodes), limits=async_orchestrator.AsyncLimits())
+        asynced, t_async = _run("async", lambda: asyncio.run(_async()), mock)
+
+    assert threaded["node_updates"] == asynced["node_updates"], "node updates differ"
+    assert sorted(map(str, threaded["edges"])) == sorted(map(str, asynced["edges"])), "edges differ"
+    print(f"[Bench] async speed-up: {t_thread / t_async:.1f}x (results identical)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""
+bench_prompt_format.py - A/B harness for the compact vs JSON prompt format
+
+Builds the CPG of a source tree, cuts its nodes into the same Mapper and
+Linker batches for both prompt formats (prompt_format.py) and reports:
+
+  offline   characters and approximate tokens per prompt (system + user)
+            for each format, and the saving of the compact one
+  --record  sends every batch in both formats to Bedrock (or the endpoint
+            in BEDROCK_ENDPOINT_URL; --mock starts mock_bedrock) and writes
+            one JSON line per call: format, role, batch nodes, the model's
+            reported input / output tokens and its raw answer
+  --replay  reads such a recording back and compares the formats: real
+            input tokens, Mapper tier / classification agreement per node,
+            Linker role agreement and relationship overlap
+
+Recordings make the comparison repeatable offline: record once against the
+real models, then replay after changing the encoder or the legend.
+
+Run from the backend directory:
+    python bench_prompt_format.py [--src .] [--batches 10]
+    python bench_prompt_format.py --record ab.jsonl [--mock] [--batches 10]
+    python bench_prompt_format.py --replay ab.jsonl
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import time
+from typing import Dict, List, Tuple
+
+import orchestrator
+import prompt_format
+from cpg_builder import build_cpg
+from rate_limiter import backoff_delay, is_throttle
+
+# Rough BPE stand-in (no tokenizer is shipped): words of up to 6 letters,
+# digit groups of up to 3, one token per whitespace run and per symbol
+_TOKEN_RE = re.compile(r"[A-Za-z]{1,6}|\d{1,3}|\s+|[^\sA-Za-z\d]")
+
+
+def approx_tokens(text: str) -> int:
+    return len(_TOKEN_RE.findall(text))
+
+
+def load_batches(src: str, limit: int) -> Tuple[List[Dict], Dict[str, List[List[Dict]]]]:
+    """All code nodes of `src` and the first `limit` Mapper / Linker batches, in file order."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        cpg = build_cpg(src, "prompt_ab")
+    nodes = [n for n in cpg["nodes"] if n.get("type") != "api_call"]
+    sizes = {"mapper": orchestrator.MAPPER_BATCH_SIZE, "linker": orchestrator.LINKER_BATCH_SIZE}
+    return nodes, {role: [nodes[i:i + size] for i in range(0, len(nodes), size)][:limit]
+                   for role, size in sizes.items()}
+
+
+def prompts(role: str, batch: List[Dict], ctx: orchestrator.OrchestratorContext, fmt: str) -> Tuple[str, str]:
+    """(system, user) prompt of a batch in the given format."""
+    if role == "mapper":
+        return (prompt_format.with_legend(orchestrator.SYSTEM_PROMPT_MAPPER, fmt),
+                orchestrator._mapper_prompt(batch, ctx, fmt))
+    return (prompt_format.with_legend(orchestrator.SYSTEM_PROMPT_LINKER, fmt),
+            orchestrator._linker_prompt(batch, ctx, fmt))
+
+
+def offline_report(ctx: orchestrator.OrchestratorContext, batches: Dict[str, List[List[Dict]]]):
+    for role, role_batches in batches.items():
+        totals = {}
+        for fmt in prompt_format.FORMATS:
+            chars = tokens = user_tokens = 0
+            for batch in role_batches:
+                system, user = prompts(role, batch, ctx, fmt)
+                chars       += len(system) + len(user)
+                tokens      += approx_tokens(system) + approx_tokens(user)
+                user_tokens += approx_tokens(user)
+            totals[fmt] = (chars, tokens, user_tokens)
+            n = sum(len(b) for b in role_batches)
+            print(f"[AB] {role:<6} {fmt:<7}: {chars:8d} chars  ~{tokens:7d} tokens "
+                  f"(~{user_tokens / max(n, 1):5.0f} node tokens / node)")
+        json_tokens, compact_tokens = totals["json"][1], totals["compact"][1]
+        print(f"[AB] {role:<6} compact saves {1 - compact_tokens / max(json_tokens, 1):.0%} of input tokens "
+              f"({len(role_batches)} batches)")
+
+
+def _converse(client, role: str, system: str, user: str) -> Dict:
+    cfg     = orchestrator.MODEL_ROLES[role]
+    request = orchestrator._converse_request(cfg["model_id"], system, user,
+                                             cfg["temperature"], cfg["max_tokens"])
+    for attempt in range(orchestrator.THROTTLE_RETRIES + 1):
+        orchestrator.rate_limiter.wait(cfg["model_id"])
+        try:
+            return client.converse(**request)
+        except Exception as e:
+            if attempt == orchestrator.THROTTLE_RETRIES or not is_throttle(e):
+                raise
+            orchestrator.rate_limiter.record_throttle(cfg["model_id"])
+            time.sleep(backoff_delay(attempt))
+
+
+def record(path: str, ctx: orchestrator.OrchestratorContext, batches: Dict[str, List[List[Dict]]]):
+    client = orchestrator._get_bedrock_client()
+    with open(path, "w", encoding="utf-8") as out:
+        for role, role_batches in batches.items():
+            for b, batch in enumerate(role_batches):
+                for fmt in prompt_format.FORMATS:
+                    system, user = prompts(role, batch, ctx, fmt)
+                    response = _converse(client, role, system, user)
+                    usage    = response.get("usage", {})
+                    text     = "".join(c.get("text", "") for c in
+                                       response.get("output", {}).get("message", {}).get("content", []))
+                    out.write(json.dumps({
+                        "format": fmt, "role": role, "batch": b,
+                        "nodes": [{"id": n["id"], "file": n.get("file")} for n in batch],
+                        "input_tokens": usage.get("inputTokens", 0),
+                        "output_tokens": usage.get("outputTokens", 0),
+                        "stop": response.get("stopReason"), "text": text,
+                    }) + "\n")
+    print(f"[AB] Recorded {sum(map(len, batches.values())) * len(prompt_format.FORMATS)} calls to {path}")
+
+
+def _agreement(a: Dict[str, Dict], b: Dict[str, Dict], field: str) -> Tuple[int, int]:
+    common = [k for k in a if k in b]
+    return sum(a[k].get(field) == b[k].get(field) for k in common), len(common)
+
+
+def replay(path: str):
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    tokens: Dict[Tuple[str, str], List[int]] = {}
+    mapper: Dict[str, Dict[str, Dict]] = {fmt: {} for fmt in prompt_format.FORMATS}
+    roles:  Dict[str, Dict[str, Dict]] = {fmt: {} for fmt in prompt_format.FORMATS}
+    edges:  Dict[str, set] = {fmt: set() for fmt in prompt_format.FORMATS}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for r in records:
+            fmt = r["format"]
+            tokens.setdefault((r["role"], fmt), []).append(r["input_tokens"])
+            if r["role"] == "mapper":
+                mapper[fmt].update(orchestrator._mapper_result(r["text"], r["nodes"]))
+            else:
+                result = orchestrator._linker_result(r["text"], r["nodes"])
+                roles[fmt].update({x["id"]: x for x in result.get("results", []) if x.get("id")})
+                edges[fmt].update((e.get("source"), e.get("target"), e.get("type"))
+                                  for e in result.get("relationships", []))
+
+    for role in ("mapper", "linker"):
+        j, c = sum(tokens.get((role, "json"), [])), sum(tokens.get((role, "compact"), []))
+        if j:
+            print(f"[AB] {role:<6} input tokens: json {j:8d}  compact {c:8d}  ({1 - c / j:.0%} saved)")
+    for field in ("risk_tier", "classification", "deep_reasoning_required"):
+        same, n = _agreement(mapper["json"], mapper["compact"], field)
+        print(f"[AB] mapper {field:<24} agreement {same}/{n} ({same / max(n, 1):.0%})")
+    print(f"[AB] mapper ids answered by only one format: {len(set(mapper['json']) ^ set(mapper['compact']))}")
+    same, n = _agreement(roles["json"], roles["compact"], "architectural_role")
+    print(f"[AB] linker architectural_role agreement {same}/{n} ({same / max(n, 1):.0%})")
+    union = edges["json"] | edges["compact"]
+    print(f"[AB] linker relationship overlap (Jaccard) "
+          f"{len(edges['json'] & edges['compact']) / max(len(union), 1):.0%} of {len(union)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--src", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--batches", type=int, default=10, help="batches per role")
+    parser.add_argument("--record", help="JSONL file to record responses to")
+    parser.add_argument("--replay", help="JSONL recording to compare")
+    parser.add_argument("--mock", action="store_true", help="record against an in-process mock_bedrock")
+    args = parser.parse_args()
+
+    if args.replay and not args.record:
+        replay(args.replay)
+        return
+
+    all_nodes, batches = load_batches(args.src, args.batches)
+    print(f"[AB] {len(all_nodes)} nodes from {args.src}")
+    ctx = orchestrator.OrchestratorContext(all_nodes)
+    offline_report(ctx, batches)
+    if not args.record:
+        return
+    if args.mock:
+        from mock_bedrock import MockBedrock
+        with MockBedrock(latency=0.0) as mock:
+            os.environ.update({"BEDROCK_ENDPOINT_URL": mock.url, "AWS_ACCESS_KEY_ID": "bench",
+                               "AWS_SECRET_ACCESS_KEY": "bench"})
+            record(args.record, ctx, batches)
+    else:
+        record(args.record, ctx, batches)
+    replay(args.record)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+bench_scale.py - Orchestrator throughput at 1k / 10k / 50k nodes against a mock Bedrock
+
+Runs discover_relations_orchestrated (or the asyncio path with --path
+async) end to end on synthetic node sets of each size, against
+mock_bedrock.MockBedrock injected through BEDROCK_ENDPOINT_URL, and reports
+per size: wall time, nodes/s, requests and requests/s, request latency
+percentiles seen by the endpoint, throttles / injected errors, peak
+concurrency and the nodes the LLM stages updated. Nothing is billed.
+
+The mock's latency distribution, throttling and error injection are
+configurable, and --cassette replays answers recorded from real Bedrock
+(mock_bedrock.py --record) instead of synthetic ones; misses are counted.
+
+Run from the backend directory:
+    python bench_scale.py [--sizes 1000,10000,50000] [--path thread] [--latency 0.5]
+                          [--latency-dist lognormal] [--jitter 0.5] [--error-rate 0.01]
+                          [--throttle-rate 0] [--quota 0] [--rate 200] [--cassette calls.jsonl]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import time
+from typing import Dict, List
+
+import orchestrator
+import async_orchestrator
+from bench_orchestrator import ThreadSampler, synthetic
+from mock_bedrock import LATENCY_DISTS, MockBedrock
+from rate_limiter import AdaptiveRateLimiter
+
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _run(size: int, path: str, mock: MockBedrock, rate: float, tmp: str) -> Dict:
+    # Fresh ledger / limiter per size, so one size's learning does not carry into the next
+    orchestrator.TOKEN_LOG_FILE = os.path.join(tmp, f"token_usage_{size}.txt")
+    orchestrator._token_ledger  = None
+    orchestrator.rate_limiter   = AdaptiveRateLimiter(rate, tokens_per_minute=10**9)
+    nodes = synthetic(size)
+    mock.reset_stats()
+    with ThreadSampler() as threads, contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        if path == "async":
+            result = asyncio.run(async_orchestrator.discover_relations_async(
+                nodes, limits=async_orchestrator.AsyncLimits()))
+        else:
+            result = orchestrator.discover_relations_orchestrated(nodes)
+        elapsed = time.perf_counter() - t0
+    stats     = mock.stats
+    latencies = [end - start for _, start, end in mock.timeline]
+    return {
+        "size": size, "seconds": elapsed, "requests": stats["requests"],
+        "p50": _percentile(latencies, 0.50), "p95": _percentile(latencies, 0.95),
+        "p99": _percentile(latencies, 0.99), "throttled": stats["throttled"], "errors": stats["errors"],
+        "peak_in_flight": stats["peak_in_flight"], "peak_threads": threads.peak - 1,
+        "updated": len(result["node_updates"]), "edges": len(result["edges"]),
+        "replay_misses": stats["replay_misses"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="1000,10000,50000", help="comma-separated node counts")
+    parser.add_argument("--path", choices=("thread", "async"), default="thread")
+    parser.add_argument("--latency", type=float, default=0.5, help="mock median seconds per request")
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTS, default="lognormal")
+    parser.add_argument("--jitter", type=float, default=0.5, help="± seconds (uniform) or log sigma (lognormal)")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="mock 500 / 503 / mid-stream error rate")
+    parser.add_argument("--quota", type=float, default=0, help="mock per-model quota, req/s (0 = none)")
+    parser.add_argument("--rate", type=float, default=200, help="per-model calls/second ceiling")
+    parser.add_argument("--cassette", help="replay answers recorded with mock_bedrock.py --record")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    with MockBedrock(latency=args.latency, jitter=args.jitter, latency_dist=args.latency_dist,
+                     throttle_rate=args.throttle_rate, error_rate=args.error_rate, quota_rps=args.quota,
+                     cassette=args.cassette) as mock, tempfile.TemporaryDirectory() as tmp:
+        os.environ.update({
+            "BEDROCK_ENDPOINT_URL": mock.url, "AWS_ACCESS_KEY_ID": "bench",
+            "AWS_SECRET_ACCESS_KEY": "bench", "LLM_CACHE_PATH": "off",
+        })
+        print(f"[Bench] {args.path} path, mock latency {args.latency}s {args.latency_dist} "
+              f"(jitter {args.jitter}), throttle {args.throttle_rate:.0%}, errors {args.error_rate:.0%}, "
+              f"{args.rate:g} req/s ceiling")
+        rows = []
+        for size in sizes:
+            row = _run(size, args.path, mock, args.rate, tmp)
+            rows.append(row)
+            print(f"[Bench] {size:>6} nodes: {row['seconds']:7.1f}s  {size / row['seconds']:7.1f} nodes/s  "
+                  f"{row['requests']:5d} requests ({row['requests'] / row['seconds']:5.1f}/s)  "
+                  f"p50/p95/p99 {row['p50']:.2f}/{row['p95']:.2f}/{row['p99']:.2f}s  "
+                  f"throttled {row['throttled']}  errors {row['errors']}  "
+                  f"peak in-flight {row['peak_in_flight']}  peak threads {row['peak_threads']}  "
+                  f"updated {row['updated']}  edges {row['edges']}"
+                  + (f"  replay misses {row['replay_misses']}" if args.cassette else ""))
+
+    if len(rows) > 1:
+        base = rows[0]
+        for row in rows[1:]:
+            scale = row["size"] / base["size"]
+            print(f"[Bench] {base['size']} -> {row['size']} nodes ({scale:g}x): "
+                  f"{row['seconds'] / base['seconds']:.1f}x wall time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+bench_sentinel.py - Batched vs single-node Sentinel analysis
+
+Builds the CPG of a source tree (with its snippet store and reachability
+index, as a job would), picks the nodes with security flags or rule
+findings, and sends them to the Sentinel twice:
+
+  single   one analyze_risk_deep call per node
+  batched  StreamingRun.sentinel_batches groups → analyze_risk_batch
+
+and reports Sentinel tokens per node (input + output, from the token
+ledger), calls made, per-node retries, and the agreement of the batched
+reports with the single-node ones (overall risk and each risk vector).
+
+Against the real models set AWS credentials (and MODEL_SENTINEL); --mock
+runs against mock_bedrock, which checks the plumbing, not the judgement.
+
+Run from the backend directory:
+    python bench_sentinel.py [--src .] [--limit 40] [--mock] [--bad-report-rate 0.1]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import tempfile
+import time
+from typing import Dict, List
+
+import orchestrator
+from cpg_builder import build_cpg
+from reachability import ReachabilityIndex
+from snippet_store import SnippetStoreWriter
+
+_SENTINEL_LINE = re.compile(r"role=sentinel \| model=\S+ \| input=(\d+) \| output=(\d+) .*? nodes=(\d+)")
+
+
+def risky_nodes(src: str, workdir: str, limit: int):
+    """Flagged nodes of `src` (at most `limit`), all nodes, reachability index and snippets."""
+    writer = SnippetStoreWriter(workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        cpg = build_cpg(src, "sentinel_ab", snippet_writer=writer)
+        snippets = writer.finalize()
+    nodes = [n for n in cpg["nodes"] if n.get("type") != "api_call"]
+    risky = [n for n in nodes if n.get("risk_findings")
+             or any(n.get(f) for f in ("has_eval", "has_shell_call", "has_file_access", "has_env_access"))]
+    return risky[:limit], nodes, ReachabilityIndex(cpg["nx_graph"]), snippets
+
+
+def _sentinel_usage(log_path: str) -> Dict[str, int]:
+    usage = {"calls": 0, "tokens": 0}
+    if os.path.exists(log_path):
+        with open(log_path) as f:
+            for m in _SENTINEL_LINE.finditer(f.read()):
+                usage["calls"]  += 1
+                usage["tokens"] += int(m.group(1)) + int(m.group(2))
+    return usage
+
+
+def run(label: str, fn, n_nodes: int, log_path: str) -> Dict[str, Dict]:
+    if os.path.exists(log_path):
+        os.remove(log_path)
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        t0 = time.perf_counter()
+        reports = fn()
+        elapsed = time.perf_counter() - t0
+    usage   = _sentinel_usage(log_path)
+    retries = sum(int(m) for m in re.findall(r"Retrying (\d+)/", out.getvalue()))
+    print(f"[Bench] {label:<8}: {usage['calls']:4d} calls  {usage['tokens'] / max(n_nodes, 1):7.0f} tokens/node  "
+          f"{retries:3d} per-node retries  {elapsed:6.1f}s")
+    return reports
+
+
+def agreement(single: Dict[str, Dict], batched: Dict[str, Dict]):
+    ids = [nid for nid in single if nid in batched]
+    same_overall = sum(single[i].get("overall_risk") == batched[i].get("overall_risk") for i in ids)
+    vectors = orchestrator.SENTINEL_VECTORS
+    same_vector = sum(
+        (single[i].get("risk_breakdown") or {}).get(v, {}).get("level")
+        == (batched[i].get("risk_breakdown") or {}).get(v, {}).get("level")
+        for i in ids for v in vectors)
+    print(f"[Bench] overall_risk agreement {same_overall}/{len(ids)} ({same_overall / max(len(ids), 1):.0%}), "
+          f"per-vector {same_vector}/{len(ids) * len(vectors)} "
+          f"({same_vector / max(len(ids) * len(vectors), 1):.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--src", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--limit", type=int, default=40, help="flagged nodes to analyze")
+    parser.add_argument("--mock", action="store_true", help="run against an in-process mock_bedrock")
+    parser.add_argument("--bad-report-rate", type=float, default=0.0, help="mock: malformed batched reports")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.ExitStack() as stack:
+        if args.mock:
+            from mock_bedrock import MockBedrock
+            mock = stack.enter_context(MockBedrock(latency=0.0, bad_report_rate=args.bad_report_rate))
+            os.environ.update({"BEDROCK_ENDPOINT_URL": mock.url, "AWS_ACCESS_KEY_ID": "bench",
+                               "AWS_SECRET_ACCESS_KEY": "bench"})
+        os.environ["LLM_CACHE_PATH"] = "off"
+        log_path = os.path.join(tmp, "token_usage.txt")
+        orchestrator.TOKEN_LOG_FILE = log_path
+
+        risky, nodes, reach_index, snippets = risky_nodes(args.src, os.path.join(tmp, "snippets"), args.limit)
+        with contextlib.redirect_stdout(io.StringIO()):
+            streaming = orchestrator.StreamingRun(nodes, reach_index, snippets)
+        inputs  = {n["id"]: streaming.sentinel_inputs(n) for n in risky}
+        client  = orchestrator._get_bedrock_client()
+        batches = streaming.sentinel_batches(risky)
+        print(f"[Bench] {len(risky)} flagged nodes from {args.src} → {len(batches)} Sentinel batches "
+              f"(≤{orchestrator.SENTINEL_BATCH_SIZE} nodes)")
+
+        single = run("single", lambda: {nid: orchestrator.analyze_risk_deep(client, *item)
+                                        for nid, item in inputs.items()}, len(risky), log_path)
+
+        def batched():
+            reports: Dict[str, Dict] = {}
+            for batch in batches:
+                items: List = [inputs[n["id"]] for n in batch]
+                if len(items) == 1:
+                    reports[batch[0]["id"]] = orchestrator.analyze_risk_deep(client, *items[0])
+                else:
+                    reports.update(orchestrator.analyze_risk_batch(client, items))
+            return reports
+        agreement(single, run("batched", batched, len(risky), log_path))
+
+
+if __name__ == "__main__":
+    main()
@@ -15,6 +15,11 @@ AZURE_STORAGE_CONNECTION_STRING is set in .env.
 Run from the backend/ directory:
     python collect_training_data.py
 
+Parsed CPGs are kept as snapshots in training_data/snapshots/, so deleting
+a .pt file (e.g. after a feature change) rebuilds it without re-cloning.
+Snapshots written by a different version of the CPG builder (cpg_builder,
+graph_features, rule packs) are rebuilt instead of reused.
+
 Optional flags:
     --workers N     Number of parallel clone workers (default: 3)
     --min-nodes N   Skip graphs with fewer than N nodes (default: 10)
@@ -97,6 +102,7 @@ TRAINING_REPOS = [
 AZURE_CONTAINER_TRAINING = "training-data"
 AZURE_CONTAINER_WEIGHTS  = "model-weights"
 EXPECTED_FEAT_DIM        = 77   # 64 TF-IDF + 13 structural — must match feature_engineering.py
+SNAPSHOT_DIR             = "snapshots"   # per-repo CPG snapshots, reused across runs
 
 
 # ---------------------------------------------------------------------------
@@ -115,6 +121,7 @@ def collect_single_repo(repo_url: str, output_dir: str, min_nodes: int) -> dict:
     """
     repo_name = repo_url.rstrip("/").split("/")[-1]
     out_path  = os.path.join(output_dir, f"{repo_name}.pt")
+    snap_path = os.path.join(output_dir, SNAPSHOT_DIR, f"{repo_name}.cfsnap")
 
     # Already collected — skip without re-cloning
     if os.path.exists(out_path):
@@ -125,21 +132,34 @@ def collect_single_repo(repo_url: str, output_dir: str, min_nodes: int) -> dict:
     t0 = time.time()
 
     try:
-        # ── 1. Shallow clone ──────────────────────────────────────────────
-        from git import Repo as GitRepo, GitCommandError
-        try:
-            GitRepo.clone_from(repo_url, clone_dir, depth=1)
-        except GitCommandError as e:
-            return {"success": False, "repo": repo_url, "name": repo_name,
-                    "reason": f"git clone failed: {e}"}
-
-        # ── 2. Build Code Property Graph ──────────────────────────────────
-        # build_cpg internally calls:
-        #   find_code_files → parse_file (Tree-sitter) → build_edges
-        #   → compute_graph_features (fan_in, betweenness, depth, etc.)
-        from cpg_builder import build_cpg
-        job_id = str(uuid.uuid4())[:8]
-        cpg    = build_cpg(clone_dir, job_id)
+        from cpg_snapshot import save_snapshot, load_snapshot, snapshot_is_current
+        reuse = os.path.exists(snap_path) and snapshot_is_current(snap_path)
+        if os.path.exists(snap_path) and not reuse:
+            print(f"[Collect] {repo_name} — CPG snapshot is from another builder version, rebuilding")
+        if reuse:
+            # ── 1-2. Reuse the CPG snapshot from an earlier run ───────────
+            # Feature / tensor changes can be re-run without cloning or parsing;
+            # snapshots written by a different cpg_builder / graph_features are not reused
+            cpg = load_snapshot(snap_path, parts=("nodes", "edges"))
+            print(f"[Collect] {repo_name} — loaded CPG snapshot")
+        else:
+            # ── 1. Shallow clone ──────────────────────────────────────────
+            from git import Repo as GitRepo, GitCommandError
+            try:
+                GitRepo.clone_from(repo_url, clone_dir, depth=1)
+            except GitCommandError as e:
+                return {"success": False, "repo": repo_url, "name": repo_name,
+                        "reason": f"git clone failed: {e}"}
+
+            # ── 2. Build Code Property Graph ──────────────────────────────
+            # build_cpg internally calls:
+            #   find_code_files → parse_file (Tree-sitter) → build_edges
+            #   → compute_graph_features (fan_in, betweenness, depth, etc.)
+            from cpg_builder import build_cpg
+            job_id = str(uuid.uuid4())[:8]
+            cpg    = build_cpg(clone_dir, job_id)
+            os.makedirs(os.path.dirname(snap_path), exist_ok=True)
+            save_snapshot(snap_path, cpg, meta={"repo": repo_url})
 
         nodes = cpg["nodes"]
         edges = cpg["edges"]
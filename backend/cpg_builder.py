@@ -3,14 +3,39 @@ Multi-Language AST Parser and Code Property Graph Builder
 """
 
 import ast
+import hashlib
 import os
 import zipfile
 import tempfile
+from collections import deque
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 import networkx as nx
 from langsmith import traceable
 
+from risk_rules import scan_tree, has_rule_pack, flags_from_findings, FLAG_CONFIDENCE
+from secret_scanner import scan_secrets, STRING_LITERAL_TYPES
+from edge_table import EdgeTable
+
+# ─── Builder Version ───
+# Modules whose code shapes build_cpg()'s nodes and edges. Their source is
+# fingerprinted into CPG snapshots, so a cached CPG built by different code
+# is treated as stale instead of silently reused.
+BUILDER_MODULES = ('cpg_builder', 'graph_features', 'risk_rules', 'secret_scanner', 'edge_table')
+_builder_version: Optional[str] = None
+
+def builder_version() -> str:
+    """Short content hash of the BUILDER_MODULES sources (computed once per process)."""
+    global _builder_version
+    if _builder_version is None:
+        digest = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in BUILDER_MODULES:
+            with open(os.path.join(here, f"{name}.py"), 'rb') as f:
+                digest.update(name.encode() + b'\0' + f.read())
+        _builder_version = digest.hexdigest()[:16]
+    return _builder_version
+
 # ─── Language Mapping ───
 LANGUAGE_MAP = {
     '.py': 'python', '.js': 'javascript', '.jsx': 'javascript', '.ts': 'typescript', 
@@ -52,6 +77,31 @@ TS_LANGUAGES = {
     "go": tree_sitter.Language(tree_sitter_go.language(), "go"),
 }
 
+# ─── Complexity Node Types (all supported grammars) ───
+# Structures that add a decision point and nest their bodies one level deeper
+NESTING_STRUCTURES = {
+    'if_statement', 'for_statement', 'for_in_statement', 'enhanced_for_statement',
+    'while_statement', 'do_statement', 'except_clause', 'catch_clause',
+    'conditional_expression', 'ternary_expression',
+    'switch_statement', 'switch_expression', 'match_statement',
+    'expression_switch_statement', 'type_switch_statement', 'select_statement',
+}
+SWITCH_STATEMENTS = {
+    'switch_statement', 'switch_expression', 'match_statement',
+    'expression_switch_statement', 'type_switch_statement', 'select_statement',
+}
+# One extra path each (switch arms; default arms are not counted)
+CASE_CLAUSES = {'case_clause', 'switch_case', 'expression_case', 'type_case', 'communication_case'}
+# Nest their bodies without being a decision point themselves
+NESTED_FUNCTIONS = {
+    'lambda', 'lambda_expression', 'function_definition', 'function_declaration',
+    'function_expression', 'arrow_function', 'method_declaration', 'func_literal',
+}
+LOGICAL_OPERATORS = {'and', 'or', '&&', '||', '??'}
+
+# Left out of a function's normalized content hash (comments are leaf nodes)
+COMMENT_TYPES = {'comment', 'line_comment', 'block_comment'}
+
 # ─── Universal Parser ───
 class UniversalTreeSitterParser:
     def __init__(self, filepath: str, language_name: str, root_dir: str = ""):
@@ -65,6 +115,14 @@ class UniversalTreeSitterParser:
         self.language_name = language_name
         self.imports = []
         self.local_symbols = {} # name -> resolved mapping
+        self.rule_findings = None  # set by parse_file when a rule pack exists
+        self._call_sites = {}      # (start_byte, end_byte) -> call dict, for tagging with findings
+        self._func_ranges = []     # (start_byte, end_byte, func_id)
+        self.string_literals = []  # literal nodes collected by walk() for the secret scan
+        self.reuse = None          # func_id -> {"node", "apis"} from the previous parse (incremental)
+        self.changed_ranges = []   # [(start_byte, end_byte)] in new-source coordinates
+        self.reused_count = 0
+        self.extracted_count = 0
         
         self.nodes = [{
             "id": self.module_name,
@@ -101,6 +159,8 @@ class UniversalTreeSitterParser:
 
     def walk(self, node, source: bytes, parent_class=None, parent_function=None):
         if not node: return
+        if node.type in STRING_LITERAL_TYPES:
+            self.string_literals.append(node)
         
         # 1. IMPORTS & ALIASES
         if node.type in ['import_statement', 'import_from_statement', 'import_declaration']:
@@ -119,6 +179,7 @@ class UniversalTreeSitterParser:
                 "id": class_id, "type": "class", "name": name, "file": self.filepath,
                 "language": self.language_name, "line_start": node.start_point[0] + 1,
                 "loc": node.end_point[0] - node.start_point[0] + 1,
+                "byte_start": self._definition_start(node), "byte_end": node.end_byte,
             })
             parent_class = class_id
 
@@ -130,32 +191,42 @@ class UniversalTreeSitterParser:
             func_id = f"{parent_class}.{name}" if parent_class else f"{self.module_name}.{name}"
             self.local_symbols[name] = func_id
             
-            # Entry points & Logic
-            is_entry = name in ['main', 'handler']
-            entry_type = 'unknown'
-            if is_entry: entry_type = 'main'
+            reused = self._reuse_function(func_id, node) if self.reuse else None
+            if reused is not None:
+                self.nodes.extend(reused)
+            else:
+                # Entry points & Logic
+                is_entry = name in ['main', 'handler']
+                entry_type = 'unknown'
+                if is_entry: entry_type = 'main'
             
-            # Look for decorators for routes
-            if node.prev_sibling and 'decorator' in node.prev_sibling.type:
-                dec_txt = self._get_text(node.prev_sibling, source).lower()
-                if any(verb in dec_txt for verb in ['@app', '@route', '@get', '@post', '@router', '@celery']):
-                    is_entry = True
-                    entry_type = 'http' if '@route' in dec_txt or '@get' in dec_txt or '@post' in dec_txt or '@app' in dec_txt else 'job'
+                # Look for decorators for routes
+                if node.prev_sibling and 'decorator' in node.prev_sibling.type:
+                    dec_txt = self._get_text(node.prev_sibling, source).lower()
+                    if any(verb in dec_txt for verb in ['@app', '@route', '@get', '@post', '@router', '@celery']):
+                        is_entry = True
+                        entry_type = 'http' if '@route' in dec_txt or '@get' in dec_txt or '@post' in dec_txt or '@app' in dec_txt else 'job'
             
-            local_calls, api_calls, variables, params, data_flows, flags = self._extract_function_body(node, source, func_id)
+                local_calls, api_calls, variables, params, data_flows, flags, complexity, content_hash = \
+                    self._extract_function_body(node, source, func_id)
+                self.extracted_count += 1
             
-            self.nodes.append({
-                "id": func_id, "type": "function", "name": name, "file": self.filepath,
-                "language": self.language_name, "line_start": node.start_point[0] + 1,
-                "loc": node.end_point[0] - node.start_point[0] + 1,
-                "calls": local_calls, "api_calls": [a['id'] for a in api_calls],
-                "variables": variables, "parameters": params,
-                "data_flows": data_flows, # [ {type: 'assigns_to', src: 'a', dst: 'b'} ]
-                "parent_class": parent_class,
-                "is_entry_point": is_entry, "entry_type": entry_type,
-                **flags # has_loop, has_conditional, etc.
-            })
-            self.nodes.extend(api_calls)
+                self.nodes.append({
+                    "id": func_id, "type": "function", "name": name, "file": self.filepath,
+                    "language": self.language_name, "line_start": node.start_point[0] + 1,
+                    "loc": node.end_point[0] - node.start_point[0] + 1,
+                    "byte_start": self._definition_start(node), "byte_end": node.end_byte,
+                    "calls": local_calls, "api_calls": [a['id'] for a in api_calls],
+                    "variables": variables, "parameters": params,
+                    "data_flows": data_flows, # [ {type: 'assigns_to', src: 'a', dst: 'b'} ]
+                    "parent_class": parent_class,
+                    "is_entry_point": is_entry, "entry_type": entry_type,
+                    **flags, # has_loop, has_conditional, etc.
+                    **complexity, # cyclomatic_complexity, cognitive_complexity, ...
+                    "content_hash": content_hash, # normalized body hash (LLM cache key)
+                })
+                self.nodes.extend(api_calls)
+            self._func_ranges.append((node.start_byte, node.end_byte, func_id))
             # Don't return here - continue walking to find more functions
             parent_function = func_id
 
@@ -176,6 +247,172 @@ class UniversalTreeSitterParser:
         for child in node.children:
             self.walk(child, source, parent_class, parent_function)
 
+    def _reuse_function(self, func_id: str, node) -> Optional[List[Dict]]:
+        """
+        Previous extraction of a function (plus its API nodes) if the edit
+        did not touch it: same id, same length, and no changed range
+        intersecting its definition. Positions are refreshed from the new tree.
+        """
+        old = self.reuse.get(func_id)
+        if old is None:
+            return None
+        start, end = self._definition_start(node), node.end_byte
+        fn = old['node']
+        if fn.get('byte_end', -1) - fn.get('byte_start', 0) != end - start:
+            return None
+        if any(start <= ce and cs <= end for cs, ce in self.changed_ranges):
+            return None
+        line_start = node.start_point[0] + 1
+        shift = line_start - fn['line_start']
+        self.reused_count += 1
+        fn = {**fn, 'byte_start': start, 'byte_end': end, 'line_start': line_start}
+        return [fn] + [{**a, 'line': a.get('line', 0) + shift} for a in old['apis']]
+
+    def _definition_start(self, node) -> int:
+        """Start byte including decorators / annotations wrapped around a definition."""
+        parent = node.parent
+        if parent is not None and parent.type == 'decorated_definition':
+            return parent.start_byte
+        return node.start_byte
+
+    def attach_findings(self):
+        """
+        Attribute rule findings to the innermost enclosing function (module
+        node for top-level code). For functions, the security flags are then
+        derived from the findings instead of call-name substrings. Call sites
+        a confident, unsanitised sink / source rule matched are tagged with
+        its category ("sink" / "source"), which taint summaries use per call.
+        """
+        if self.rule_findings is None:
+            return
+        for f in self.rule_findings:
+            call = self._call_sites.get((f['start_byte'], f['end_byte']))
+            if (call is not None and f['kind'] in ('sink', 'source') and f['confidence'] >= FLAG_CONFIDENCE
+                    and not f.get('sanitized')):
+                call[f['kind']] = f['category']
+        by_id = {n['id']: n for n in self.nodes if n['type'] in ('function', 'module')}
+        owned = {fid: [] for _, _, fid in self._func_ranges}
+        module_findings = []
+        for f in self.rule_findings:
+            owner, width = None, None
+            for start, end, fid in self._func_ranges:
+                if start <= f['start_byte'] < end and (width is None or end - start < width):
+                    owner, width = fid, end - start
+            compact = {k: v for k, v in f.items() if k not in ('start_byte', 'end_byte')}
+            (owned[owner] if owner else module_findings).append(compact)
+
+        for fid, findings in owned.items():
+            node = by_id.get(fid)
+            if node is None:
+                continue
+            node['risk_findings'] = findings
+            node.update(flags_from_findings(findings))
+        module = by_id[self.module_name]
+        module['risk_findings'] = module_findings
+        module['has_hardcoded_secret'] = any(
+            f['category'] == 'secret' and f['confidence'] >= FLAG_CONFIDENCE for f in self.rule_findings)
+
+    def _param_names(self, param_node, source: bytes) -> List[str]:
+        """Names bound by one formal parameter node (any supported language)."""
+        if param_node.type == 'identifier':
+            return [self._get_text(param_node, source)]
+        if param_node.type == 'parameter_declaration':  # Go: `b, c string`
+            return [self._get_text(c, source) for c in param_node.children if c.type == 'identifier']
+        for field in ('name', 'left', 'pattern'):
+            named = param_node.child_by_field_name(field)
+            if named is not None and named.type == 'identifier':
+                return [self._get_text(named, source)]
+        first = next((c for c in param_node.children if c.type == 'identifier'), None)
+        return [self._get_text(first, source)] if first else []
+
+    def _call_arguments(self, args_node, source: bytes, max_args: int = 6, max_ids: int = 4) -> List[List[str]]:
+        """Identifiers referenced by each positional / keyword argument of a call."""
+        if args_node is None:
+            return []
+        args = []
+        for arg in args_node.named_children[:max_args]:
+            if arg.type == 'comment':
+                continue
+            if arg.type == 'keyword_argument':
+                arg = arg.child_by_field_name('value') or arg
+            ids = []
+            stack = [arg]
+            while stack and len(ids) < max_ids:
+                n = stack.pop()
+                if n.type == 'identifier':
+                    ids.append(self._get_text(n, source))
+                else:
+                    stack.extend(reversed(n.children))
+            args.append(ids)
+        return args
+
+    def _logical_operator(self, node, source: bytes) -> Optional[str]:
+        """Operator of a short-circuit boolean expression, else None."""
+        if node.type not in ('boolean_operator', 'binary_expression'):
+            return None
+        op = node.child_by_field_name('operator')
+        op_txt = self._get_text(op, source) if op is not None else ''
+        return op_txt if op_txt in LOGICAL_OPERATORS else None
+
+    def _complexity_step(self, curr, parent, nesting: int, source: bytes, metrics: Dict) -> int:
+        """
+        Score one node for cyclomatic / cognitive complexity and return the
+        nesting level for its children. Cognitive follows the usual rules:
+        +1 per structure plus its nesting level, +1 flat for else / else-if,
+        +1 per run of like boolean operators.
+        """
+        t = curr.type
+        if t == 'elif_clause' or (t == 'if_statement' and parent is not None and (
+                parent.type == 'else_clause' or self._is_alternative(parent, curr))):
+            # else-if: flat increment, stays at the enclosing if's level
+            metrics['cyclomatic_complexity'] += 1
+            metrics['cognitive_complexity'] += 1
+            metrics['branch_count'] += 1
+            if t == 'if_statement':
+                self._complexity_else(curr, metrics)
+            return nesting
+        if t == 'else_clause':
+            named = curr.named_children
+            if parent is not None and parent.type == 'if_statement' and not (
+                    len(named) == 1 and named[0].type == 'if_statement'):
+                metrics['cognitive_complexity'] += 1
+                metrics['branch_count'] += 1
+            return nesting
+        if t in NESTING_STRUCTURES:
+            if t not in SWITCH_STATEMENTS:
+                metrics['cyclomatic_complexity'] += 1
+            if t in ('if_statement', 'conditional_expression', 'ternary_expression'):
+                metrics['branch_count'] += 1
+            if t == 'if_statement':
+                self._complexity_else(curr, metrics)
+            metrics['cognitive_complexity'] += 1 + nesting
+            metrics['max_nesting'] = max(metrics['max_nesting'], nesting + 1)
+            return nesting + 1
+        if t in CASE_CLAUSES or (t == 'switch_label' and curr.children and curr.children[0].type == 'case'):
+            metrics['cyclomatic_complexity'] += 1
+            metrics['branch_count'] += 1
+            return nesting
+        op = self._logical_operator(curr, source)
+        if op:
+            metrics['cyclomatic_complexity'] += 1
+            if parent is None or self._logical_operator(parent, source) != op:
+                metrics['cognitive_complexity'] += 1
+            return nesting
+        if t in NESTED_FUNCTIONS and parent is not None:
+            return nesting + 1
+        return nesting
+
+    def _is_alternative(self, parent, node) -> bool:
+        alt = parent.child_by_field_name('alternative') if parent.type == 'if_statement' else None
+        return alt is not None and (alt.start_byte, alt.end_byte) == (node.start_byte, node.end_byte)
+
+    def _complexity_else(self, if_node, metrics: Dict):
+        """Java / Go put a plain else block directly in the 'alternative' field."""
+        alt = if_node.child_by_field_name('alternative')
+        if alt is not None and alt.type not in ('if_statement', 'else_clause', 'elif_clause'):
+            metrics['cognitive_complexity'] += 1
+            metrics['branch_count'] += 1
+
     def _extract_function_body(self, func_node, source: bytes, func_id: str):
         local_calls = []
         api_nodes = []
@@ -189,9 +426,26 @@ class UniversalTreeSitterParser:
             'has_eval': False, 'has_shell_call': False, 'has_file_access': False, 'has_env_access': False
         }
         
-        queue = [func_node]
+        metrics = {
+            'cyclomatic_complexity': 1, 'cognitive_complexity': 0,
+            'max_nesting': 0, 'branch_count': 0, 'param_count': 0
+        }
+        
+        params_node = func_node.child_by_field_name('parameters')
+        if params_node is not None:
+            for p in params_node.named_children:
+                params.extend(self._param_names(p, source))
+        metrics['param_count'] = len([p for p in params if p not in ('self', 'cls')])
+
+        # (start, end, depth) of every non-comment leaf, for the content hash; the
+        # depth keeps re-indented Python blocks from hashing like the original
+        tokens = []
+        queue = deque([(func_node, None, 0, 0)])
         while queue:
-            curr = queue.pop(0)
+            curr, parent, nesting, depth = queue.popleft()
+            child_nesting = self._complexity_step(curr, parent, nesting, source, metrics)
+            if curr.child_count == 0 and curr.type not in COMMENT_TYPES:
+                tokens.append((curr.start_byte, curr.end_byte, depth))
             
             # Flags
             if curr.type in ['if_statement', 'switch_statement']: flags['has_conditional'] = True
@@ -200,12 +454,6 @@ class UniversalTreeSitterParser:
             elif curr.type in ['raise_statement', 'throw_statement']: flags['has_throw'] = True
             elif curr.type in ['await_expression']: flags['has_async_await'] = True
             
-            # Params
-            if curr.type in ['formal_parameters', 'parameters']:
-                for p in curr.children:
-                    if p.type == 'identifier':
-                        params.append(self._get_text(p, source))
-            
             # Assignments (Data Flow: RHS -> LHS)
             if curr.type == 'assignment':
                 lhs = curr.child_by_field_name('left')
@@ -222,7 +470,12 @@ class UniversalTreeSitterParser:
                 func_name_node = curr.child_by_field_name('function')
                 call_name = self._get_text(func_name_node, source)
                 if call_name:
-                    local_calls.append({"name": call_name, "qualified": '.' in call_name})
+                    call = {
+                        "name": call_name, "qualified": '.' in call_name,
+                        "args": self._call_arguments(curr.child_by_field_name('arguments'), source),
+                    }
+                    local_calls.append(call)
+                    self._call_sites[(curr.start_byte, curr.end_byte)] = call
                     
                     nl = call_name.lower()
                     if 'eval' in nl: flags['has_eval'] = True
@@ -245,9 +498,35 @@ class UniversalTreeSitterParser:
                 vname = self._get_text(curr, source)
                 if vname not in ['self', 'cls', 'this']: variables.add(vname)
             
-            for ch in curr.children: queue.append(ch)
+            for ch in curr.children: queue.append((ch, curr, child_nesting, depth + 1))
+        
+        # Token sequence in source order: whitespace, comments and position drop out
+        tokens.sort()
+        content_hash = hashlib.blake2b(b"\0".join(b"%d:%s" % (d, source[a:b]) for a, b, d in tokens),
+                                       digest_size=16).hexdigest()
                 
-        return local_calls, api_nodes, list(variables - set(params)), params, data_flows, flags
+        return local_calls, api_nodes, list(variables - set(params)), params, data_flows, flags, metrics, content_hash
+
+def _visit_tree(filepath: str, language_name: str, source: bytes, tree, root_dir: str = '',
+                snippet_writer=None, reuse: Optional[Dict] = None, changed_ranges: Optional[List] = None):
+    """Run the CPG visitor (plus rule / secret scans) over an already parsed tree."""
+    visitor = UniversalTreeSitterParser(filepath, language_name, root_dir=root_dir)
+    visitor.reuse, visitor.changed_ranges = reuse, changed_ranges or []
+    if has_rule_pack(language_name):
+        visitor.rule_findings = scan_tree(tree.root_node, language_name, TS_LANGUAGES[language_name])
+    visitor.walk(tree.root_node, source)
+    if visitor.rule_findings is not None:
+        visitor.rule_findings += scan_secrets(visitor.string_literals, source)
+    visitor.attach_findings()
+    visitor.nodes[0]['byte_start'], visitor.nodes[0]['byte_end'] = 0, len(source)
+    # Snippets go to the job's store; node dicts keep only the byte range
+    if snippet_writer is not None:
+        for n in visitor.nodes:
+            if n['type'] in ('function', 'class'):
+                snippet_writer.add(n['id'], source[n['byte_start']:n['byte_end']])
+    result = {"file": filepath, "language": language_name, "nodes": visitor.nodes,
+              "imports": visitor.imports, "symbols": visitor.local_symbols}
+    return result, visitor
 
 def parse_file(filepath: str, **kwargs) -> Dict[str, Any]:
     language_name = detect_language(filepath)
@@ -256,15 +535,174 @@ def parse_file(filepath: str, **kwargs) -> Dict[str, Any]:
 
     try:
         with open(filepath, 'rb') as f: source = f.read()
-        visitor = UniversalTreeSitterParser(filepath, language_name, root_dir=kwargs.get('root_dir', ''))
         parser = tree_sitter.Parser()
         parser.set_language(TS_LANGUAGES[language_name])
-        visitor.walk(parser.parse(source).root_node, source)
-        return {"file": filepath, "language": language_name, "nodes": visitor.nodes, "imports": visitor.imports, "symbols": visitor.local_symbols}
+        tree = parser.parse(source)
+        return _visit_tree(filepath, language_name, source, tree,
+                           root_dir=kwargs.get('root_dir', ''),
+                           snippet_writer=kwargs.get('snippet_writer'))[0]
     except Exception as e:
         print(f"Error parsing {filepath}: {e}")
         return {"file": filepath, "language": language_name, "nodes": [], "imports": [], "symbols": {}}
 
+# ─── Incremental Reparse ───
+
+def _point_at(source: bytes, offset: int):
+    """Tree-sitter (row, column) of a byte offset."""
+    row = source.count(b'\n', 0, offset)
+    return (row, offset - (source.rfind(b'\n', 0, offset) + 1))
+
+def _line_offsets(lines: List[bytes]) -> List[int]:
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+    return offsets
+
+def diff_edits(old: bytes, new: bytes) -> List[Dict[str, int]]:
+    """
+    Line-level edit hunks turning `old` into `new`, last hunk first (the
+    order tree.edit() needs so earlier offsets stay valid). Each hunk has
+    start_byte / old_end_byte in old coordinates and new_start_byte /
+    new_end_byte in new coordinates.
+    """
+    import difflib
+    old_lines, new_lines = old.splitlines(keepends=True), new.splitlines(keepends=True)
+    # Trim the common head / tail before handing the middle to difflib
+    head = 0
+    while head < min(len(old_lines), len(new_lines)) and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while (tail < min(len(old_lines), len(new_lines)) - head
+           and old_lines[-1 - tail] == new_lines[-1 - tail]):
+        tail += 1
+    old_mid = old_lines[head:len(old_lines) - tail]
+    new_mid = new_lines[head:len(new_lines) - tail]
+    old_off, new_off = _line_offsets(old_lines), _line_offsets(new_lines)
+
+    hunks = []
+    matcher = difflib.SequenceMatcher(None, old_mid, new_mid, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        hunks.append({
+            "start_byte":     old_off[head + i1], "old_end_byte": old_off[head + i2],
+            "new_start_byte": new_off[head + j1], "new_end_byte": new_off[head + j2],
+        })
+    return hunks[::-1]
+
+class IncrementalParser:
+    """
+    Keeps the last Tree, source and nodes per file so an edited file is
+    re-parsed incrementally (tree.edit + parse with the old tree) and only
+    functions touched by the edit are re-extracted. update() returns a node
+    delta instead of a full node list.
+    """
+
+    # Keys that change when code merely moves
+    POSITION_KEYS = ('byte_start', 'byte_end', 'line_start', 'line')
+    FINDING_POSITION_KEYS = ('line', 'start_byte', 'end_byte')
+
+    def __init__(self, root_dir: str = ""):
+        self.root_dir = root_dir
+        self._files: Dict[str, Dict] = {}   # filepath -> {"tree", "source", "result", "language"}
+        self._parsers: Dict[str, Any] = {}
+
+    def _parser(self, language_name: str):
+        if language_name not in self._parsers:
+            parser = tree_sitter.Parser()
+            parser.set_language(TS_LANGUAGES[language_name])
+            self._parsers[language_name] = parser
+        return self._parsers[language_name]
+
+    def parse(self, filepath: str, source: Optional[bytes] = None) -> Dict[str, Any]:
+        """Full parse; remembers the tree for later incremental updates."""
+        language_name = detect_language(filepath)
+        if language_name not in TS_LANGUAGES:
+            return {"file": filepath, "language": "unknown", "nodes": [], "imports": [], "symbols": {}}
+        if source is None:
+            with open(filepath, 'rb') as f: source = f.read()
+        tree = self._parser(language_name).parse(source)
+        result, _ = _visit_tree(filepath, language_name, source, tree, root_dir=self.root_dir)
+        self._files[filepath] = {"tree": tree, "source": source, "result": result, "language": language_name}
+        return result
+
+    def forget(self, filepath: str):
+        self._files.pop(filepath, None)
+
+    def update(self, filepath: str, source: Optional[bytes] = None) -> Dict[str, Any]:
+        """
+        Re-parse an edited file and return
+            {"added": [node], "removed": [id], "changed": [node],
+             "moved": {id: {position keys}}, "stats": {...}}
+        Files seen for the first time are parsed fully (every node "added").
+        """
+        if source is None:
+            with open(filepath, 'rb') as f: source = f.read()
+        state = self._files.get(filepath)
+        if state is None:
+            result = self.parse(filepath, source)
+            return {"file": filepath, "added": result["nodes"], "removed": [], "changed": [], "moved": {},
+                    "stats": {"reextracted": sum(n['type'] == 'function' for n in result["nodes"]),
+                              "reused": 0, "changed_ranges": 0}}
+
+        old_source, old_tree, language_name = state["source"], state["tree"], state["language"]
+        hunks = diff_edits(old_source, source)
+        for h in hunks:   # last hunk first, so earlier offsets are still valid
+            inserted = source[h["new_start_byte"]:h["new_end_byte"]]
+            start_point = _point_at(old_source, h["start_byte"])
+            rows = inserted.count(b'\n')
+            new_end_point = ((start_point[0] + rows, len(inserted) - inserted.rfind(b'\n') - 1) if rows
+                             else (start_point[0], start_point[1] + len(inserted)))
+            old_tree.edit(
+                start_byte=h["start_byte"], old_end_byte=h["old_end_byte"],
+                new_end_byte=h["start_byte"] + len(inserted),
+                start_point=start_point, old_end_point=_point_at(old_source, h["old_end_byte"]),
+                new_end_point=new_end_point,
+            )
+        new_tree = self._parser(language_name).parse(source, old_tree)
+
+        # Structural changes from tree-sitter plus the raw edit spans (token-only
+        # edits such as a changed string literal do not show up structurally)
+        changed = [(r.start_byte, r.end_byte) for r in old_tree.changed_ranges(new_tree)]
+        changed += [(h["new_start_byte"], h["new_end_byte"]) for h in hunks]
+
+        old_nodes = state["result"]["nodes"]
+        reuse = {n['id']: {"node": n, "apis": [a for a in old_nodes
+                                               if a.get('type') == 'api_call' and a.get('parent') == n['id']]}
+                 for n in old_nodes if n.get('type') == 'function'}
+        result, visitor = _visit_tree(filepath, language_name, source, new_tree, root_dir=self.root_dir,
+                                      reuse=reuse, changed_ranges=changed)
+        self._files[filepath] = {"tree": new_tree, "source": source, "result": result, "language": language_name}
+
+        delta = self._delta(old_nodes, result["nodes"])
+        delta["file"]  = filepath
+        delta["stats"] = {"reextracted": visitor.extracted_count, "reused": visitor.reused_count,
+                          "changed_ranges": len(changed)}
+        return delta
+
+    def _delta(self, old_nodes: List[Dict], new_nodes: List[Dict]) -> Dict[str, Any]:
+        old_by_id = {n['id']: n for n in old_nodes}
+        new_by_id = {n['id']: n for n in new_nodes}
+        def strip(n):
+            out = {k: v for k, v in n.items() if k not in self.POSITION_KEYS}
+            if 'risk_findings' in out:   # findings carry their own line / byte positions
+                out['risk_findings'] = [{k: v for k, v in f.items() if k not in self.FINDING_POSITION_KEYS}
+                                        for f in out['risk_findings']]
+            return out
+        added   = [n for nid, n in new_by_id.items() if nid not in old_by_id]
+        removed = [nid for nid in old_by_id if nid not in new_by_id]
+        changed, moved = [], {}
+        for nid, n in new_by_id.items():
+            old = old_by_id.get(nid)
+            if old is None:
+                continue
+            if strip(old) != strip(n):
+                changed.append(n)
+            elif old != n:
+                moved[nid] = {k: n[k] for k in self.POSITION_KEYS + ('risk_findings',)
+                              if k in n and old.get(k) != n[k]}
+        return {"added": added, "removed": removed, "changed": changed, "moved": moved}
+
 # ─── Import Resolution ───
 
 def build_import_edges(module_imports: Dict[str, List[str]], module_ids: set) -> List[Dict]:
@@ -383,19 +821,11 @@ def build_edges(nodes: List[Dict], all_symbols: Dict[str, str]) -> List[Dict]:
                 edges.append({"source": node['parent'], "target": node['id'], "type": "uses_api", "confidence": 1.0})
 
     # Deduplicate edges while preserving different edge types between same nodes
-    seen = set()
-    unique_edges = []
-    for edge in edges:
-        # Create a key that includes source, target, AND type
-        key = (edge['source'], edge['target'], edge['type'])
-        if key not in seen:
-            seen.add(key)
-            unique_edges.append(edge)
-    
-    return unique_edges
+    # (vectorized on (source, target, type) codes)
+    return EdgeTable.from_dicts(edges).dedupe().to_dicts()
 
 @traceable(project_name="CodeForge")
-def build_cpg(path: str, job_id: str) -> Dict[str, Any]:
+def build_cpg(path: str, job_id: str, snippet_writer=None) -> Dict[str, Any]:
     print(f"Building Enhanced CPG for {path}")
     working_dir = extract_archive(path, tempfile.mkdtemp(prefix=f"cpg_{job_id}_")) if path.endswith('.zip') else path
     
@@ -404,7 +834,7 @@ def build_cpg(path: str, job_id: str) -> Dict[str, Any]:
     module_imports = {}  # module_id -> [import_strings]
     
     for filepath in find_code_files(working_dir):
-        res = parse_file(filepath, root_dir=working_dir)
+        res = parse_file(filepath, root_dir=working_dir, snippet_writer=snippet_writer)
         all_nodes.extend(res['nodes'])
         # Merge symbols for cross-file resolution (naive global namespace for prototype)
         global_symbols.update(res.get('symbols', {}))
@@ -469,4 +899,5 @@ def build_cpg(path: str, job_id: str) -> Dict[str, Any]:
     res_nodes = [data for _, data in G.nodes(data=True)]
     res_edges = [{"id": f"e_{u}_{v}", "source": u, "target": v, "type": data.get('type', 'calls')} for u, v, data in G.edges(data=True)]
     
-    return {"nodes": res_nodes, "edges": res_edges, "nx_graph": G}
+    return {"nodes": res_nodes, "edges": res_edges, "nx_graph": G,
+            "symbols": global_symbols, "imports": module_imports}
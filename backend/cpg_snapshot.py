@@ -0,0 +1,460 @@
+"""
+cpg_snapshot.py - Versioned binary snapshot format for a built CPG
+
+A snapshot persists nodes, edges, symbols and imports so consumers (job
+reload, training-data collection, incremental updates) can skip re-parsing.
+
+Layout of a .cfsnap file:
+  magic "CFSNAP\\0\\0" | u32 version | u32 header_len | JSON header | sections
+Every section is an independently compressed array (zstd when the
+`zstandard` package is installed, zlib otherwise, or "none"), aligned to
+8 bytes. Uncompressed sections (codec "none", or too small to gain from
+compression) are zero-copy views over the mmap.
+
+Nodes and edges are stored column by column. Each attribute key gets the
+narrowest column kind that holds every value losslessly:
+  bool / int / float  — typed array + presence mask (0 missing, 1 value, 2 None)
+  str                 — int32 index into the shared string table (-1 missing, -2 None)
+  vector              — float64 matrix for equal-length numeric lists (embeddings)
+  json                — per-row JSON blob + offsets, for everything else
+Partial loads decompress only the sections they touch: edges only, or the
+nodes of a subset of files (JSON rows outside the subset are never decoded).
+
+The header also records the builder version (cpg_builder.builder_version(),
+a hash of the code that produced the nodes); snapshot_is_current() treats a
+different format or builder version as a cache miss.
+"""
+
+import json
+import mmap
+import os
+import struct
+import zlib
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import zstandard
+except ImportError:   # zlib fallback keeps snapshots readable without the extra wheel
+    zstandard = None
+
+SNAPSHOT_VERSION = 1
+MAGIC = b"CFSNAP\0\0"
+SNAPSHOT_FILE = "cpg.cfsnap"
+
+_PREFIX = struct.Struct("<8sII")
+_ALIGN  = 8
+
+# Presence-mask codes
+_MISSING, _VALUE, _NONE = 0, 1, 2
+# String-index sentinels
+_STR_MISSING, _STR_NONE = -1, -2
+
+PARTS = ("nodes", "edges", "symbols", "imports")
+
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+# ---------------------------------------------------------------------------
+# COMPRESSION
+# ---------------------------------------------------------------------------
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=6).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    return data
+
+
+def _decompress(data, codec: str, raw_len: int) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("snapshot is zstd-compressed but the 'zstandard' package is not installed")
+        return zstandard.ZstdDecompressor().decompress(bytes(data), max_output_size=raw_len)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    return data
+
+# ---------------------------------------------------------------------------
+# COLUMN ENCODING
+# ---------------------------------------------------------------------------
+
+class _StringTable:
+    """Interns strings while writing; one blob + offsets on disk."""
+
+    def __init__(self):
+        self.index: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def intern(self, value: str) -> int:
+        idx = self.index.get(value)
+        if idx is None:
+            idx = self.index[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+    def encode(self):
+        encoded = [v.encode("utf-8", errors="surrogatepass") for v in self.values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return b"".join(encoded), offsets
+
+
+def _column_kind(values: List[Any]) -> str:
+    present = [v for v in values if v is not _ABSENT and v is not None]
+    if not present:
+        return "str"
+    if all(isinstance(v, bool) for v in present):
+        return "bool"
+    if all(isinstance(v, int) and not isinstance(v, bool) and -2**63 <= v < 2**63 for v in present):
+        return "int"
+    if all(isinstance(v, float) for v in present):
+        return "float"
+    if all(isinstance(v, str) for v in present):
+        return "str"
+    if all(isinstance(v, list) and v and all(type(x) is float for x in v) for v in present) \
+            and len({len(v) for v in present}) == 1:
+        return "vector"
+    return "json"
+
+
+class _Absent:
+    pass
+
+_ABSENT = _Absent()   # key not present in a row (distinct from an explicit None)
+
+
+def _json_default(value):
+    """numpy scalars / arrays and sets that slip into node attributes."""
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=str)
+    return str(value)
+
+
+def _encode_column(values: List[Any], kind: str, strings: _StringTable) -> Dict[str, np.ndarray]:
+    """Arrays (by section suffix) for one column."""
+    if kind == "str":
+        out = np.empty(len(values), dtype=np.int32)
+        for i, v in enumerate(values):
+            out[i] = _STR_MISSING if v is _ABSENT else _STR_NONE if v is None else strings.intern(v)
+        return {"": out}
+
+    mask = np.array([_MISSING if v is _ABSENT else _NONE if v is None else _VALUE for v in values],
+                    dtype=np.uint8)
+    if kind in ("bool", "int", "float"):
+        dtype = {"bool": np.bool_, "int": np.int64, "float": np.float64}[kind]
+        data = np.array([v if m == _VALUE else 0 for v, m in zip(values, mask)], dtype=dtype)
+        return {"": data, ".mask": mask}
+    if kind == "vector":
+        width = next(len(v) for v, m in zip(values, mask) if m == _VALUE)
+        data = np.zeros((len(values), width), dtype=np.float64)
+        for i, (v, m) in enumerate(zip(values, mask)):
+            if m == _VALUE:
+                data[i] = v
+        return {"": data, ".mask": mask}
+
+    blobs = [json.dumps(v, separators=(",", ":"), default=_json_default).encode() if m == _VALUE else b""
+             for v, m in zip(values, mask)]
+    offsets = np.zeros(len(blobs) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in blobs], out=offsets[1:])
+    return {"": np.frombuffer(b"".join(blobs), dtype=np.uint8), ".offsets": offsets, ".mask": mask}
+
+
+def _encode_rows(rows: List[Dict], prefix: str, strings: _StringTable, sections: Dict[str, np.ndarray]) -> Dict[str, str]:
+    """Columnar-encode a list of dicts into `sections`; returns {key: kind}."""
+    keys: List[str] = []
+    seen = set()
+    for row in rows:
+        for k in row:
+            if k not in seen:
+                seen.add(k)
+                keys.append(k)
+    kinds = {}
+    for key in keys:
+        values = [row.get(key, _ABSENT) for row in rows]
+        kinds[key] = _column_kind(values)
+        for suffix, arr in _encode_column(values, kinds[key], strings).items():
+            sections[f"{prefix}/{key}{suffix}"] = arr
+    return kinds
+
+# ---------------------------------------------------------------------------
+# WRITER
+# ---------------------------------------------------------------------------
+
+def save_snapshot(path: str, cpg: Dict[str, Any], meta: Optional[Dict] = None,
+                  codec: Optional[str] = None, builder: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Write nodes / edges / symbols / imports of a build_cpg() result to
+    `path` (atomically). `meta` is any JSON-serialisable job metadata;
+    `builder` defaults to the running cpg_builder.builder_version().
+    Returns size statistics.
+    """
+    if builder is None:
+        from cpg_builder import builder_version
+        builder = builder_version()
+    codec = codec or default_codec()
+    if codec == "zstd" and zstandard is None:
+        codec = "zlib"
+    nodes   = list(cpg.get("nodes", []))
+    edges   = list(cpg.get("edges", []))
+    symbols = cpg.get("symbols") or {}
+    imports = cpg.get("imports") or {}
+
+    strings = _StringTable()
+    sections: Dict[str, np.ndarray] = {}
+    node_kinds = _encode_rows(nodes, "nodes", strings, sections)
+    edge_kinds = _encode_rows(edges, "edges", strings, sections)
+
+    sections["symbols/name"]   = np.array([strings.intern(k) for k in symbols], dtype=np.int32)
+    sections["symbols/target"] = np.array([strings.intern(v) for v in symbols.values()], dtype=np.int32)
+    # Modules with no imports are kept too: module ids + per-module counts + flat imports
+    sections["imports/module"] = np.array([strings.intern(m) for m in imports], dtype=np.int32)
+    sections["imports/count"]  = np.array([len(v) for v in imports.values()], dtype=np.int32)
+    sections["imports/import"] = np.array([strings.intern(i) for v in imports.values() for i in v], dtype=np.int32)
+
+    blob, offsets = strings.encode()
+    sections["strings/blob"]    = np.frombuffer(blob, dtype=np.uint8)
+    sections["strings/offsets"] = offsets
+
+    payloads, table, offset, raw_total = [], {}, 0, 0
+    for name, arr in sections.items():
+        arr = np.ascontiguousarray(arr)
+        raw = arr.tobytes()
+        stored = _compress(raw, codec)
+        packed = stored is not raw and len(stored) < len(raw)
+        if not packed:   # tiny sections: frame overhead outweighs the gain
+            stored = raw
+        table[name] = {"offset": offset, "length": len(stored), "raw": len(raw), "packed": packed,
+                       "dtype": arr.dtype.str, "shape": list(arr.shape)}
+        pad = -len(stored) % _ALIGN
+        payloads.append(stored + b"\0" * pad)
+        offset += len(stored) + pad
+        raw_total += len(raw)
+
+    header = json.dumps({
+        "version":  SNAPSHOT_VERSION,
+        "builder":  builder,
+        "codec":    codec,
+        "counts":   {"nodes": len(nodes), "edges": len(edges), "symbols": len(symbols),
+                     "imports": len(imports), "strings": len(strings.values)},
+        "columns":  {"nodes": node_kinds, "edges": edge_kinds},
+        "sections": table,
+        "meta":     meta or {},
+    }, separators=(",", ":"), default=str).encode()
+    header += b" " * (-(_PREFIX.size + len(header)) % _ALIGN)
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, SNAPSHOT_VERSION, len(header)))
+        f.write(header)
+        for p in payloads:
+            f.write(p)
+    os.replace(tmp, path)
+
+    size = os.path.getsize(path)
+    print(f"[Snapshot] Saved {len(nodes)} nodes / {len(edges)} edges → {path} "
+          f"({raw_total // 1024} KB → {size // 1024} KB, {codec})")
+    return {"path": path, "bytes": size, "raw_bytes": raw_total, "codec": codec}
+
+# ---------------------------------------------------------------------------
+# READER
+# ---------------------------------------------------------------------------
+
+class CPGSnapshot:
+    """Memory-mapped reader; sections are decompressed lazily and cached."""
+
+    def __init__(self, path: str):
+        self.path  = path
+        self._cache: Dict[str, np.ndarray] = {}
+        self._strings: Dict[int, str] = {}
+        self._lookup: Optional[Dict[str, int]] = None
+        self._file = open(path, "rb")
+        self._map  = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = _PREFIX.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a CPG snapshot")
+        if version > SNAPSHOT_VERSION:
+            self.close()
+            raise ValueError(f"snapshot version {version} is newer than supported ({SNAPSHOT_VERSION})")
+        header = json.loads(bytes(self._map[_PREFIX.size:_PREFIX.size + header_len]))
+        self.version  = version
+        self.builder  = header.get("builder")
+        self.codec    = header["codec"]
+        self.counts   = header["counts"]
+        self.meta     = header["meta"]
+        self._columns = header["columns"]
+        self._table   = header["sections"]
+        self._base    = _PREFIX.size + header_len
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._cache.clear()
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:   # a caller still holds a zero-copy view; GC unmaps it
+                pass
+            self._map = None
+        self._file.close()
+
+    # -- sections -----------------------------------------------------------
+
+    def _section(self, name: str) -> np.ndarray:
+        arr = self._cache.get(name)
+        if arr is not None:
+            return arr
+        entry = self._table[name]
+        start = self._base + entry["offset"]
+        view  = memoryview(self._map)[start:start + entry["length"]]
+        raw   = _decompress(view, self.codec, entry["raw"]) if entry["packed"] else view
+        arr   = np.frombuffer(raw, dtype=np.dtype(entry["dtype"])).reshape(entry["shape"])
+        self._cache[name] = arr
+        return arr
+
+    def _string(self, idx: int) -> str:
+        value = self._strings.get(idx)
+        if value is None:
+            offsets = self._section("strings/offsets")
+            blob    = self._section("strings/blob")
+            value   = blob[offsets[idx]:offsets[idx + 1]].tobytes().decode("utf-8", errors="surrogatepass")
+            self._strings[idx] = value
+        return value
+
+    def strings(self) -> List[str]:
+        return [self._string(i) for i in range(self.counts["strings"])]
+
+    def _string_index(self, value: str) -> int:
+        """Index of a string in the table, or -1 (builds the reverse map once)."""
+        if self._lookup is None:
+            offsets = self._section("strings/offsets").tolist()
+            blob    = self._section("strings/blob").tobytes()
+            self._lookup = {blob[a:b].decode("utf-8", errors="surrogatepass"): i
+                            for i, (a, b) in enumerate(zip(offsets, offsets[1:]))}
+        return self._lookup.get(value, -1)
+
+    # -- rows ---------------------------------------------------------------
+
+    def _decode_rows(self, part: str, rows: np.ndarray) -> List[Dict]:
+        out = [{} for _ in range(len(rows))]
+        for key, kind in self._columns[part].items():
+            data = self._section(f"{part}/{key}")
+            if kind == "str":
+                for d, v in zip(out, data[rows].tolist()):
+                    if v >= 0:
+                        d[key] = self._string(v)
+                    elif v == _STR_NONE:
+                        d[key] = None
+                continue
+            mask = self._section(f"{part}/{key}.mask")[rows]
+            if kind == "json":
+                offsets = self._section(f"{part}/{key}.offsets")
+                values = [json.loads(data[offsets[r]:offsets[r + 1]].tobytes()) if m == _VALUE else None
+                          for r, m in zip(rows.tolist(), mask.tolist())]
+            else:
+                values = data[rows].tolist()
+            for d, v, m in zip(out, values, mask.tolist()):
+                if m == _VALUE:
+                    d[key] = v
+                elif m == _NONE:
+                    d[key] = None
+        return out
+
+    def node_rows(self, files: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Row numbers of all nodes, or of the nodes belonging to `files`."""
+        rows = np.arange(self.counts["nodes"])
+        if files is None:
+            return rows
+        if "file" not in self._columns["nodes"]:
+            return rows[:0]
+        wanted = [self._string_index(f) for f in files]
+        return rows[np.isin(self._section("nodes/file"), [w for w in wanted if w >= 0])]
+
+    def nodes(self, files: Optional[Iterable[str]] = None) -> List[Dict]:
+        return self._decode_rows("nodes", self.node_rows(files))
+
+    def edges(self, node_ids: Optional[Iterable[str]] = None) -> List[Dict]:
+        """All edges, or only those touching `node_ids`."""
+        rows = np.arange(self.counts["edges"])
+        if node_ids is not None and rows.size:
+            wanted = [i for i in (self._string_index(n) for n in node_ids) if i >= 0]
+            rows = rows[np.isin(self._section("edges/source"), wanted)
+                        | np.isin(self._section("edges/target"), wanted)]
+        return self._decode_rows("edges", rows)
+
+    def symbols(self) -> Dict[str, str]:
+        return {self._string(k): self._string(v) for k, v in
+                zip(self._section("symbols/name").tolist(), self._section("symbols/target").tolist())}
+
+    def imports(self) -> Dict[str, List[str]]:
+        flat = [self._string(i) for i in self._section("imports/import").tolist()]
+        out, pos = {}, 0
+        for m, count in zip(self._section("imports/module").tolist(), self._section("imports/count").tolist()):
+            out[self._string(m)] = flat[pos:pos + count]
+            pos += count
+        return out
+
+
+def load_snapshot(path: str, parts: Iterable[str] = PARTS,
+                  files: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """
+    Load a snapshot as a build_cpg()-shaped dict (without nx_graph).
+    `parts` limits what is decoded (e.g. ("edges",)); `files` restricts
+    nodes to those files and edges / symbols / imports to those nodes.
+    """
+    parts = set(parts)
+    with CPGSnapshot(path) as snap:
+        out: Dict[str, Any] = {"meta": snap.meta, "version": snap.version, "builder": snap.builder}
+        node_ids = None
+        if files is not None:
+            nodes = snap.nodes(files)
+            node_ids = {n["id"] for n in nodes if "id" in n}
+            if "nodes" in parts:
+                out["nodes"] = nodes
+        elif "nodes" in parts:
+            out["nodes"] = snap.nodes()
+        if "edges" in parts:
+            out["edges"] = snap.edges(node_ids)
+        if "symbols" in parts:
+            symbols = snap.symbols()
+            out["symbols"] = symbols if node_ids is None else {k: v for k, v in symbols.items() if v in node_ids}
+        if "imports" in parts:
+            imports = snap.imports()
+            out["imports"] = imports if node_ids is None else {k: v for k, v in imports.items() if k in node_ids}
+    return out
+
+
+def snapshot_is_current(path: str, builder: Optional[str] = None) -> bool:
+    """
+    True when `path` is a readable snapshot of this format version written by
+    the current builder (or `builder`); anything else should be rebuilt.
+    """
+    if builder is None:
+        from cpg_builder import builder_version
+        builder = builder_version()
+    try:
+        with CPGSnapshot(path) as snap:
+            return snap.version == SNAPSHOT_VERSION and snap.builder == builder
+    except (OSError, ValueError, KeyError, struct.error):
+        return False
+
+
+def graph_from_snapshot(data: Dict[str, Any]):
+    """Rebuild the networkx DiGraph build_cpg() returns alongside nodes / edges."""
+    import networkx as nx
+    G = nx.DiGraph()
+    for n in data.get("nodes", []):
+        G.add_node(n["id"], **n)
+    for e in data.get("edges", []):
+        G.add_edge(e["source"], e["target"], type=e.get("type", "calls"))
+    return G
@@ -0,0 +1,259 @@
+"""
+edge_table.py - Integer-coded edge table with vectorized validation / dedupe
+
+Edges are held as one numpy structured array instead of a list of dicts:
+  source, target  int32   index into the table's node-id vocabulary (-1 = unknown)
+  type            uint8   index into the edge-type vocabulary
+  confidence      float32
+  description     int32   index into a text table (-1 = none)
+Validation, type normalisation, self-loop removal and per-pair priority
+selection are array operations; string ids and dicts are only materialised
+by to_dicts() at the API boundary.
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+EDGE_DTYPE = np.dtype([
+    ("source",      np.int32),
+    ("target",      np.int32),
+    ("type",        np.uint8),
+    ("confidence",  np.float32),
+    ("description", np.int32),
+])
+
+# Known relation types get stable codes; anything else is appended per table
+EDGE_TYPES = ["calls", "contains", "depends_on", "structural", "dependency", "flow",
+              "uses_api", "unknown", "composition", "inheritance", "inherits", "import",
+              "imports", "same_file", "coupling", "temporal", "data_flow"]
+
+# Relation types merged by validation ('contains' stays separate for the filters;
+# 'depends_on', 'calls', 'contains', 'uses_api' pass through unchanged)
+TYPE_ALIASES = {
+    "composition": "structural",
+    "inheritance": "structural",
+    "inherits":    "structural",
+    "import":      "dependency",
+    "imports":     "dependency",
+    "same_file":   "dependency",
+    "coupling":    "dependency",
+    "temporal":    "flow",
+    "flow":        "flow",
+    "data_flow":   "flow",
+}
+
+# Best edge per (source, target) pair — lower wins, unlisted types rank last
+TYPE_PRIORITY = {
+    "calls":      1,
+    "contains":   2,
+    "depends_on": 3,
+    "structural": 4,
+    "dependency": 5,
+    "flow":       6,
+    "unknown":    7,
+}
+DEFAULT_PRIORITY = 99
+
+MAX_TYPES = 256
+
+
+def _confidence(value) -> float:
+    """LLM edges sometimes carry confidence as a string or null."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+class EdgeTable:
+    """Columnar edge list over a shared node-id vocabulary."""
+
+    def __init__(self, node_ids: Optional[Iterable[str]] = None, frozen: bool = False):
+        """
+        node_ids seeds the vocabulary. A frozen vocabulary maps unseen ids to
+        -1 (how validation rejects edges to unknown nodes); otherwise they are
+        interned.
+        """
+        # dicts keep insertion order, so the index doubles as the id list
+        self.index: Dict[str, int] = {}
+        for nid in node_ids or ():
+            self.index.setdefault(nid, len(self.index))
+        self.frozen = frozen
+        self.types: List[str] = list(EDGE_TYPES)
+        self.type_index: Dict[str, int] = {t: i for i, t in enumerate(self.types)}
+        self.texts: List[str] = []
+        self.data = np.empty(0, dtype=EDGE_DTYPE)
+        self._ids: Optional[List[str]] = None
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def ids(self) -> List[str]:
+        """Node id per code (rebuilt only after the vocabulary grew)."""
+        if self._ids is None or len(self._ids) != len(self.index):
+            self._ids = list(self.index)
+        return self._ids
+
+    # ------------------------------------------------------------------
+    # Building
+    # ------------------------------------------------------------------
+
+    def _node_codes(self, values: List) -> np.ndarray:
+        index = self.index
+        if self.frozen:
+            get = index.get
+            return np.fromiter((get(v, -1) if v else -1 for v in values), np.int32, len(values))
+        intern = index.setdefault
+        return np.fromiter((intern(v, len(index)) if v else -1 for v in values), np.int32, len(values))
+
+    def type_code(self, name: str) -> int:
+        code = self.type_index.get(name)
+        if code is None:
+            if len(self.types) >= MAX_TYPES:
+                return self.type_index["unknown"]
+            code = self.type_index[name] = len(self.types)
+            self.types.append(name)
+        return code
+
+    def extend(self, edges: Iterable[Dict]) -> "EdgeTable":
+        """Append edge dicts (source / target / type / confidence / description)."""
+        edges = edges if isinstance(edges, list) else list(edges)
+        n = len(edges)
+        block = np.empty(n, dtype=EDGE_DTYPE)
+        block["source"] = self._node_codes([e.get("source") for e in edges])
+        block["target"] = self._node_codes([e.get("target") for e in edges])
+
+        type_get, type_code = self.type_index.get, self.type_code
+        block["type"] = np.fromiter(
+            (type_get(t) if t in self.type_index else type_code(t)
+             for t in (e.get("type", "unknown") for e in edges)), np.uint8, n)
+
+        confidence = [e.get("confidence", 1.0) for e in edges]
+        try:
+            block["confidence"] = confidence
+        except (TypeError, ValueError):
+            block["confidence"] = [_confidence(c) for c in confidence]
+
+        descriptions = [e.get("description") for e in edges]
+        has_text = np.fromiter((bool(d) for d in descriptions), bool, n)
+        block["description"] = np.where(has_text, np.cumsum(has_text) - 1 + len(self.texts), -1)
+        self.texts.extend(d for d in descriptions if d)
+
+        self.data = np.concatenate([self.data, block]) if len(self.data) else block
+        return self
+
+    @classmethod
+    def from_dicts(cls, edges: Iterable[Dict], node_ids: Optional[Iterable[str]] = None,
+                   frozen: bool = False) -> "EdgeTable":
+        return cls(node_ids, frozen=frozen).extend(edges)
+
+    # ------------------------------------------------------------------
+    # Vectorized passes (each returns self)
+    # ------------------------------------------------------------------
+
+    def drop_invalid(self) -> "EdgeTable":
+        """Remove edges with a missing / unknown endpoint and self-loops."""
+        d = self.data
+        self.data = d[(d["source"] >= 0) & (d["target"] >= 0) & (d["source"] != d["target"])]
+        return self
+
+    def normalize_types(self, aliases: Dict[str, str] = TYPE_ALIASES) -> "EdgeTable":
+        """Map type codes through `aliases` with one lookup-table gather."""
+        lookup = np.arange(len(self.types), dtype=np.uint8)
+        for alias, canonical in aliases.items():
+            if alias in self.type_index:
+                lookup[self.type_index[alias]] = self.type_code(canonical)
+        self.data["type"] = lookup[self.data["type"]]
+        return self
+
+    def _pair_keys(self) -> np.ndarray:
+        """One int64 per edge identifying its (source, target) pair."""
+        return (self.data["source"].astype(np.int64) << 32) | (self.data["target"].astype(np.int64) & 0xFFFFFFFF)
+
+    @staticmethod
+    def _sorted_by(keys: np.ndarray, within: np.ndarray) -> np.ndarray:
+        """Row order sorted by keys, then `within`, then original position (two stable sorts)."""
+        order = np.argsort(within, kind="stable")
+        return order[np.argsort(keys[order], kind="stable")]
+
+    @staticmethod
+    def _heads(*sorted_columns: np.ndarray) -> np.ndarray:
+        """True where a sorted row starts a new group over the given columns."""
+        n = len(sorted_columns[0])
+        head = np.ones(n, dtype=bool)
+        if n > 1:
+            head[1:] = False
+            for col in sorted_columns:
+                head[1:] |= col[1:] != col[:-1]
+        return head
+
+    def dedupe(self) -> "EdgeTable":
+        """Drop repeated (source, target, type) triples; first occurrence wins, order kept."""
+        if len(self.data) < 2:
+            return self
+        keys, types = self._pair_keys(), self.data["type"]
+        order = self._sorted_by(keys, types)
+        first = order[self._heads(keys[order], types[order])]
+        self.data = self.data[np.sort(first)]
+        return self
+
+    def select_best(self, priority: Dict[str, int] = TYPE_PRIORITY) -> "EdgeTable":
+        """
+        Keep one edge per (source, target) pair: the lowest-priority type,
+        the earliest edge on ties. Pairs stay in first-seen order.
+        """
+        if len(self.data) < 2:
+            return self
+        ranks = np.full(len(self.types), DEFAULT_PRIORITY, dtype=np.int32)
+        for name, rank in priority.items():
+            if name in self.type_index:
+                ranks[self.type_index[name]] = rank
+        keys  = self._pair_keys()
+        order = self._sorted_by(keys, ranks[self.data["type"]])
+        head  = self._heads(keys[order])
+        best  = order[head]   # winner per pair
+        # a pair keeps the position of its first edge, as the dict-based pass did
+        group_first = np.minimum.reduceat(order, np.flatnonzero(head))
+        self.data = self.data[best[np.argsort(group_first, kind="stable")]]
+        return self
+
+    def type_counts(self) -> Dict[str, int]:
+        counts = np.bincount(self.data["type"], minlength=len(self.types))
+        return {self.types[i]: int(c) for i, c in enumerate(counts) if c}
+
+    # ------------------------------------------------------------------
+    # Materialisation
+    # ------------------------------------------------------------------
+
+    def to_dicts(self, node_files: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """
+        Edge dicts for the API. With node_files (id → file) each edge also
+        gets source_file / target_file / cross_file, compared on codes.
+        """
+        d = self.data
+        ids, types, texts = self.ids, self.types, self.texts
+        src, tgt = d["source"].tolist(), d["target"].tolist()
+        typ      = d["type"].tolist()
+        conf     = np.round(d["confidence"].astype(np.float64), 6).tolist()
+        desc     = d["description"].tolist()
+        if node_files is None:
+            return [{"source": ids[s], "target": ids[t], "type": types[ty], "confidence": c,
+                     **({"description": texts[x]} if x >= 0 else {})}
+                    for s, t, ty, c, x in zip(src, tgt, typ, conf, desc)]
+
+        files     = [node_files.get(nid, "") for nid in ids]
+        file_code = {f: i for i, f in enumerate(dict.fromkeys(files))}
+        codes     = np.array([file_code[f] for f in files], dtype=np.int32)
+        cross     = (codes[d["source"]] != codes[d["target"]]).tolist() if len(d) else []
+        return [{
+            "source":      ids[s],
+            "target":      ids[t],
+            "type":        types[ty],
+            "description": texts[x] if x >= 0 else "",
+            "source_file": files[s],
+            "target_file": files[t],
+            "cross_file":  x_file,
+            "confidence":  c,
+        } for s, t, ty, c, x, x_file in zip(src, tgt, typ, conf, desc, cross)]
@@ -9,10 +9,20 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.preprocessing import StandardScaler
 
 
-def prepare_initial_features(nodes: List[Dict]) -> np.ndarray:
+# Parse-pass complexity metrics (cpg_builder); appended only on request so the
+# default 77-dim layout expected by the pretrained GNN is unchanged.
+COMPLEXITY_FEATURES = [
+    'cyclomatic_complexity', 'cognitive_complexity', 'max_nesting',
+    'branch_count', 'param_count',
+]
+
+
+def prepare_initial_features(nodes: List[Dict], include_complexity: bool = False) -> np.ndarray:
     """
     Prepare enhanced initial features for code nodes.
     Combines text-based TF-IDF features with structural/topological metrics.
+    With include_complexity=True the five complexity metrics are appended
+    (log-scaled) to the structural block.
     """
     print(f"Preparing enhanced initial features for {len(nodes)} nodes...")
     
@@ -50,6 +60,8 @@ def prepare_initial_features(nodes: List[Dict]) -> np.ndarray:
         
         vec = [fan_in, fan_out, total_deg, bc, depth, r_sinks, r_srcs, 
                loc, is_func, is_class, is_api, is_entry, has_auth]
+        if include_complexity:
+            vec += [np.log1p(n.get(k, 0)) for k in COMPLEXITY_FEATURES]
         structural.append(vec)
         
     structural = np.array(structural)
@@ -1,5 +1,173 @@
+import math
+from typing import Dict, List
+
 import networkx as nx
 
+
+# ---------------------------------------------------------------------------
+# DOMINATOR TREE (Lengauer-Tarjan, path compression — O(E log N))
+# ---------------------------------------------------------------------------
+
+def _immediate_dominators(succ: List[List[int]], root: int) -> tuple:
+    """
+    Immediate dominators of every vertex reachable from `root`.
+
+    `succ` is an adjacency list over integer vertex ids. Returns
+    (idom, dfs_order) where idom[v] == -1 for unreachable vertices and
+    idom[root] == root. Iterative throughout so deep call chains cannot
+    hit the recursion limit.
+    """
+    n        = len(succ)
+    dfnum    = [-1] * n
+    parent   = [-1] * n
+    pred     = [[] for _ in range(n)]
+    vertex   = [root]
+    dfnum[root] = 0
+
+    stack = [(root, iter(succ[root]))]
+    while stack:
+        v, it = stack[-1]
+        for w in it:
+            pred[w].append(v)
+            if dfnum[w] == -1:
+                dfnum[w]  = len(vertex)
+                parent[w] = v
+                vertex.append(w)
+                stack.append((w, iter(succ[w])))
+                break
+        else:
+            stack.pop()
+
+    semi     = dfnum[:]
+    label    = list(range(n))
+    ancestor = [-1] * n
+    idom     = [-1] * n
+    bucket   = [[] for _ in range(n)]
+
+    def _eval(v: int) -> int:
+        if ancestor[v] == -1:
+            return v
+        path = []
+        u = v
+        while ancestor[ancestor[u]] != -1:
+            path.append(u)
+            u = ancestor[u]
+        for u in reversed(path):
+            a = ancestor[u]
+            if semi[label[a]] < semi[label[u]]:
+                label[u] = label[a]
+            ancestor[u] = ancestor[a]
+        return label[v]
+
+    for i in range(len(vertex) - 1, 0, -1):
+        w = vertex[i]
+        for v in pred[w]:
+            u = _eval(v)
+            if semi[u] < semi[w]:
+                semi[w] = semi[u]
+        bucket[vertex[semi[w]]].append(w)
+        p = parent[w]
+        ancestor[w] = p
+        for v in bucket[p]:
+            u = _eval(v)
+            idom[v] = u if semi[u] < semi[v] else p
+        bucket[p].clear()
+
+    for i in range(1, len(vertex)):
+        w = vertex[i]
+        if idom[w] != vertex[semi[w]]:
+            idom[w] = idom[idom[w]]
+    idom[root] = root
+    return idom, vertex
+
+
+def _reverse_reach_counts(G: nx.DiGraph) -> Dict[str, int]:
+    """
+    Number of distinct nodes that can reach each node (transitive callers).
+
+    Propagates ancestor bitsets over the SCC condensation in topological
+    order instead of running one ancestors() traversal per node. Bitsets are
+    released once every successor component has consumed them.
+    """
+    if len(G) == 0:
+        return {}
+    C       = nx.condensation(G)
+    members = nx.get_node_attributes(C, "members")
+    index   = {node_id: i for i, node_id in enumerate(G.nodes())}
+
+    member_mask = {}
+    for c, nodes_in_c in members.items():
+        mask = 0
+        for node_id in nodes_in_c:
+            mask |= 1 << index[node_id]
+        member_mask[c] = mask
+
+    pending = {c: C.out_degree(c) for c in C.nodes()}
+    reach   = {}   # component -> bitset of nodes reaching it (excluding itself)
+    counts  = {}
+    for c in nx.topological_sort(C):
+        bits = 0
+        for p in C.predecessors(c):
+            bits |= reach[p] | member_mask[p]
+            pending[p] -= 1
+            if pending[p] == 0:
+                del reach[p]
+        reach[c] = bits
+        if pending[c] == 0:
+            del reach[c]
+        size  = len(members[c])
+        total = bin(bits).count("1") + (size - 1 if size > 1 else 0)
+        for node_id in members[c]:
+            counts[node_id] = total
+    return counts
+
+
+def compute_blast_radius(G: nx.DiGraph, entry_nodes: List[str]) -> None:
+    """
+    Deterministic blast radius for every node, attached in place.
+
+      dominated_count     — size of the node's dominator subtree (excluding
+                            itself) when the graph is rooted at the entry
+                            points: nodes only reachable through this one.
+      reverse_reach_count — transitive callers affected by a change here.
+      blast_radius_score  — integer 1–10, log-scaled over the graph size.
+
+    Falls back to zero in-degree roots when no entry point was detected.
+    """
+    ids = list(G.nodes())
+    n   = len(ids)
+    if n == 0:
+        return
+    index = {node_id: i for i, node_id in enumerate(ids)}
+
+    roots = [e for e in entry_nodes if e in index]
+    if not roots:
+        roots = [node_id for node_id in ids if G.in_degree(node_id) == 0]
+
+    # Virtual root (index n) fans out to every entry so a single dominator
+    # tree covers multi-entry codebases.
+    succ = [[index[t] for t in G.successors(node_id)] for node_id in ids]
+    succ.append([index[r] for r in roots])
+    idom, order = _immediate_dominators(succ, n)
+
+    subtree = [1] * (n + 1)
+    for v in reversed(order[1:]):
+        subtree[idom[v]] += subtree[v]
+
+    reverse_counts = _reverse_reach_counts(G)
+    scale = math.log1p(max(n - 1, 1))
+
+    for node_id in ids:
+        i         = index[node_id]
+        dominated = subtree[i] - 1 if idom[i] != -1 else 0
+        callers   = reverse_counts.get(node_id, 0)
+        impact    = dominated + callers
+        score     = 1 + round(9 * math.log1p(impact) / scale)
+        G.nodes[node_id]['dominated_count']     = dominated
+        G.nodes[node_id]['reverse_reach_count'] = callers
+        G.nodes[node_id]['blast_radius_score']  = max(1, min(10, score))
+
+
 def compute_graph_features(G: nx.DiGraph) -> nx.DiGraph:
     """Compute and attach feature engineering attributes to nodes for the GNN."""
     
@@ -63,4 +231,7 @@ def compute_graph_features(G: nx.DiGraph) -> nx.DiGraph:
         api_calls = G.nodes[node_id].get('api_calls')
         G.nodes[node_id]['num_api_calls'] = len(api_calls) if isinstance(api_calls, list) else 0
 
+    # 6. Blast radius (dominator subtree + reverse reachability)
+    compute_blast_radius(G, entry_nodes)
+
     return G
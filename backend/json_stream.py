@@ -0,0 +1,153 @@
+"""
+json_stream.py - Incremental extraction of JSON objects from a streamed answer
+
+The Mapper and Linker answer with one JSON object holding arrays of
+per-node objects:
+
+    {"classifications": [{"id": ...}, {"id": ...}, ...]}
+    {"results": [{"id": ...}, ...], "relationships": [...]}
+
+With converse_stream the text arrives in small deltas. JsonStream scans it
+as it arrives (strings, escapes and nesting tracked character by
+character, never re-scanning) and returns each element of a watched array
+as soon as its closing brace has arrived, so the caller can act on a node
+long before the answer is complete.
+
+The same scan notices answers that can no longer match the schema and
+raises OffSchema, so the caller can abort the stream instead of paying for
+the rest of it:
+
+  - prose instead of JSON (no '{' within MAX_PREAMBLE_CHARS)
+  - brackets that do not match
+  - an element of a watched array that is not an object, does not parse,
+    or lacks a required key
+  - more elements than the array's limit (the model repeating itself)
+
+Markdown fences and text after the closing brace are ignored. The full
+text is still parsed at the end (orchestrator._parse_json_response); the
+streamed elements are for acting early, not a second source of truth.
+"""
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+MAX_PREAMBLE_CHARS = 200   # a fence / "Here is the JSON:" is shorter than this
+
+_WHITESPACE = " \t\r\n"
+
+
+class OffSchema(ValueError):
+    """The streamed answer can no longer match the expected schema."""
+
+
+class JsonStream:
+    """
+    Incremental scanner for one streamed answer. `arrays` maps each watched
+    top-level key to (element limit or None, keys every element must hold).
+    feed() returns the elements completed by the new text as (key, element)
+    and passes each to `on_item`, if given.
+    """
+
+    def __init__(self, arrays: Dict[str, Tuple[Optional[int], Tuple[str, ...]]],
+                 on_item: Optional[Callable[[str, Dict], None]] = None,
+                 max_preamble: int = MAX_PREAMBLE_CHARS):
+        self.arrays       = arrays
+        self.on_item      = on_item
+        self.max_preamble = max_preamble
+        self.reset()
+
+    def reset(self):
+        """Forget everything fed so far (a retried call streams a new answer)."""
+        self.text = ""
+        self.items: List[Tuple[str, Dict]] = []
+        self.counts: Dict[str, int] = {}
+        self.done = False
+        self._pos         = 0
+        self._stack: List[str] = []
+        self._in_string   = False
+        self._escape      = False
+        self._string_at   = -1     # start of the current depth-1 string
+        self._last_string: Optional[str] = None
+        self._key: Optional[str] = None
+        self._array: Optional[str] = None    # watched array being scanned
+        self._element_at  = -1     # start of the current element of that array
+
+    # ------------------------------------------------------------------
+    # Scanning
+    # ------------------------------------------------------------------
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict]]:
+        self.text += chunk
+        out: List[Tuple[str, Dict]] = []
+        text, stack = self.text, self._stack
+        i = self._pos
+        while i < len(text) and not self.done:
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_at >= 0:
+                        self._last_string = json.loads(text[self._string_at:i + 1])
+                        self._string_at = -1
+            elif not stack:
+                if ch == "{":
+                    stack.append("{")
+                elif i >= self.max_preamble:
+                    raise OffSchema(f"no JSON object in the first {self.max_preamble} characters")
+            elif ch == '"':
+                self._in_string = True
+                if len(stack) == 1:
+                    self._string_at = i
+                elif self._array and len(stack) == 2:
+                    raise OffSchema(f"{self._array}[{self.counts.get(self._array, 0)}] is not an object")
+            elif ch in "{[":
+                if self._array and len(stack) == 2:
+                    if ch != "{":
+                        raise OffSchema(f"{self._array}[{self.counts.get(self._array, 0)}] is not an object")
+                    self._element_at = i
+                elif len(stack) == 1 and ch == "[" and self._key in self.arrays:
+                    self._array = self._key
+                stack.append(ch)
+            elif ch in "}]":
+                if stack.pop() != ("{" if ch == "}" else "["):
+                    raise OffSchema(f"mismatched '{ch}' at character {i}")
+                if self._array and len(stack) == 2 and ch == "}":
+                    out.append(self._element(text[self._element_at:i + 1]))
+                elif self._array and len(stack) == 1:
+                    self._array = None
+                elif not stack:
+                    self.done = True
+            elif len(stack) == 1 and ch == ":":
+                self._key = self._last_string
+            elif self._array and len(stack) == 2 and ch not in _WHITESPACE and ch != ",":
+                raise OffSchema(f"{self._array}[{self.counts.get(self._array, 0)}] is not an object")
+            i += 1
+        self._pos = i
+        return out
+
+    def answer(self) -> str:
+        """The elements streamed so far as a JSON answer (what is usable of an aborted one)."""
+        return json.dumps({key: [e for k, e in self.items if k == key] for key in self.arrays})
+
+    def _element(self, raw: str) -> Tuple[str, Dict]:
+        key   = self._array
+        index = self.counts.get(key, 0)
+        try:
+            element: Any = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise OffSchema(f"{key}[{index}] does not parse: {e}") from e
+        limit, required = self.arrays[key]
+        missing = [k for k in required if k not in element]
+        if missing:
+            raise OffSchema(f"{key}[{index}] has no {', '.join(missing)}")
+        if limit is not None and index >= limit:
+            raise OffSchema(f"more than {limit} {key}")
+        self.counts[key] = index + 1
+        self.items.append((key, element))
+        if self.on_item is not None:
+            self.on_item(key, element)
+        return key, element
@@ -0,0 +1,208 @@
+"""
+llm_cache.py - Persistent, size-bounded cache for per-node LLM results
+
+One SQLite database (WAL mode) shared by every worker process, so results
+survive restarts / deploys and a re-scan only pays for code that changed.
+Keys are built by the orchestrator from the node's normalized content hash
+(whitespace, comments and position ignored), the model ids and the
+system-prompt version — see orchestrator._node_hash.
+
+  - LRU eviction once the stored values exceed max_bytes (down to 90%)
+  - entries older than ttl_seconds are treated as misses and purged
+  - hit / miss / eviction counters per process, plus cumulative counters
+    persisted in the database by flush_metrics()
+
+Configured through the environment (see from_env):
+  LLM_CACHE_PATH      database file ("off" disables the cache)
+  LLM_CACHE_MAX_MB    size bound for stored values (default 256)
+  LLM_CACHE_TTL_DAYS  entry lifetime (default 30, 0 = no expiry)
+"""
+
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+DEFAULT_PATH     = os.path.join(tempfile.gettempdir(), "codeforge_llm_cache.sqlite")
+DEFAULT_MAX_MB   = 256
+DEFAULT_TTL_DAYS = 30
+
+# How many writes between size checks (SUM over the table is not free)
+EVICT_CHECK_INTERVAL = 64
+# Only rewrite `accessed` when it is older than this — keeps hot reads read-only
+TOUCH_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key      TEXT PRIMARY KEY,
+    value    TEXT NOT NULL,
+    size     INTEGER NOT NULL,
+    created  REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed);
+CREATE TABLE IF NOT EXISTS metrics (
+    name  TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+COUNTERS = ("hits", "misses", "expired", "writes", "evictions")
+
+
+class LLMResultCache:
+    """Thread- and process-safe key → JSON value store with LRU + TTL."""
+
+    def __init__(self, path: str = DEFAULT_PATH, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024,
+                 ttl_seconds: Optional[float] = DEFAULT_TTL_DAYS * 86400):
+        self.path        = path
+        self.max_bytes   = max_bytes
+        self.ttl_seconds = ttl_seconds or None
+        self._local      = threading.local()
+        self._lock       = threading.Lock()
+        self._counters   = {c: 0 for c in COUNTERS}
+        self._flushed    = {c: 0 for c in COUNTERS}
+        self._writes_since_check = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        self._evict_if_needed()
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMResultCache"]:
+        path = os.getenv("LLM_CACHE_PATH", DEFAULT_PATH)
+        if path.strip().lower() in ("", "off", "none", "0"):
+            return None
+        max_mb   = float(os.getenv("LLM_CACHE_MAX_MB", DEFAULT_MAX_MB))
+        ttl_days = float(os.getenv("LLM_CACHE_TTL_DAYS", DEFAULT_TTL_DAYS))
+        return cls(path, max_bytes=int(max_mb * 1024 * 1024), ttl_seconds=ttl_days * 86400)
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside a writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] += n
+
+    # ------------------------------------------------------------------
+    # Get / set
+    # ------------------------------------------------------------------
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        row  = conn.execute("SELECT value, created, accessed FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self._count("misses")
+            return None
+        value, created, accessed = row
+        now = time.time()
+        if self.ttl_seconds and now - created > self.ttl_seconds:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._count("expired")
+            self._count("misses")
+            return None
+        if now - accessed > TOUCH_INTERVAL:
+            conn.execute("UPDATE entries SET accessed = ? WHERE key = ?", (now, key))
+        self._count("hits")
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        data = json.dumps(value, separators=(",", ":"), default=str)
+        now  = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+            (key, data, len(data), now, now),
+        )
+        self._count("writes")
+        with self._lock:
+            self._writes_since_check += 1
+            check = self._writes_since_check >= EVICT_CHECK_INTERVAL
+            if check:
+                self._writes_since_check = 0
+        if check:
+            self._evict_if_needed()
+
+    # ------------------------------------------------------------------
+    # Eviction
+    # ------------------------------------------------------------------
+
+    def _evict_if_needed(self):
+        """Purge expired entries, then least-recently-used ones down to 90% of max_bytes."""
+        conn = self._conn()
+        if self.ttl_seconds:
+            cur = conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.ttl_seconds,))
+            if cur.rowcount > 0:
+                self._count("expired", cur.rowcount)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT key, size FROM entries ORDER BY accessed ASC").fetchall()
+            doomed = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                doomed.append((key,))
+                total -= size
+            conn.executemany("DELETE FROM entries WHERE key = ?", doomed)
+            evicted = len(doomed)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        if evicted:
+            self._count("evictions", evicted)
+            print(f"[Cache] Evicted {evicted} least-recently-used entries (bound {self.max_bytes // 1024} KB)")
+
+    def clear(self):
+        self._conn().execute("DELETE FROM entries")
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def flush_metrics(self):
+        """Add this process's counters since the last flush to the persisted totals."""
+        with self._lock:
+            delta = {c: self._counters[c] - self._flushed[c] for c in COUNTERS}
+            self._flushed = dict(self._counters)
+        self._conn().executemany(
+            "INSERT INTO metrics (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+            [(c, n) for c, n in delta.items() if n],
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Process counters, hit rate, stored size and persisted lifetime totals."""
+        conn = self._conn()
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        lifetime = dict(conn.execute("SELECT name, value FROM metrics").fetchall())
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["hits"] + counters["misses"]
+        total_hits = lifetime.get("hits", 0)
+        total_lookups = total_hits + lifetime.get("misses", 0)
+        return {
+            **counters,
+            "hit_rate":          round(counters["hits"] / lookups, 3) if lookups else 0.0,
+            "entries":           entries,
+            "bytes":             size,
+            "max_bytes":         self.max_bytes,
+            "lifetime_hit_rate": round(total_hits / total_lookups, 3) if total_lookups else 0.0,
+            "lifetime":          lifetime,
+        }
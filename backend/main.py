@@ -5,11 +5,18 @@ from fastapi.staticfiles import StaticFiles
 import uuid
 import os
 import shutil
-from typing import List
+from typing import List, Optional
 import time
 from cpg_builder import build_cpg
+import orchestrator
 from orchestrator import discover_relations_orchestrated
+from async_orchestrator import run_orchestration, cancel_orchestration, loop_stats, JobCancelled
 from risk_ast import build_risk_ast
+from reachability import ReachabilityIndex
+from scope_policy import apply_scope_policy, load_scope_policy
+from snippet_store import SnippetStoreWriter, SnippetStore, INDEX_FILE
+from cpg_snapshot import save_snapshot, load_snapshot, graph_from_snapshot, SNAPSHOT_FILE
+from edge_table import EdgeTable, TYPE_ALIASES, TYPE_PRIORITY
 from feature_engineering import generate_embeddings
 from clustering import cluster_nodes, label_clusters_with_llm
 
@@ -36,6 +43,85 @@ app.add_middleware(
 # Mock in-memory status
 JOB_STATUS = {}
 JOB_RESULTS = {}
+JOB_INDEXES = {}   # job_id -> ReachabilityIndex (kept out of the JSON results)
+JOB_SNIPPETS = {}  # job_id -> SnippetStore (source lives on disk, not in node dicts)
+
+# "thread" (per-job thread pools) or "async" (one shared event loop, cancellable)
+ORCHESTRATOR_MODE = os.getenv("ORCHESTRATOR_MODE", "thread").strip().lower()
+
+# Snippet stores outlive the upload temp dir, which may be cleaned up mid-job
+import tempfile as _tempfile_mod
+SNIPPET_ROOT = os.getenv("SNIPPET_STORE_DIR", os.path.join(_tempfile_mod.gettempdir(), "codeforge_snippets"))
+
+def _job_dir(job_id: str) -> str:
+    """Per-job directory holding the snippet store and the CPG snapshot."""
+    return os.path.join(SNIPPET_ROOT, job_id)
+
+# Finished jobs kept in memory and on disk; older ones are evicted with their directory
+MAX_STORED_JOBS = int(os.getenv("MAX_STORED_JOBS", "50"))
+
+def _job_running(job_id: str) -> bool:
+    status = JOB_STATUS.get(job_id)
+    return status is not None and not status.startswith(("Done", "Failed", "Cancelled"))
+
+def _evict_job(job_id: str):
+    """Drop a job's results, index and snippet store, and delete its directory."""
+    for store in (JOB_STATUS, JOB_RESULTS, JOB_INDEXES):
+        store.pop(job_id, None)
+    snippets = JOB_SNIPPETS.pop(job_id, None)
+    if snippets is not None:
+        snippets.close()
+    shutil.rmtree(_job_dir(job_id), ignore_errors=True)
+
+def _evict_old_jobs(keep: Optional[int] = None):
+    """Evict finished jobs beyond the `keep` most recently written (MAX_STORED_JOBS)."""
+    keep = MAX_STORED_JOBS if keep is None else keep
+    on_disk  = set(os.listdir(SNIPPET_ROOT)) if os.path.isdir(SNIPPET_ROOT) else set()
+    finished = [j for j in on_disk | set(JOB_RESULTS) if not _job_running(j)]
+    if len(finished) <= keep:
+        return
+    def written(job_id):
+        try:
+            return os.path.getmtime(_job_dir(job_id))
+        except OSError:
+            return 0.0
+    finished.sort(key=written, reverse=True)
+    for job_id in finished[keep:]:
+        _evict_job(job_id)
+    print(f"[Jobs] Evicted {len(finished) - keep} old job(s), keeping {keep}")
+
+def _load_job(job_id: str) -> Optional[dict]:
+    """
+    Results of a job — from memory, or restored from its CPG snapshot after a
+    restart (snippets and the reachability index are reopened alongside).
+    """
+    if job_id in JOB_RESULTS:
+        return JOB_RESULTS[job_id]
+    if os.path.basename(job_id) != job_id:
+        return None
+    snapshot_path = os.path.join(_job_dir(job_id), SNAPSHOT_FILE)
+    if not os.path.exists(snapshot_path):
+        return None
+    try:
+        data = load_snapshot(snapshot_path)
+    except Exception as e:
+        print(f"[Snapshot] Could not restore job {job_id}: {e}")
+        return None
+    meta = data.get("meta", {})
+    JOB_RESULTS[job_id] = {
+        "nodes": data["nodes"],
+        "edges": data["edges"],
+        "report": meta.get("report", ""),
+        "stats": meta.get("stats", {}),
+        "tree_data": format_for_react_flow(data["nodes"], data["edges"]),
+        "clusters": meta.get("clusters", []),
+    }
+    JOB_INDEXES[job_id] = ReachabilityIndex(graph_from_snapshot(data))
+    if os.path.exists(os.path.join(_job_dir(job_id), INDEX_FILE)):
+        JOB_SNIPPETS[job_id] = SnippetStore(_job_dir(job_id))
+    JOB_STATUS[job_id] = "Done"
+    print(f"[Snapshot] Restored job {job_id} ({len(data['nodes'])} nodes)")
+    return JOB_RESULTS[job_id]
 
 import shutil
 from typing import List, Optional
@@ -46,13 +132,14 @@ from fastapi import Form
 
 # ... imports ...
 
-def update_status(job_id: str, step: int, total_steps: int, message: str):
+def update_status(job_id: str, step: int, total_steps: int, message: str, extra: Optional[dict] = None):
     """Helper to update job status with structured data."""
     status_data = {
         "step": step,
         "total": total_steps,
         "message": message,
-        "timestamp": time.time()
+        "timestamp": time.time(),
+        **(extra or {})
     }
     JOB_STATUS[job_id] = json.dumps(status_data)
     print(f"Job {job_id} [{step}/{total_steps}]: {message}")
@@ -117,28 +204,33 @@ def run_pipeline_with_clone(job_id: str, repo_url: str, target_path: str):
 
 @app.get("/status/{job_id}")
 def get_status(job_id: str):
+    if job_id not in JOB_STATUS:
+        _load_job(job_id)
     return {"status": JOB_STATUS.get(job_id, "Unknown")}
 
 @app.get("/tree/{job_id}")
 def get_tree(job_id: str):
     # Returns React Flow compatible nodes/edges
-    if job_id not in JOB_RESULTS:
+    results = _load_job(job_id)
+    if results is None:
         return {"nodes": [], "edges": []}
-    return JOB_RESULTS[job_id]["tree_data"]
+    return results["tree_data"]
 
 @app.get("/results/{job_id}")
 def get_results(job_id: str):
-    if job_id not in JOB_RESULTS:
+    results = _load_job(job_id)
+    if results is None:
         return JSONResponse(status_code=404, content={"error": "Results not found or not ready."})
-    return JOB_RESULTS[job_id]
+    return results
 
 @app.get("/node/{job_id}/{node_id}")
 def get_node_details(job_id: str, node_id: str):
     """Get detailed information for a specific node (lazy loading)"""
-    if job_id not in JOB_RESULTS:
+    results = _load_job(job_id)
+    if results is None:
         return JSONResponse(status_code=404, content={"error": "Job not found"})
     
-    nodes = JOB_RESULTS[job_id]['nodes']
+    nodes = results['nodes']
     node = next((n for n in nodes if n['id'] == node_id), None)
     
     if not node:
@@ -150,6 +242,9 @@ def get_node_details(job_id: str, node_id: str):
         "type": node['type'],
         "file": node.get('file'),
         "line_start": node.get('line_start'),
+        "byte_start": node.get('byte_start'),
+        "byte_end": node.get('byte_end'),
+        "has_source": job_id in JOB_SNIPPETS and node_id in JOB_SNIPPETS[job_id],
         "loc": node.get('loc'),
         "language": node.get('language'),
         "risk_level": node.get('risk_level'),
@@ -165,15 +260,51 @@ def get_node_details(job_id: str, node_id: str):
         "node_summary": node.get('node_summary')
     }
 
+@app.get("/source/{job_id}/{node_id}")
+def get_node_source(job_id: str, node_id: str, max_bytes: Optional[int] = None):
+    """Source of a function / class, read lazily from the job's snippet store."""
+    if job_id not in JOB_SNIPPETS:
+        _load_job(job_id)
+    store = JOB_SNIPPETS.get(job_id)
+    if store is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found or not ready."})
+    source = store.get(node_id, max_bytes=max_bytes)
+    if source is None:
+        return JSONResponse(status_code=404, content={"error": "No source stored for this node."})
+    return {"id": node_id, "source": source, "size": store.size(node_id),
+            "truncated": max_bytes is not None and store.size(node_id) > max_bytes}
+
+@app.get("/reach/{job_id}")
+def get_reachability(job_id: str, source: str, target: str):
+    """Can `source` reach `target`? Returns an example shortest path if so."""
+    if job_id not in JOB_INDEXES:
+        _load_job(job_id)
+    index = JOB_INDEXES.get(job_id)
+    if index is None:
+        return JSONResponse(status_code=404, content={"error": "Job not found or not ready."})
+    path = index.path(source, target)
+    return {"source": source, "target": target, "reachable": path is not None, "path": path or []}
+
 @app.get("/report/{job_id}")
 def get_report(job_id: str):
-    if job_id not in JOB_RESULTS:
+    results = _load_job(job_id)
+    if results is None:
         return {"content": "Not ready."}
-    return {"content": JOB_RESULTS[job_id]["report"]}
+    return {"content": results["report"]}
+
+@app.post("/cancel/{job_id}")
+def cancel_job(job_id: str):
+    """Abort a job's AI analysis (async orchestrator only); in-flight LLM calls are dropped."""
+    if not cancel_orchestration(job_id):
+        return JSONResponse(status_code=409, content={
+            "error": "No cancellable analysis running for this job "
+                     f"(orchestrator mode: {ORCHESTRATOR_MODE})."})
+    return {"job_id": job_id, "cancelled": True}
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy"}
+    return {"status": "healthy", "orchestrator": {"mode": ORCHESTRATOR_MODE, **loop_stats(),
+                                                  "rate_limits": orchestrator.rate_limiter.metrics()}}
 
 # Serve frontend static files (for Railway deployment)
 frontend_dist_path = os.path.join(os.path.dirname(__file__), "..", "frontend", "dist")
@@ -193,13 +324,21 @@ def run_pipeline(job_id: str, zip_path: str):
         
         # 1. Build CPG
         update_status(job_id, 1, total_steps, "Building Code Property Graph...")
-        cpg_data = build_cpg(zip_path, job_id)
+        _evict_old_jobs()
+        snippet_writer = SnippetStoreWriter(_job_dir(job_id))
+        cpg_data = build_cpg(zip_path, job_id, snippet_writer=snippet_writer)
+        JOB_SNIPPETS[job_id] = snippet_writer.finalize()
         nodes = cpg_data['nodes']
         initial_edges = cpg_data['edges']
         
+        # Reachability index — built once, shared by risk profiling, the
+        # Sentinel and the /reach endpoint
+        reach_index = ReachabilityIndex(cpg_data['nx_graph'])
+        JOB_INDEXES[job_id] = reach_index
+        
         # 2. Build Risk AST Profiles
         update_status(job_id, 2, total_steps, "Building Risk AST Profiles...")
-        risk_profiles = build_risk_ast(nodes, initial_edges)
+        risk_profiles = build_risk_ast(nodes, initial_edges, reach_index=reach_index)
         print(f"Generated {len(risk_profiles)} risk profiles")
         
         # Merge Risk AST into nodes BEFORE orchestrator (so Sentinel can use it)
@@ -207,8 +346,17 @@ def run_pipeline(job_id: str, zip_path: str):
             if node['id'] in risk_profiles:
                 node['risk_ast'] = risk_profiles[node['id']]['risk_profile']
         
+        # Analysis scope — unreachable / test / dead-module policies decide
+        # how much LLM effort each node gets; savings go into the job status
+        scope_report = apply_scope_policy(nodes, initial_edges, load_scope_policy(),
+                                          module_imports=cpg_data['imports'])
+        
         # 3. Multi-Model Orchestrated Analysis (Relations, Risk & Refactoring)
-        update_status(job_id, 3, total_steps, "AI Analysis: Mapper, Linker & Sentinel...")
+        saved = scope_report["estimated_llm_calls"]
+        update_status(job_id, 3, total_steps,
+                      f"AI Analysis: Mapper, Linker & Sentinel "
+                      f"(scope policy saves ~{saved['saved']} of at least {saved['without_policy']} LLM calls)...",
+                      extra={"scope": scope_report})
         
         # Defensive fix: Ensure all nodes have valid IDs before LLM processing
         valid_nodes = [n for n in nodes if 'id' in n and n['id']]
@@ -216,7 +364,12 @@ def run_pipeline(job_id: str, zip_path: str):
             print(f"Warning: Removed {len(nodes) - len(valid_nodes)} nodes missing 'id' key.")
             nodes = valid_nodes
             
-        llm_result = discover_relations_orchestrated(nodes)
+        if ORCHESTRATOR_MODE == "async":
+            llm_result = run_orchestration(job_id, nodes, reach_index=reach_index,
+                                           snippets=JOB_SNIPPETS[job_id])
+        else:
+            llm_result = discover_relations_orchestrated(nodes, reach_index=reach_index,
+                                                         snippets=JOB_SNIPPETS[job_id])
         llm_edges = llm_result.get('edges', [])
         node_updates = llm_result.get('node_updates', {})
         
@@ -320,7 +473,11 @@ def run_pipeline(job_id: str, zip_path: str):
             "nodes": num_nodes,
             "edges": num_edges,
             "reduction": "1.0x",
-            "confidence": confidence_pct
+            "confidence": confidence_pct,
+            "scope": scope_report,
+            "llm_cache": llm_result.get("cache", {}),
+            "token_ledger": llm_result.get("token_ledger", {}),
+            "rate_limits": llm_result.get("rate_limits", {})
         }
         
         # 6. Generate Report with Architect Insight
@@ -352,8 +509,20 @@ def run_pipeline(job_id: str, zip_path: str):
             "tree_data": tree_data,
             "clusters": clusters
         }
+        
+        # Persist the final graph so the job survives a restart without re-parsing
+        try:
+            save_snapshot(os.path.join(_job_dir(job_id), SNAPSHOT_FILE),
+                          {"nodes": nodes, "edges": all_edges,
+                           "symbols": cpg_data.get("symbols"), "imports": cpg_data.get("imports")},
+                          meta={"job_id": job_id, "report": report, "stats": stats, "clusters": clusters})
+        except Exception as e:
+            print(f"Warning: CPG snapshot failed: {e}")
         JOB_STATUS[job_id] = "Done"
 
+    except JobCancelled:
+        JOB_STATUS[job_id] = "Cancelled"
+        print(f"Job {job_id}: cancelled during AI analysis")
     except Exception as e:
         import traceback
         error_msg = f"Pipeline failed: {str(e)}\n{traceback.format_exc()}"
@@ -738,90 +907,21 @@ def format_for_react_flow(nodes, edges):
 
 def validate_and_enhance_edges(edges, nodes):
     """Validate edges and remove invalid ones, enhance with additional metadata."""
-    valid_node_ids = {node['id'] for node in nodes}
-    node_lookup = {node['id']: node for node in nodes}
-    
-    validated_edges = []
-    edge_counts = {}
+    # Edges to unknown nodes get code -1 in a frozen vocabulary and are
+    # dropped with self-loops in one vectorized pass
+    table = EdgeTable.from_dicts(edges, node_ids=(node['id'] for node in nodes), frozen=True)
+    table.drop_invalid()
     
-    for edge in edges:
-        source_id = edge.get('source')
-        target_id = edge.get('target')
-        edge_type = edge.get('type', 'unknown')
-        
-        # Skip invalid edges
-        if not source_id or not target_id:
-            continue
-        if source_id not in valid_node_ids or target_id not in valid_node_ids:
-            continue
-        if source_id == target_id:  # No self-loops
-            continue
-            
-        # Normalize relation types (keep 'contains' as separate type)
-        type_map = {
-            'composition': 'structural',
-            # 'contains': 'structural',  # REMOVED - keep as separate type for filters
-            'inheritance': 'structural',
-            'inherits': 'structural',
-            'import': 'dependency',
-            'imports': 'dependency',
-            'same_file': 'dependency',
-            'coupling': 'dependency',
-            'temporal': 'flow',
-            'flow': 'flow',
-            'data_flow': 'flow'
-            # Note: 'depends_on', 'calls', 'contains', 'uses_api' pass through unchanged
-        }
-        
-        # Count original edge types for statistics
-        edge_counts[edge_type] = edge_counts.get(edge_type, 0) + 1
-        
-        # Merge types
-        edge_type = type_map.get(edge_type, edge_type)
-        
-        # Enhance edge with metadata
-        source_node = node_lookup[source_id]
-        target_node = node_lookup[target_id]
-        
-        enhanced_edge = {
-            "source": source_id,
-            "target": target_id,
-            "type": edge_type,
-            "description": edge.get('description', ''),
-            "source_file": source_node.get('file', ''),
-            "target_file": target_node.get('file', ''),
-            "cross_file": source_node.get('file') != target_node.get('file'),
-            "confidence": edge.get('confidence', 1.0)
-        }
-        
-        validated_edges.append(enhanced_edge)
+    # Count original edge types for statistics
+    edge_counts = table.type_counts()
     
-    # Remove redundant edges between same source-target pairs
+    # Normalize relation types (keep 'contains' as separate type), then keep
+    # the best edge per source-target pair
     # Priority: calls > contains > depends_on > structural > dependency > flow
-    type_priority = {
-        'calls': 1,
-        'contains': 2,
-        'depends_on': 3,
-        'structural': 4,
-        'dependency': 5,
-        'flow': 6,
-        'unknown': 7
-    }
+    table.normalize_types(TYPE_ALIASES).select_best(TYPE_PRIORITY)
     
-    # Store best edge for each (source, target) pair
-    best_edges = {}
-    for edge in validated_edges:
-        key = (edge['source'], edge['target'])
-        current_priority = type_priority.get(edge['type'], 99)
-        
-        if key not in best_edges:
-            best_edges[key] = edge
-        else:
-            existing_priority = type_priority.get(best_edges[key]['type'], 99)
-            if current_priority < existing_priority:
-                best_edges[key] = edge
-                
-    unique_edges = list(best_edges.values())
+    # String ids and file metadata are only materialised here
+    unique_edges = table.to_dicts(node_files={node['id']: node.get('file', '') for node in nodes})
     
     print(f"Edge validation: {len(edges)} -> {len(unique_edges)} edges")
     print(f"Edge types: {edge_counts}")
@@ -0,0 +1,589 @@
+"""
+mock_bedrock.py - Local Bedrock Converse endpoint for benchmarks and tests
+
+Speaks just enough HTTP/1.1 (keep-alive, Content-Length bodies) for boto3
+and async_orchestrator.AsyncBedrockClient to talk to it through
+BEDROCK_ENDPOINT_URL. Every POST /model/{modelId}/converse sleeps for a
+configurable latency and returns a deterministic, well-formed answer for
+the Mapper / Linker / Sentinel prompt it received, so both orchestrator
+paths produce identical results against it.
+
+POST /model/{modelId}/converse-stream returns the same answer as an AWS
+event stream (chunked): messageStart, contentBlockDelta events of
+stream_chunk_chars characters, messageStop and metadata. The first delta
+comes after STREAM_FIRST_TOKEN of the latency, the rest spread over the
+remainder, so a client sees the answer arrive piece by piece.
+
+  - latency per request (seconds), drawn from latency_dist:
+      "uniform"    latency ± jitter
+      "lognormal"  median latency, jitter the sigma of its log (long tail)
+      "recorded"   a replayed answer's recorded latency, else lognormal
+  - throttle_rate: fraction of requests answered 429 ThrottlingException
+  - error_rate: fraction answered 500 InternalServerException / 503
+    ServiceUnavailableException; a stream fails mid-answer with a
+    modelStreamErrorException event instead
+  - quota_rps: per-model request quota (1 s burst); requests arriving over
+    it are answered 429 ThrottlingException, like a real account quota
+  - answers longer than the request's maxTokens (≈4 chars / token) are cut
+    off with stopReason "max_tokens", like a real model
+  - batched Sentinel prompts get one report per node; bad_report_rate of
+    them (by id) are malformed, to exercise per-node retries
+  - inputTokens ≈ (system + messages) text chars / 4
+  - prompt caching: each cachePoint block marks a prefix (system, then
+    messages); a prefix seen for the same model within cache_ttl seconds is
+    a read (cacheReadInputTokens), a new one of at least cache_min_tokens a
+    write (cacheWriteInputTokens), the rest stays inputTokens.
+    cache_points=False answers cache points with a ValidationException,
+    like a model without prompt caching
+  - off_schema_rate: fraction of streamed answers (by prompt) replaced by
+    rambling prose, to exercise aborting them
+  - record / replay: with a cassette (JSON lines) each request is looked
+    up by model and body (cache points aside). A recorded answer is
+    replayed with its text, stop reason and usage; a miss is recorded from
+    `upstream` (a boto3 bedrock-runtime client, i.e. real Bedrock) once,
+    or without one answered synthetically and counted as a replay miss
+  - counters: requests, throttled, injected errors, truncated, cache read /
+    write tokens, streams, streamed text chars, streams the client closed early,
+    replayed / recorded answers, replay misses,
+    in-flight now and peak, per-role counts,
+    and a (role, start, end) timeline of answered requests
+
+Run standalone:
+    python mock_bedrock.py [--port 8765] [--latency 1.0] [--jitter 0.2] [--latency-dist uniform]
+                           [--error-rate 0] [--cassette calls.jsonl [--record]]
+then export BEDROCK_ENDPOINT_URL=http://127.0.0.1:8765
+
+--record sends cassette misses to real Bedrock (AWS_REGION and the usual
+credentials), so one run against a real codebase captures its answers and
+later runs replay them for free.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import prompt_format
+from rate_limiter import error_code
+
+_PATH_RE = re.compile(r"^/model/(?P<model>[^/]+)/(?P<op>converse|converse-stream)$")
+
+STREAM_FIRST_TOKEN = 0.2   # share of the latency before the first streamed delta
+OFF_SCHEMA_TEXT    = "Let me think about each of these nodes carefully before answering. "
+
+THROTTLE_ERROR   = "ThrottlingException:http://internal.amazon.com/coral/com.amazon.bedrock/"
+VALIDATION_ERROR = "ValidationException:http://internal.amazon.com/coral/com.amazon.bedrock/"
+SERVER_ERRORS    = (("500 Internal Server Error", "InternalServerException"),
+                    ("503 Service Unavailable", "ServiceUnavailableException"))
+LATENCY_DISTS    = ("uniform", "lognormal", "recorded")
+
+
+def _stable(value: str, modulo: int) -> int:
+    """Deterministic bucket for a string, stable across processes (unlike hash())."""
+    return int(hashlib.md5(value.encode()).hexdigest()[:8], 16) % modulo
+
+
+def _prompt_nodes(prompt: str) -> List[Dict]:
+    """
+    Node summaries embedded in a Mapper / Linker prompt after 'Nodes:', in
+    either prompt format. "id" is echoed as written (possibly an '@k'
+    reference); "key" is the expanded id, so answers do not depend on the format.
+    """
+    nodes, table = prompt_format.decode_nodes(prompt)
+    return [{**n, "key": prompt_format.expand(n["id"], table)} for n in nodes]
+
+
+def _mapper_answer(prompt: str) -> Dict:
+    classifications = []
+    for n in _prompt_nodes(prompt):
+        flags = n.get("security_flags") or {}
+        if flags.get("has_shell_call") or flags.get("has_eval") or (n.get("risk_ast") or {}).get("sinks"):
+            tier = 3
+        elif n.get("entry_point") or flags:
+            tier = 2
+        else:
+            tier = _stable(n["key"], 3)
+        classifications.append({
+            "id": n["id"], "classification": "security_sensitive" if tier == 3 else "utility",
+            "risk_tier": tier, "deep_reasoning_required": tier == 3,
+            "external_interaction_likelihood": "high" if tier >= 2 else "low", "confidence": 0.9,
+        })
+    return {"classifications": classifications}
+
+
+def _linker_answer(prompt: str) -> Dict:
+    nodes = _prompt_nodes(prompt)
+    results = [{
+        "id": n["id"], "node_summary": f"{n.get('name', n['id'])} (mock)",
+        "classification": "utility", "architectural_role": ("service", "utility", "controller")[_stable(n["key"], 3)],
+        "entry_point": {"is_entry_point": bool(n.get("entry_point")), "entry_type": n.get("entry_point", "unknown")},
+        "sensitive_behaviors": {"handles_user_input": False, "accesses_filesystem": False, "network_calls": False},
+        "impact_analysis": {"critical_path_likelihood": 1, "change_sensitivity": "low"},
+        "confidence_score": 0.85,
+    } for n in nodes]
+    relationships = [{"source": a["id"], "target": b["id"], "type": "calls", "description": "mock"}
+                     for a, b in zip(nodes, nodes[1:])]
+    return {"results": results, "relationships": relationships}
+
+
+def _sentinel_report(level: str) -> Dict:
+    return {
+        "risk_breakdown": {
+            "injection":     {"level": level, "reason": "mock"},
+            "authorization": {"level": "low", "reason": "mock"},
+            "concurrency":   {"level": "none", "reason": "mock"},
+            "exposure":      {"level": "low", "reason": "mock"},
+        },
+        "overall_risk": level, "confidence_score": 0.8, "risk_summary": f"Mock {level} risk",
+    }
+
+
+def _sentinel_answer(prompt: str, bad_report_rate: float = 0.0) -> Dict:
+    if "Shared context:" not in prompt:
+        return _sentinel_report("high" if '"has_shell_call":true' in prompt or '"has_eval":true' in prompt
+                                else "moderate")
+    # Batched: one report per node line; a bad_report_rate share of them malformed
+    # (only with several nodes — a single-node retry always gets a good report)
+    nodes = []
+    for line in prompt.partition("Nodes:\n")[2].splitlines():
+        try:
+            nodes.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+    reports = []
+    for node in nodes:
+        report = _sentinel_report("high" if node.get("has_shell_call") or node.get("has_eval") else "moderate")
+        if len(nodes) > 1 and bad_report_rate and _stable(node["id"], 1000) < bad_report_rate * 1000:
+            del report["risk_breakdown"]["exposure"]
+        reports.append({"id": node["id"], **report})
+    return {"reports": reports}
+
+
+def _event_message(event_type: str, payload: Dict, message_type: str = "event") -> bytes:
+    """One AWS event-stream message: prelude, string headers, JSON payload, CRCs."""
+    headers = b""
+    type_header = ":event-type" if message_type == "event" else ":exception-type"
+    for name, value in ((type_header, event_type), (":content-type", "application/json"),
+                        (":message-type", message_type)):
+        name_b, value_b = name.encode(), value.encode()
+        headers += struct.pack("!B", len(name_b)) + name_b + b"\x07" + struct.pack("!H", len(value_b)) + value_b
+    body    = json.dumps(payload).encode()
+    prelude = struct.pack("!II", 16 + len(headers) + len(body), len(headers))
+    message = prelude + struct.pack("!I", zlib.crc32(prelude)) + headers + body
+    return message + struct.pack("!I", zlib.crc32(message))
+
+
+def request_role(request: Dict) -> str:
+    """Orchestrator role a Converse request body was sent for, from its system prompt."""
+    system = " ".join(b.get("text", "") for b in request.get("system", []))
+    for marker, role in (("Triage", "mapper"), ("Topology", "linker"), ("Security", "sentinel")):
+        if marker in system:
+            return role
+    return "other"
+
+
+def answer_for(request: Dict, bad_report_rate: float = 0.0) -> Tuple[str, Dict]:
+    """(role, answer JSON) for a Converse request body."""
+    role   = request_role(request)
+    prompt = "".join(b.get("text", "")
+                     for m in request.get("messages", []) for b in m.get("content", []))
+    if role == "mapper":
+        return role, _mapper_answer(prompt)
+    if role == "linker":
+        return role, _linker_answer(prompt)
+    if role == "sentinel":
+        return role, _sentinel_answer(prompt, bad_report_rate)
+    return role, {"text": "ok"}
+
+
+class Cassette:
+    """
+    Recorded Converse answers, one JSON line per call, keyed by model and
+    request body. Cache points are left out of the key: they change what a
+    call costs, not what it answers.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(model: str, request: Dict) -> str:
+        def strip(blocks):
+            return [b for b in blocks if "cachePoint" not in b]
+        body = {**request, "system": strip(request.get("system", [])),
+                "messages": [{**m, "content": strip(m.get("content", []))} for m in request.get("messages", [])]}
+        return hashlib.sha256(f"{model}\n{json.dumps(body, sort_keys=True)}".encode()).hexdigest()
+
+    def get(self, model: str, request: Dict) -> Optional[Dict]:
+        return self.entries.get(self.key(model, request))
+
+    def add(self, model: str, request: Dict, response: Dict) -> Dict:
+        """Record a boto3 converse response; returns the entry."""
+        content = response.get("output", {}).get("message", {}).get("content", [])
+        entry = {
+            "key": self.key(model, request), "model": model, "role": request_role(request),
+            "text": "".join(b.get("text", "") for b in content), "stopReason": response.get("stopReason"),
+            "usage": response.get("usage", {}), "latencyMs": response.get("metrics", {}).get("latencyMs"),
+        }
+        self.entries[entry["key"]] = entry
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+        return entry
+
+
+class MockBedrock:
+    """In-process asyncio HTTP server on its own thread and event loop."""
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.0, throttle_rate: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, seed: int = 0, quota_rps: float = 0.0,
+                 bad_report_rate: float = 0.0, cache_points: bool = True,
+                 cache_min_tokens: int = 1024, cache_ttl: float = 300.0,
+                 stream_chunk_chars: int = 64, off_schema_rate: float = 0.0,
+                 latency_dist: str = "uniform", error_rate: float = 0.0,
+                 cassette: Optional[str] = None, upstream: Any = None):
+        if latency_dist not in LATENCY_DISTS:
+            raise ValueError(f"latency_dist must be one of {LATENCY_DISTS}, not {latency_dist!r}")
+        self.latency       = latency
+        self.jitter        = jitter
+        self.latency_dist  = latency_dist
+        self.throttle_rate = throttle_rate
+        self.error_rate    = error_rate
+        self.quota_rps     = quota_rps
+        self.bad_report_rate = bad_report_rate
+        self._quota: Dict[str, Tuple[float, float]] = {}   # model -> (level, updated)
+        self.cache_points     = cache_points
+        self.cache_min_tokens = cache_min_tokens
+        self.cache_ttl        = cache_ttl
+        self.stream_chunk_chars = stream_chunk_chars
+        self.off_schema_rate    = off_schema_rate
+        self._cache: Dict[Tuple[str, str], float] = {}     # (model, prefix digest) -> expiry
+        self.cassette      = Cassette(cassette) if cassette else None
+        self.upstream      = upstream
+        self.host          = host
+        self.port          = port
+        self._rng          = random.Random(seed)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server       = None
+        self._thread       = None
+        self._ready        = threading.Event()
+        self.stats: Dict[str, Any] = {"requests": 0, "throttled": 0, "truncated": 0, "in_flight": 0,
+                                      "peak_in_flight": 0, "roles": {}, "cache_read_tokens": 0,
+                                      "cache_write_tokens": 0, "streams": 0, "streamed_chars": 0,
+                                      "aborted_streams": 0, "errors": 0, "replayed": 0, "recorded": 0,
+                                      "replay_misses": 0}
+        self.timeline: List[Tuple[str, float, float]] = []   # (role, start, end) per answered request
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _latency(self, recorded: Optional[Dict] = None) -> float:
+        """Seconds to answer one request, drawn from latency_dist."""
+        if self.latency_dist == "recorded" and recorded and recorded.get("latencyMs") is not None:
+            return recorded["latencyMs"] / 1000
+        if self.latency_dist == "uniform":
+            return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+        return self.latency * math.exp(self._rng.gauss(0.0, self.jitter))
+
+    def _over_quota(self, model: str) -> bool:
+        if not self.quota_rps:
+            return False
+        now = time.monotonic()
+        level, updated = self._quota.get(model, (self.quota_rps, now))
+        level = min(self.quota_rps, level + (now - updated) * self.quota_rps)
+        over  = level < 1
+        self._quota[model] = (level if over else level - 1, now)
+        return over
+
+    def _cache_usage(self, model: str, request: Dict) -> Tuple[int, int, int]:
+        """(uncached, cache read, cache write) input tokens of a request, ≈ text chars / 4."""
+        blocks = request.get("system", []) + [b for m in request.get("messages", []) for b in m.get("content", [])]
+        digest, chars, points = hashlib.sha256(), 0, []
+        for block in blocks:
+            if "cachePoint" in block:
+                points.append((digest.hexdigest(), chars))
+            else:
+                text = block.get("text", "")
+                digest.update(text.encode())
+                chars += len(text)
+        now  = time.monotonic()
+        read = 0
+        for key, prefix in points:
+            if self._cache.get((model, key), 0) > now:
+                read = prefix
+                self._cache[(model, key)] = now + self.cache_ttl
+        written = read
+        for key, prefix in points:
+            if prefix > read and prefix // 4 >= self.cache_min_tokens:
+                self._cache[(model, key)] = now + self.cache_ttl
+                written = max(written, prefix)
+        read, write = read // 4, (written - read) // 4
+        return chars // 4 - read - write, read, write
+
+    def reset_stats(self):
+        self.stats.update(requests=0, throttled=0, truncated=0, peak_in_flight=self.stats["in_flight"], roles={},
+                          cache_read_tokens=0, cache_write_tokens=0, streams=0, streamed_chars=0,
+                          aborted_streams=0, errors=0, replayed=0, recorded=0, replay_misses=0)
+        self.timeline = []
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def start(self) -> str:
+        self._thread = threading.Thread(target=self._run, name="mock-bedrock", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self.url
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._handle, self.host, self.port, backlog=1024))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        self._server.close()
+        pending = asyncio.all_tasks(self._loop)   # connections still open / mid-latency
+        for task in pending:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        self._loop.run_until_complete(self._server.wait_closed())
+        self._loop.close()
+
+    def stop(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                status, extra, payload = await self._respond(method, path, body)
+                if isinstance(payload, tuple):
+                    await self._stream(writer, status, *payload)
+                    continue
+                head = [f"HTTP/1.1 {status}", "Content-Type: application/json",
+                        f"Content-Length: {len(payload)}", *extra]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError, asyncio.CancelledError):
+            pass   # client went away, or the server is stopping
+        finally:
+            writer.close()
+
+    async def _stream(self, writer: asyncio.StreamWriter, status: str, role: str, started: float,
+                      events: List[Tuple[float, int, bytes]]):
+        """Write (delay, text chars, message) events as chunks; stops when the client closes."""
+        stats = self.stats
+        stats["streams"] += 1
+        writer.write((f"HTTP/1.1 {status}\r\nContent-Type: application/vnd.amazon.eventstream\r\n"
+                      "Transfer-Encoding: chunked\r\n\r\n").encode("latin-1"))
+        try:
+            for delay, chars, message in events:
+                if delay:
+                    await asyncio.sleep(delay)
+                if writer.is_closing():
+                    raise ConnectionResetError
+                writer.write(f"{len(message):x}\r\n".encode("latin-1") + message + b"\r\n")
+                await writer.drain()
+                stats["streamed_chars"] += chars
+            writer.write(b"0\r\n\r\n")
+            await writer.drain()
+            self.timeline.append((role, started, time.monotonic()))
+        except ConnectionError:
+            stats["aborted_streams"] += 1
+            raise
+
+    def _stream_events(self, text: str, stop: str, usage: Dict, latency: float,
+                       fail: bool = False) -> List[Tuple[float, int, bytes]]:
+        """
+        (delay before, text chars, event message) for a streamed answer.
+        `fail` cuts it off half-way with a modelStreamErrorException event.
+        """
+        step   = max(1, self.stream_chunk_chars)
+        deltas = [text[i:i + step] for i in range(0, len(text), step)] or [""]
+        first  = latency * STREAM_FIRST_TOKEN
+        rest   = (latency - first) / len(deltas)
+        events = [(0.0, 0, _event_message("messageStart", {"role": "assistant"}))]
+        events += [(first if i == 0 else rest, len(d),
+                    _event_message("contentBlockDelta", {"delta": {"text": d}, "contentBlockIndex": 0}))
+                   for i, d in enumerate(deltas)]
+        if fail:
+            return events[:1 + len(deltas) // 2] + [(rest, 0, _event_message(
+                "modelStreamErrorException", {"message": "Model stream error (mock)."}, "exception"))]
+        events += [(0.0, 0, _event_message("contentBlockStop", {"contentBlockIndex": 0})),
+                   (0.0, 0, _event_message("messageStop", {"stopReason": stop})),
+                   (0.0, 0, _event_message("metadata", {"usage": usage,
+                                                        "metrics": {"latencyMs": int(latency * 1000)}}))]
+        return events
+
+    async def _record(self, model: str, request: Dict) -> Dict:
+        """Answer a cassette miss from the upstream client and record it."""
+        response = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self.upstream.converse(modelId=model, **request))
+        return self.cassette.add(model, request, response)
+
+    async def _respond(self, method: str, path: str, body: bytes) -> Tuple[str, List[str], Any]:
+        match = _PATH_RE.match(path)
+        if method != "POST" or not match:
+            return "404 Not Found", [], b'{"message":"not found"}'
+        stats = self.stats
+        stats["requests"] += 1
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        started = time.monotonic()
+        stream  = match.group("op") == "converse-stream"
+        model   = match.group("model")
+        try:
+            over_quota = self._over_quota(model)
+            request  = json.loads(body or b"{}")
+            recorded = self.cassette.get(model, request) if self.cassette is not None else None
+            record   = self.cassette is not None and recorded is None and self.upstream is not None
+            # A stream's latency is spread over its events instead; a recording takes the real one
+            latency  = 0.0 if record else self._latency(recorded)
+            await asyncio.sleep(0.0 if stream or record else latency)
+            if over_quota or (self.throttle_rate and self._rng.random() < self.throttle_rate):
+                stats["throttled"] += 1
+                return ("429 Too Many Requests", [f"x-amzn-ErrorType: {THROTTLE_ERROR}"],
+                        b'{"message":"Too many requests, please wait before trying again."}')
+            fail = bool(self.error_rate) and self._rng.random() < self.error_rate
+            if fail:
+                stats["errors"] += 1
+                if not stream:
+                    status, code = self._rng.choice(SERVER_ERRORS)
+                    return (status, [f"x-amzn-ErrorType: {code}:"],
+                            json.dumps({"message": f"{code} (mock)"}).encode())
+            blocks  = request.get("system", []) + [b for m in request.get("messages", []) for b in m.get("content", [])]
+            if not self.cache_points and any("cachePoint" in b for b in blocks):
+                return ("400 Bad Request", [f"x-amzn-ErrorType: {VALIDATION_ERROR}"],
+                        b'{"message":"This model does not support prompt caching."}')
+            if record:
+                try:
+                    recorded = await self._record(model, request)
+                except Exception as e:
+                    status = getattr(e, "response", {}).get("ResponseMetadata", {}).get("HTTPStatusCode", 500)
+                    return (f"{status} Upstream Error", [f"x-amzn-ErrorType: {error_code(e)}:"],
+                            json.dumps({"message": str(e)}).encode())
+                stats["recorded"] += 1
+            elif recorded is not None:
+                stats["replayed"] += 1
+
+            if recorded is not None:
+                role, text, stop, usage = (recorded["role"], recorded["text"], recorded["stopReason"],
+                                           recorded["usage"])
+                stats["cache_read_tokens"]  += usage.get("cacheReadInputTokens", 0)
+                stats["cache_write_tokens"] += usage.get("cacheWriteInputTokens", 0)
+            else:
+                if self.cassette is not None:
+                    stats["replay_misses"] += 1
+                uncached, cache_read, cache_write = self._cache_usage(model, request)
+                stats["cache_read_tokens"]  += cache_read
+                stats["cache_write_tokens"] += cache_write
+                role, answer = answer_for(request, self.bad_report_rate)
+                text   = json.dumps(answer)
+                stop   = "end_turn"
+                if stream and self.off_schema_rate and _stable(body.decode("utf-8", "replace"), 1000) \
+                        < self.off_schema_rate * 1000:
+                    text = OFF_SCHEMA_TEXT * (len(text) // len(OFF_SCHEMA_TEXT) + 1)
+                limit  = (request.get("inferenceConfig") or {}).get("maxTokens")
+                if limit and len(text) // 4 > limit:
+                    text, stop = text[:limit * 4], "max_tokens"
+                    stats["truncated"] += 1
+                usage = {"inputTokens": uncached, "outputTokens": len(text) // 4,
+                         "cacheReadInputTokens": cache_read, "cacheWriteInputTokens": cache_write,
+                         "totalTokens": uncached + cache_read + cache_write + len(text) // 4}
+            stats["roles"][role] = stats["roles"].get(role, 0) + 1
+            if stream:
+                return "200 OK", [], (role, started, self._stream_events(text, stop, usage, latency, fail))
+            self.timeline.append((role, started, time.monotonic()))
+            payload = {
+                "output":     {"message": {"role": "assistant", "content": [{"text": text}]}},
+                "stopReason": stop,
+                "usage":      usage,
+                "metrics":    {"latencyMs": int((time.monotonic() - started) * 1000)},
+            }
+            return "200 OK", [], json.dumps(payload).encode()
+        finally:
+            stats["in_flight"] -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--latency-dist", choices=LATENCY_DISTS, default="uniform")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--quota-rps", type=float, default=0.0)
+    parser.add_argument("--cassette", help="JSON-lines file of recorded answers to replay")
+    parser.add_argument("--record", action="store_true", help="record cassette misses from real Bedrock")
+    args = parser.parse_args()
+    upstream = None
+    if args.record:
+        if not args.cassette:
+            parser.error("--record needs --cassette")
+        import boto3
+        # Deliberately not BEDROCK_ENDPOINT_URL: that may point back at this mock
+        upstream = boto3.client("bedrock-runtime", region_name=os.getenv("AWS_REGION", "us-east-1"))
+    mock = MockBedrock(args.latency, args.jitter, args.throttle_rate, port=args.port, quota_rps=args.quota_rps,
+                       latency_dist=args.latency_dist, error_rate=args.error_rate,
+                       cassette=args.cassette, upstream=upstream)
+    print(f"[Mock] Bedrock Converse mock on {mock.start()} "
+          f"(latency {args.latency}s ±{args.jitter}s {args.latency_dist}, throttle {args.throttle_rate:.0%}, "
+          f"errors {args.error_rate:.0%})")
+    if mock.cassette is not None:
+        print(f"[Mock] Cassette {args.cassette}: {len(mock.cassette.entries)} answers, "
+              f"misses {'recorded from Bedrock' if upstream else 'answered synthetically'}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
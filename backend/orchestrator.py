@@ -10,12 +10,38 @@ Every LLM call logs token usage to token_usage.txt.
 
 Performance optimisations (v2):
   1. Heuristic pre-filter  — obvious Tier-0 nodes bypass the Mapper entirely.
-  2. Result cache          — content-addressable hash skips nodes seen in a
-                             previous run within the same process lifetime.
+  2. Result cache          — persistent SQLite cache keyed by normalized code
+                             content, model ids and prompt version; shared
+                             across processes and restarts (llm_cache.py).
   3. Parallel Mapper       — all Mapper batches run concurrently.
-  4. Parallel Linker       — all Linker batches run concurrently (no overlap).
+  4. Streaming stages      — each Mapper batch feeds the Linker and each
+                             Linker batch the Sentinel as soon as it returns
+                             (StreamingRun); no barrier between phases.
   5. Higher Sentinel pool  — MAX_PARALLEL_RISK raised from 3 → 6.
-  6. RateLimiter is thread-safe — uses a Lock so parallel callers don't race.
+  6. Adaptive rate limiter  — per-model request/token buckets with AIMD
+                             throttle feedback; waits outside the lock
+                             (rate_limiter.py).
+  7. asyncio path          — the same dataflow on one shared event loop
+                             (async_orchestrator.py, ORCHESTRATOR_MODE=async).
+  8. Compact prompts       — node summaries as short-key JSON lines with a
+                             per-batch string table instead of indented
+                             JSON (prompt_format.py, PROMPT_FORMAT).
+  9. Batched Sentinel      — related risky nodes share one Sentinel call and
+                             its context section (SENTINEL_BATCH_SIZE).
+ 10. Prompt caching        — Bedrock cache points after the system prompt and
+                             large shared context; stable text first
+                             (PROMPT_CACHE).
+ 11. Streamed answers      — Mapper / Linker answers via converse_stream;
+                             each classification reaches the Linker as it
+                             arrives, off-schema streams are cut short
+                             (json_stream.py, STREAM_RESPONSES).
+ 12. Per-job context       — class → methods, id / name lookups, per-node
+                             relation lists and summaries built once per
+                             run (OrchestratorContext); no per-node scans.
+ 13. Local triage model    — a calibrated CPU model trained on past Mapper
+                             answers classifies the nodes it is confident
+                             about; only the rest go to the Mapper
+                             (triage_model.py, TRIAGE_MODEL_PATH).
 """
 
 import os
@@ -24,36 +50,42 @@ import hashlib
 import re
 import time
 import threading
-from typing import List, Dict, Any, Optional
+import queue
+from typing import List, Dict, Any, Callable, Optional, Tuple, Union
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import boto3
+from botocore.config import Config
 from langsmith import traceable
 from langsmith.run_helpers import get_current_run_tree
 
+from reachability import ReachabilityIndex
+from attack_paths import AttackPathEngine
+from risk_rules import FLAG_CONFIDENCE
+from snippet_store import SnippetStore
+from edge_table import EdgeTable
+from llm_cache import LLMResultCache
+from batch_packer import TokenLedger, pack_batches, MAPPER_BATCH_SIZE, LINKER_BATCH_SIZE
+from json_stream import JsonStream, OffSchema
+from triage_model import LabelLog, TriageModel
+import prompt_format
+from rate_limiter import (
+    AdaptiveRateLimiter, backoff_delay, error_code, estimate_tokens, is_throttle, is_transient,
+)
+
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '.env'), override=True)
 
 # ---------------------------------------------------------------------------
-# RATE LIMITING — thread-safe
+# RATE LIMITING — per model, adaptive (rate_limiter.py)
 # ---------------------------------------------------------------------------
-class RateLimiter:
-    """Token-bucket rate limiter safe for use across multiple threads."""
-    def __init__(self, calls_per_second: int = 10):
-        self.min_interval   = 1.0 / calls_per_second
-        self.last_call_time = 0.0
-        self._lock          = threading.Lock()
-
-    def wait_if_needed(self):
-        with self._lock:
-            now   = time.time()
-            delta = now - self.last_call_time
-            if delta < self.min_interval:
-                time.sleep(self.min_interval - delta)
-            self.last_call_time = time.time()
+# Request + token buckets per model id, AIMD on ThrottlingException; shared
+# by every worker thread and by the async path in async_orchestrator.py
+rate_limiter = AdaptiveRateLimiter.from_env()
 
-# 10 req/s ceiling — shared across all parallel workers
-rate_limiter = RateLimiter(calls_per_second=10)
+# Throttled / transiently failing calls are retried here (after the limiter
+# has backed off) instead of inside botocore, so the limiter sees every 429
+THROTTLE_RETRIES = 4
 
 # ---------------------------------------------------------------------------
 # MODEL CONFIGURATION
@@ -65,6 +97,8 @@ MODEL_ROLES: Dict[str, Dict[str, Any]] = {
         "temperature":     0.0,
         "max_retries":     2,
         "timeout_seconds": 30,
+        "max_tokens":      4096,
+        "batch_input_tokens": int(os.getenv("BATCH_INPUT_TOKENS_MAPPER", 16000)),
         "description":     "Fast, lightweight model for triage and tier assignment.",
     },
     "linker": {
@@ -73,6 +107,8 @@ MODEL_ROLES: Dict[str, Dict[str, Any]] = {
         "temperature":     0.1,
         "max_retries":     2,
         "timeout_seconds": 60,
+        "max_tokens":      4096,
+        "batch_input_tokens": int(os.getenv("BATCH_INPUT_TOKENS_LINKER", 12000)),
         "description":     "Mid-range model for semantic relation extraction.",
     },
     "sentinel": {
@@ -81,6 +117,8 @@ MODEL_ROLES: Dict[str, Dict[str, Any]] = {
         "temperature":     0.1,
         "max_retries":     3,
         "timeout_seconds": 120,
+        "max_tokens":      4096,
+        "batch_input_tokens": int(os.getenv("BATCH_INPUT_TOKENS_SENTINEL", 12000)),
         "description":     "Frontier reasoning model for deep security analysis.",
     },
 }
@@ -115,6 +153,11 @@ PRE-COMPUTED SIGNALS (use these to inform tier assignment):
 - "risk_ast.sources": data source signals (env, file, user input).
 - "graph.reachable_sinks": number of dangerous sinks reachable from this node.
   A value >= 3 indicates high blast radius — treat as Tier 2 minimum.
+- "graph.blast_radius": statically computed impact score (1–10) from the
+  dominator tree and reverse reachability. A value >= 7 is Tier 2 minimum.
+- "complexity": cyclomatic / cognitive complexity and max nesting depth
+  from the parser. High values alone do not imply risk, but cognitive >= 15
+  in code that touches a sink makes a missed edge case more likely.
 
 CONFIDENCE SCORE GUIDANCE:
 - 0.90–0.99: security_flags and risk_ast provide direct, clear evidence.
@@ -162,9 +205,8 @@ ARCHITECTURAL ROLE GUIDANCE:
   high fan_out + many reachable sinks = likely service/infrastructure.
 - Use "risk_ast.external_interactions" to identify repository/infrastructure roles.
 
-IMPACT ANALYSIS SCALE (blast_radius_score and change_sensitivity):
-- blast_radius_score: integer 1–10. Use graph.reachable_sink_count and fan_out
-  as primary signals. A node with fan_out > 10 or reachable_sinks > 5 scores >= 7.
+IMPACT ANALYSIS SCALE (critical_path_likelihood and change_sensitivity):
+- blast_radius is pre-computed statically (graph.blast_radius) — do NOT output it.
 - change_sensitivity: "low" (isolated), "medium" (affects 1–3 modules),
   "high" (cross-cutting or entry point).
 
@@ -178,7 +220,7 @@ For the given nodes return STRICT JSON (no markdown, no explanation):
       "architectural_role": "controller|service|repository|utility|middleware|model|config|infrastructure|test|unknown",
       "entry_point": {"is_entry_point": false, "entry_type": "unknown"},
       "sensitive_behaviors": {"handles_user_input": false, "accesses_filesystem": false, "network_calls": false},
-      "impact_analysis": {"blast_radius_score": 1, "critical_path_likelihood": 1, "change_sensitivity": "low"},
+      "impact_analysis": {"critical_path_likelihood": 1, "change_sensitivity": "low"},
       "confidence_score": 0.9
     }
   ],
@@ -188,7 +230,7 @@ For the given nodes return STRICT JSON (no markdown, no explanation):
 }"""
 
 SYSTEM_PROMPT_SENTINEL = """You are a Principal Security Reasoning Engine.
-Analyze the provided code node and its extracted relations for deep architectural risks.
+Analyze the provided code node and the attack paths through it for deep architectural risks.
 This is a backend code analysis tool; focus on server-side vulnerabilities only.
 
 ANALYSIS VECTORS:
@@ -200,11 +242,18 @@ ANALYSIS VECTORS:
 USING INPUT SIGNALS:
 - "security_flags": pre-extracted behavioral flags. has_eval=true or
   has_shell_call=true should immediately raise injection to at least "high".
-  has_env_access=true is a strong exposure signal.
+  has_env_access=true is a strong exposure signal. has_hardcoded_secret=true
+  means a credential literal was found statically; exposure is pre-set from it.
 - "risk_ast.sources/sinks": already-identified data sources and dangerous sinks.
   A node with both a source and a sink in its profile warrants critical scrutiny.
-- "relations": use these to assess blast radius — how many other nodes are
-  reachable from this one and what are their roles?
+- "source": the node's code, cut at a line boundary if long. Ground every
+  finding in it; a "[truncated ...]" marker means the rest was not shown.
+- "Attack paths": concrete entry -> ... -> sink call chains through this node,
+  with the sink category in brackets. A path is evidence that input from the
+  entry point can reach the sink; judge whether this node sanitizes it.
+- "Known relations": given only when no attack path exists; direct neighbours.
+- "blast_radius_score", "dominated_count", "reverse_reach_count": statically
+  computed impact of this node. Use them as given; do not re-estimate.
 
 OVERALL RISK AGGREGATION:
 - If ANY vector is "critical" → overall_risk = "critical"
@@ -212,12 +261,6 @@ OVERALL RISK AGGREGATION:
 - If the highest is "moderate" → overall_risk = "moderate"
 - Otherwise → overall_risk = "low" or "none"
 
-BLAST RADIUS SCALE: integer 1–10.
-- 1–3: Isolated node, few callers, no sensitive sinks reachable.
-- 4–6: Moderate reach, touches 1–2 sensitive subsystems.
-- 7–9: Cross-cutting node or entry point with many downstream dependencies.
-- 10: System-wide impact (e.g., auth middleware, global request handler).
-
 CONSTRAINTS:
 - Be conservative: flag potential risks even if partially obscured.
 - NO HALLUCINATION: Only reference symbols present in the input.
@@ -239,27 +282,65 @@ Return STRICT JSON (no markdown, no explanation):
     "exposure":       {"level": "none|low|moderate|high|critical", "reason": "..."}
   },
   "overall_risk":     "none|low|moderate|high|critical",
-  "blast_radius":     1,
   "confidence_score": 0.0,
   "risk_summary":     "..."
-}"""
+}
+
+BATCHED REQUESTS:
+When several nodes are given (one per line under "Nodes:", after a "Shared
+context" section), judge each node on its own evidence and return one
+report per node, with its id, in the same STRICT JSON form:
+{"reports": [{"id": "node_id", "risk_breakdown": {...}, "overall_risk": "...",
+              "confidence_score": 0.0, "risk_summary": "..."}]}"""
+
+# Compact prompts (prompt_format.py) are read through a key legend, sent
+# once in the system prompt rather than with every batch
+SYSTEM_PROMPT_MAPPER = prompt_format.with_legend(SYSTEM_PROMPT_MAPPER)
+SYSTEM_PROMPT_LINKER = prompt_format.with_legend(SYSTEM_PROMPT_LINKER)
 
 # ---------------------------------------------------------------------------
 # TOKEN LOGGING
 # ---------------------------------------------------------------------------
 
-def _log_tokens(role: str, model_id: str, input_tokens: int, output_tokens: int):
-    """Append token usage to token_usage.txt — thread-safe."""
-    total     = input_tokens + output_tokens
+def _log_tokens(role: str, model_id: str, input_tokens: int, output_tokens: int,
+                nodes: int = 0, prompt_chars: int = 0, stop_reason: str = "end_turn",
+                cache_read: int = 0, cache_write: int = 0):
+    """
+    Append token usage to token_usage.txt — thread-safe. Calls made for
+    `nodes` nodes also record the prompt size and stop reason, which the
+    token ledger learns batch costs from (batch_packer.py). `input` is the
+    uncached input; prompt-cache reads / writes are logged next to it.
+    """
+    total     = input_tokens + cache_read + cache_write + output_tokens
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     line = (
         f"[{timestamp}] role={role} | model={model_id} "
-        f"| input={input_tokens} | output={output_tokens} | total={total}\n"
+        f"| input={input_tokens} | output={output_tokens} | total={total}"
     )
+    if nodes:
+        line += f" | nodes={nodes} | chars={prompt_chars} | stop={stop_reason}"
+        if cache_read or cache_write:
+            line += f" | cache_read={cache_read} | cache_write={cache_write}"
+        _get_token_ledger().record(role, model_id, nodes, prompt_chars, input_tokens,
+                                   output_tokens, stop_reason, cache_read, cache_write)
     with _token_log_lock:
         with open(TOKEN_LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(line)
-    print(f"[Token] {role}: in={input_tokens} out={output_tokens} total={total}")
+            f.write(line + "\n")
+    cached = f" cached={cache_read}" + (f" (+{cache_write} written)" if cache_write else "") \
+        if cache_read or cache_write else ""
+    print(f"[Token] {role}: in={input_tokens} out={output_tokens} total={total}{cached}")
+
+_token_ledger: Optional[TokenLedger] = None
+_ledger_init_lock = threading.Lock()
+
+def _get_token_ledger() -> TokenLedger:
+    """Process-wide ledger, seeded from the history in TOKEN_LOG_FILE on first use."""
+    global _token_ledger
+    if _token_ledger is None:
+        with _ledger_init_lock:
+            if _token_ledger is None:
+                _token_ledger = TokenLedger.from_file(TOKEN_LOG_FILE)
+    return _token_ledger
 
 # ---------------------------------------------------------------------------
 # BEDROCK CLIENT
@@ -271,45 +352,234 @@ def _get_bedrock_client():
         region_name=os.getenv("AWS_REGION", "us-east-1"),
         aws_access_key_id=os.getenv("AWS_ACCESS_KEY_ID"),
         aws_secret_access_key=os.getenv("AWS_SECRET_ACCESS_KEY"),
+        # Point both orchestrator paths at a local endpoint (mock_bedrock.py)
+        endpoint_url=os.getenv("BEDROCK_ENDPOINT_URL") or None,
+        config=Config(retries={"mode": "standard", "total_max_attempts": 1}),
     )
 
+# ---------------------------------------------------------------------------
+# PROMPT CACHING — Bedrock cache points on stable prompt prefixes
+# ---------------------------------------------------------------------------
+# The system prompts are identical on every call of a role, and prompts put
+# their stable parts first, so a cache point after them lets the provider
+# reuse the prefix instead of re-reading it (cacheRead/WriteInputTokens).
+PROMPT_CACHE            = os.getenv("PROMPT_CACHE", "on").lower() not in ("0", "off", "false", "no")
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", 1024))  # smallest context block worth a cache point
+CACHE_POINT             = {"cachePoint": {"type": "default"}}
+
+_no_cache_models: set = set()          # model ids that rejected cache points
+_botocore_cache_points: Optional[bool] = None
+
+def _prompt_chars(system_prompt: str, user_prompt: Union[str, List[str]]) -> int:
+    return len(system_prompt) + sum(map(len, [user_prompt] if isinstance(user_prompt, str) else user_prompt))
+
+def _cache_points_supported(client) -> bool:
+    """
+    boto3 clients validate request shapes, and botocore learned cachePoint
+    in 1.37.24; older ones would reject the request. The async client sends
+    raw JSON and always can.
+    """
+    global _botocore_cache_points
+    service_model = getattr(getattr(client, "meta", None), "service_model", None)
+    if service_model is None:
+        return True
+    if _botocore_cache_points is None:
+        try:
+            _botocore_cache_points = "cachePoint" in service_model.shape_for("SystemContentBlock").members
+        except Exception:
+            _botocore_cache_points = False
+        if not _botocore_cache_points:
+            print("[Cache] botocore has no cachePoint support — prompt caching off for boto3 calls.")
+    return _botocore_cache_points
+
+def _use_prompt_cache(client, model_id: str) -> bool:
+    return PROMPT_CACHE and model_id not in _no_cache_models and _cache_points_supported(client)
+
+def _converse_request(model_id: str, system_prompt: str, user_prompt: Union[str, List[str]],
+                      temperature: float = 0.1, max_tokens: int = 4096,
+                      cache: bool = False) -> Dict[str, Any]:
+    """
+    Converse API arguments — shared by the thread and asyncio paths.
+    `user_prompt` may be a list of segments, stable ones first. With `cache`,
+    a cache point follows the system prompt (sent on every call of the role;
+    a prefix under the provider minimum is simply not cached), and any later
+    non-final segment of at least PROMPT_CACHE_MIN_TOKENS (≈4 chars / token)
+    — smaller per-call context is not worth a cache write.
+    """
+    segments = [user_prompt] if isinstance(user_prompt, str) else [s for s in user_prompt if s]
+    system   = [{"text": system_prompt}] + ([CACHE_POINT] if cache else [])
+    content: List[Dict[str, Any]] = []
+    for i, segment in enumerate(segments):
+        content.append({"text": segment})
+        if cache and i < len(segments) - 1 and len(segment) // 4 >= PROMPT_CACHE_MIN_TOKENS:
+            content.append(CACHE_POINT)
+    return {
+        "modelId":         model_id,
+        "messages":        [{"role": "user", "content": content}],
+        "system":          system,
+        "inferenceConfig": {"temperature": temperature, "maxTokens": max_tokens},
+    }
+
+def _has_cache_points(request: Dict[str, Any]) -> bool:
+    blocks = request["system"] + [b for m in request["messages"] for b in m["content"]]
+    return any("cachePoint" in b for b in blocks)
+
+def _cache_rejected(request: Dict[str, Any], exc: BaseException) -> bool:
+    """A model without prompt caching answers cache points with a ValidationException."""
+    return error_code(exc) == "ValidationException" and _has_cache_points(request)
+
+def _without_cache(request: Dict[str, Any], model_id: str) -> Dict[str, Any]:
+    """`request` minus its cache points; the model is not sent any again."""
+    print(f"[Cache] {model_id} rejected cache points — resending without them.")
+    _no_cache_models.add(model_id)
+
+    def strip(blocks):
+        return [b for b in blocks if "cachePoint" not in b]
+    return {**request, "system": strip(request["system"]),
+            "messages": [{**m, "content": strip(m["content"])} for m in request["messages"]]}
+
 @traceable(run_type="llm", project_name="CodeForge")
 def _call_model(client, role: str, model_id: str, system_prompt: str,
-                user_prompt: str, temperature: float = 0.1) -> str:
-    """Call AWS Bedrock Converse API with rate limiting, log tokens, return text."""
-    rate_limiter.wait_if_needed()
-
-    messages = [{"role": "user", "content": [{"text": user_prompt}]}]
-    system   = [{"text": system_prompt}]
-
-    response = client.converse(
-        modelId=model_id,
-        messages=messages,
-        system=system,
-        inferenceConfig={"temperature": temperature, "maxTokens": 4096},
-    )
+                user_prompt: Union[str, List[str]], temperature: float = 0.1, nodes: int = 0,
+                stream: Optional[JsonStream] = None) -> str:
+    """
+    Call AWS Bedrock Converse API with rate limiting, log tokens, return text.
+    With `stream`, the answer comes through converse_stream and is fed to it
+    as it arrives; raises OffSchema (after logging) if the stream was cut short.
+    """
+    request  = _converse_request(model_id, system_prompt, user_prompt, temperature,
+                                 MODEL_ROLES[role.lower()]["max_tokens"],
+                                 _use_prompt_cache(client, model_id))
+    estimate = estimate_tokens(request)
+    for attempt in range(THROTTLE_RETRIES + 1):
+        rate_limiter.wait(model_id, estimate)
+        sent_at = time.monotonic()
+        try:
+            if stream is None:
+                response = client.converse(**request)
+            else:
+                stream.reset()
+                response = _read_stream(client.converse_stream(**request)["stream"], stream)
+            break
+        except Exception as e:
+            if _cache_rejected(request, e) and attempt < THROTTLE_RETRIES:
+                request = _without_cache(request, model_id)
+                continue
+            throttled = is_throttle(e)
+            if throttled:
+                rate_limiter.record_throttle(model_id, sent_at)   # the next wait() is paced at the lower rate
+            if attempt == THROTTLE_RETRIES or not (throttled or is_transient(e)):
+                raise
+            time.sleep(backoff_delay(attempt))
+    rate_limiter.record_success(model_id, estimate, _used_tokens(response))
+    text = _response_text(role, model_id, response, nodes, _prompt_chars(system_prompt, user_prompt))
+    if response.get("stopReason") == "aborted":
+        raise OffSchema(response["error"])
+    return text
+
+
+def _used_tokens(response: Dict) -> Optional[int]:
+    usage = response.get("usage")
+    if not usage:
+        return None
+    return usage.get("totalTokens") or usage.get("inputTokens", 0) + usage.get("outputTokens", 0)
+
 
+def _response_text(role: str, model_id: str, response: Dict,
+                   nodes: int = 0, prompt_chars: int = 0) -> str:
+    """Log token usage (file + LangSmith run) and return the response text."""
+    output_message = response.get("output", {}).get("message", {})
+    content_blocks = output_message.get("content", [])
+    text         = "".join(block.get("text", "") for block in content_blocks)
     usage        = response.get("usage", {})
+    if response.get("stopReason") == "aborted" and not usage:
+        # A stream closed early reports no usage — bill the estimate
+        usage = {"inputTokens": prompt_chars // 4, "outputTokens": len(text) // 4}
     input_tokens = usage.get("inputTokens", 0)
     output_tokens= usage.get("outputTokens", 0)
-    _log_tokens(role, model_id, input_tokens, output_tokens)
+    cache_read   = usage.get("cacheReadInputTokens", 0)
+    cache_write  = usage.get("cacheWriteInputTokens", 0)
+    stop_reason  = response.get("stopReason", "end_turn")
+    _log_tokens(role, model_id, input_tokens, output_tokens, nodes, prompt_chars, stop_reason,
+                cache_read, cache_write)
+    if stop_reason == "max_tokens":
+        print(f"[Token] {role}: answer cut off at maxTokens ({nodes} nodes)")
+    elif stop_reason == "aborted":
+        print(f"[Stream] {role}: off-schema answer aborted after {len(text)} chars — {response.get('error')}")
 
     rt = get_current_run_tree()
     if rt:
         rt.extra = rt.extra or {}
         rt.extra["usage"] = {
-            "input_tokens":  input_tokens,
+            "input_tokens":  input_tokens + cache_read + cache_write,
             "output_tokens": output_tokens,
-            "total_tokens":  input_tokens + output_tokens,
+            "total_tokens":  input_tokens + cache_read + cache_write + output_tokens,
+            "cache_read_input_tokens":  cache_read,
+            "cache_write_input_tokens": cache_write,
         }
         rt.extra.setdefault("metadata", {}).update(
             {"model": model_id, "role": role, "provider": "aws_bedrock"}
         )
+    return text
 
-    output_message = response.get("output", {}).get("message", {})
-    content_blocks = output_message.get("content", [])
-    return "".join(block.get("text", "") for block in content_blocks)
 
+# ---------------------------------------------------------------------------
+# STREAMED ANSWERS — converse_stream + incremental JSON (json_stream.py)
+# ---------------------------------------------------------------------------
+# The Mapper and Linker answer with arrays of per-node objects. Streamed,
+# each classification can be acted on as soon as its closing brace arrives,
+# and an answer that has gone off-schema is cut short instead of paid for.
+STREAM_RESPONSES = os.getenv("STREAM_RESPONSES", "on").lower() not in ("0", "off", "false", "no")
+
+def _answer_stream(role: str, nodes: List[Dict],
+                   on_item: Optional[Callable[[Dict], None]] = None) -> Optional[JsonStream]:
+    """
+    JsonStream for a Mapper / Linker answer on `nodes` (None when
+    STREAM_RESPONSES is off). `on_item` gets each Mapper classification, its
+    id expanded from the batch's string table.
+    """
+    if not STREAM_RESPONSES:
+        return None
+    if role == "linker":
+        return JsonStream({"results": (len(nodes), ("id",)), "relationships": (None, ("source", "target"))})
+    callback = None
+    if on_item is not None:
+        table = prompt_format.string_table(nodes)
+
+        def callback(key, item):
+            on_item(_expand_ids(item, table, ("id",)))
+    return JsonStream({"classifications": (len(nodes), ("id",))}, on_item=callback)
+
+def _stream_event(response: Dict[str, Any], text: List[str], event: Dict, stream: JsonStream):
+    """Fold one converse_stream event into `response` / `text` (shared by both paths)."""
+    if "contentBlockDelta" in event:
+        delta = event["contentBlockDelta"].get("delta", {}).get("text", "")
+        text.append(delta)
+        stream.feed(delta)
+    elif "messageStop" in event:
+        response["stopReason"] = event["messageStop"].get("stopReason", "end_turn")
+    elif "metadata" in event:
+        response["usage"] = event["metadata"].get("usage", {})
+
+def _stream_response(response: Dict[str, Any], text: List[str]) -> Dict[str, Any]:
+    response["output"] = {"message": {"role": "assistant", "content": [{"text": "".join(text)}]}}
+    return response
+
+def _read_stream(events, stream: JsonStream) -> Dict[str, Any]:
+    """
+    A converse_stream event stream as a Converse-shaped response. When the
+    text goes off-schema the stream is closed at once; the response then has
+    stopReason "aborted" and the reason in "error".
+    """
+    response: Dict[str, Any] = {"stopReason": "end_turn"}
+    text: List[str] = []
+    try:
+        for event in events:
+            _stream_event(response, text, event, stream)
+    except OffSchema as e:
+        response.update(stopReason="aborted", error=str(e))
+        events.close()
+    return _stream_response(response, text)
 
 def _parse_json_response(raw: str) -> Optional[Dict]:
     """Robustly extract JSON from an LLM response (handles markdown fences)."""
@@ -332,37 +602,127 @@ def _parse_json_response(raw: str) -> Optional[Dict]:
 # NODE HASHING / RESULT CACHE
 # ---------------------------------------------------------------------------
 
-# Persists for the lifetime of the process — repeated uploads of the same
-# codebase skip re-analysis of unchanged nodes entirely.
-_result_cache: Dict[str, Any] = {}
-_cache_lock = threading.Lock()
+# Bumped automatically whenever a system prompt or the prompt format
+# changes — cached results produced under an older prompt are never served
+PROMPT_VERSION = hashlib.sha256(
+    (SYSTEM_PROMPT_MAPPER + SYSTEM_PROMPT_LINKER + SYSTEM_PROMPT_SENTINEL
+     + prompt_format.resolve(None)).encode()
+).hexdigest()[:12]
+
+# Disk-backed (SQLite WAL) and shared by all worker processes; created on
+# first use so importing the module never touches the filesystem
+_result_cache: Optional[LLMResultCache] = None
+_cache_init_lock = threading.Lock()
+_cache_disabled = False
+
+
+def _get_result_cache() -> Optional[LLMResultCache]:
+    global _result_cache, _cache_disabled
+    if _result_cache is None and not _cache_disabled:
+        with _cache_init_lock:
+            if _result_cache is None and not _cache_disabled:
+                try:
+                    _result_cache = LLMResultCache.from_env()
+                except Exception as e:
+                    print(f"[Cache] Result cache unavailable: {e}")
+                    _result_cache = None
+                _cache_disabled = _result_cache is None
+    return _result_cache
+
+
+# Local triage model and the log of Mapper answers it is trained on
+# (triage_model.py); loaded on first use, like the result cache
+_triage_model: Optional[TriageModel] = None
+_label_log:    Optional[LabelLog]    = None
+_triage_loaded = False
+_triage_init_lock = threading.Lock()
+
+
+def _get_triage() -> Tuple[Optional[TriageModel], Optional[LabelLog]]:
+    global _triage_model, _label_log, _triage_loaded
+    if not _triage_loaded:
+        with _triage_init_lock:
+            if not _triage_loaded:
+                try:
+                    _label_log = LabelLog.from_env()
+                except Exception as e:
+                    print(f"[Triage] Label log unavailable: {e}")
+                try:
+                    _triage_model = TriageModel.from_env()
+                except Exception as e:
+                    print(f"[Triage] Model unavailable — every node goes to the Mapper: {e}")
+                _triage_loaded = True
+    return _triage_model, _label_log
+
+
+def _record_label(node: Dict, classification: Dict):
+    """Log a Mapper answer for the triage model (local predictions and defaults are not answers)."""
+    _, label_log = _get_triage()
+    if label_log is None or "id" not in classification:
+        return
+    try:
+        label_log.record(_node_hash(node), node, classification, MODEL_ROLES["mapper"]["model_id"])
+    except Exception as e:
+        print(f"[Triage] Label write failed: {e}")
 
 
 def _node_hash(node: Dict) -> str:
-    """Content-addressable hash for a node."""
-    calls = node.get("calls", [])
-    call_names = sorted([c if isinstance(c, str) else c.get("name", "") for c in calls])
+    """
+    Cache key for a node: its normalized content hash from the parse pass
+    (whitespace, comments and position ignored, so a line shift above a
+    function keeps its entry), the model ids and the prompt version.
+    """
+    content = node.get("content_hash")
+    if not content:   # modules / classes / API nodes: metadata without position
+        calls = node.get("calls", [])
+        content = json.dumps({
+            "name":   node.get("name"),
+            "file":   node.get("file"),
+            "calls":  sorted([c if isinstance(c, str) else c.get("name", "") for c in calls]),
+            "params": sorted(node.get("parameters", [])),
+        }, sort_keys=True)
     key_parts = json.dumps({
-        "name":   node.get("name"),
-        "type":   node.get("type"),
-        "file":   node.get("file"),
-        "line":   node.get("line_start"),
-        "calls":  call_names,
-        "params": sorted(node.get("parameters", [])),
+        "content": content,
+        "type":    node.get("type"),
+        "entry":   [node.get("is_entry_point", False), node.get("entry_type")],
+        "scope":   (node.get("analysis_scope") or {}).get("decision"),
+        "models":  [MODEL_ROLES[r]["model_id"] for r in ("mapper", "linker", "sentinel")],
+        "prompt":  PROMPT_VERSION,
     }, sort_keys=True)
     return hashlib.sha256(key_parts.encode()).hexdigest()
 
 
 def _cache_get(node: Dict) -> Optional[Dict]:
-    h = _node_hash(node)
-    with _cache_lock:
-        return _result_cache.get(h)
+    cache = _get_result_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(_node_hash(node))
+    except Exception as e:   # a locked / corrupt cache must never fail the analysis
+        print(f"[Cache] Read failed: {e}")
+        return None
 
 
 def _cache_set(node: Dict, value: Dict):
-    h = _node_hash(node)
-    with _cache_lock:
-        _result_cache[h] = value
+    cache = _get_result_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(_node_hash(node), value)
+    except Exception as e:
+        print(f"[Cache] Write failed: {e}")
+
+
+def _cache_stats() -> Dict[str, Any]:
+    """Flush this run's counters and report hit rate / size."""
+    cache = _get_result_cache()
+    if cache is None:
+        return {"enabled": False}
+    try:
+        cache.flush_metrics()
+        return {"enabled": True, **cache.stats()}
+    except Exception as e:
+        return {"enabled": True, "error": str(e)}
 
 # ---------------------------------------------------------------------------
 # HEURISTIC TIER-0 PRE-FILTER
@@ -373,6 +733,10 @@ _DANGEROUS_IMPORTS = {
     "ctypes", "pickle", "socket", "pty",
 }
 
+def _confident_findings(node: Dict) -> List[Dict]:
+    """Rule / secret findings strong enough to count as a security signal."""
+    return [f for f in node.get("risk_findings", []) if f.get("confidence", 0) >= FLAG_CONFIDENCE]
+
 def _is_heuristic_tier0(node: Dict) -> bool:
     """
     Return True if a node is obviously Tier-0 without asking the Mapper.
@@ -390,9 +754,12 @@ def _is_heuristic_tier0(node: Dict) -> bool:
         return False
     # Any security flag set → not trivial
     for flag in ("has_eval", "has_shell_call", "has_file_access",
-                 "has_env_access", "has_lock_usage"):
+                 "has_env_access", "has_hardcoded_secret", "has_lock_usage"):
         if node.get(flag):
             return False
+    # Any confident parse-time rule finding → not trivial
+    if _confident_findings(node):
+        return False
     # Non-empty sinks → not trivial
     risk_ast = node.get("risk_ast") or {}
     if risk_ast.get("sinks"):
@@ -403,11 +770,177 @@ def _is_heuristic_tier0(node: Dict) -> bool:
         return False
     return True
 
+# Upper bounds for a function to be auto-assigned Tier 1 (see cpg_builder)
+_TIER1_MAX_CYCLOMATIC = 4
+_TIER1_MAX_COGNITIVE  = 5
+_TIER1_MAX_NESTING    = 2
+
+def _is_heuristic_tier1(node: Dict) -> bool:
+    """
+    Return True if a function is plainly low-risk by its parse-pass metrics:
+    simple control flow, no security signal of any kind, not an entry point
+    and nothing dangerous reachable below it. Such nodes skip the Mapper and
+    go straight to the Tier-1 bucket (Linker only, no Sentinel).
+    """
+    if node.get("type") != "function" or "cyclomatic_complexity" not in node:
+        return False
+    if (node["cyclomatic_complexity"] > _TIER1_MAX_CYCLOMATIC
+            or node.get("cognitive_complexity", 0) > _TIER1_MAX_COGNITIVE
+            or node.get("max_nesting", 0) > _TIER1_MAX_NESTING):
+        return False
+    if node.get("is_entry_point") or node.get("api_calls") or _confident_findings(node):
+        return False
+    for flag in ("has_eval", "has_shell_call", "has_file_access",
+                 "has_env_access", "has_lock_usage", "has_async_await"):
+        if node.get(flag):
+            return False
+    if node.get("reachable_sink_count", 0):
+        return False
+    risk_ast = node.get("risk_ast") or {}
+    if risk_ast.get("sinks") or risk_ast.get("sources"):
+        return False
+    return not (risk_ast.get("taint") or {}).get("feasible_path")
+
+def _finding_tier_floor(node: Dict) -> int:
+    """
+    Minimum tier implied by parse-time rule findings: an unsanitized sink
+    matched with high confidence cannot be classified below Tier 3, a
+    medium-confidence one below Tier 2.
+    """
+    floor = 0
+    for f in node.get("risk_findings", []):
+        if f.get("kind") != "sink" or f.get("sanitized"):
+            continue
+        if f.get("confidence", 0) >= 0.9:
+            return 3
+        if f.get("confidence", 0) >= 0.5:
+            floor = 2
+    return floor
+
+# ---------------------------------------------------------------------------
+# SENTINEL ROUTING — taint summary gate
+# ---------------------------------------------------------------------------
+
+def _needs_sentinel(node: Dict, tier: int) -> bool:
+    """
+    Tier-3 nodes always go to the Sentinel. Tier-2 nodes go only when the
+    interprocedural taint summary found a feasible source-to-sink path, or
+    when they carry signals the taint summary cannot judge (entry points for
+    authorization, locks / async for concurrency). Nodes without a taint
+    summary are sent as before.
+    """
+    if tier >= 3:
+        return True
+    taint = (node.get("risk_ast") or {}).get("taint")
+    if not taint:
+        return True
+    if taint.get("feasible_path"):
+        return True
+    return any(node.get(k) for k in ("is_entry_point", "has_lock_usage", "has_async_await"))
+
+# ---------------------------------------------------------------------------
+# STATIC EXPOSURE — hard-coded secrets (no LLM round trip)
+# ---------------------------------------------------------------------------
+
+_RISK_ORDER = {"none": 0, "low": 1, "moderate": 2, "medium": 2, "high": 3, "critical": 4}
+
+def _secret_exposure(node: Dict) -> Optional[Dict]:
+    """Exposure vector implied by the node's hard-coded secret findings."""
+    secrets = [f for f in node.get("risk_findings", [])
+               if f.get("category") == "secret" and f.get("confidence", 0) >= 0.6]
+    if not secrets:
+        return None
+    top   = max(secrets, key=lambda f: f["confidence"])
+    level = "critical" if top["confidence"] >= 0.9 else "high" if top["confidence"] >= 0.8 else "moderate"
+    return {"level":  level,
+            "reason": f"Hard-coded secret ({top['rule']}) at line {top.get('line')}: {top.get('preview', '')}"}
+
+def _apply_secret_exposure(nodes: List[Dict], node_updates: Dict[str, Dict]) -> Dict[str, Dict]:
+    """
+    Raise the exposure vector (and overall risk) of nodes holding hard-coded
+    secrets. Applied after the Sentinel and also when no LLM is available,
+    and never lowers what the Sentinel reported.
+    """
+    for node in nodes:
+        exposure = _secret_exposure(node)
+        if exposure is None:
+            continue
+        update   = node_updates.setdefault(node["id"], {})
+        analysis = update.setdefault("risk_analysis", {"overall_risk": update.get("risk_level", "low"),
+                                                       "risk_factors": {}})
+        factors  = analysis.setdefault("risk_factors", {})
+        current  = (factors.get("exposure_risk") or {}).get("level", "none")
+        if _RISK_ORDER.get(current, 0) < _RISK_ORDER[exposure["level"]]:
+            factors["exposure_risk"] = exposure
+        if _RISK_ORDER.get(update.get("risk_level", "none"), 0) < _RISK_ORDER[exposure["level"]]:
+            update["risk_level"]     = exposure["level"]
+            analysis["overall_risk"] = exposure["level"]
+            update["failure_reason"] = exposure["reason"]
+    return node_updates
+
+# ---------------------------------------------------------------------------
+# ORCHESTRATOR CONTEXT — per-job lookups
+# ---------------------------------------------------------------------------
+
+class OrchestratorContext:
+    """
+    Lookups over one run's nodes, built once per job so per-node work stays
+    O(1): id and name lookups, each class's methods (by parent_class, which
+    holds the class id), per-node in / out relation lists and node summaries
+    (packing and prompts both need them, repeatedly).
+
+    Relations are indexed under the nodes of the Linker batch that returned
+    them only, so a node's Known relations do not depend on which other
+    batches happened to finish first.
+    """
+
+    def __init__(self, nodes: List[Dict]):
+        self.nodes       = nodes
+        self.node_by_id: Dict[str, Dict] = {}
+        self.ids_by_name: Dict[str, List[str]] = {}
+        self.methods:    Dict[str, List[str]] = {}   # class id → method names, in node order
+        for node in nodes:
+            self.node_by_id[node["id"]] = node
+            self.ids_by_name.setdefault(node.get("name"), []).append(node["id"])
+            if node.get("parent_class"):
+                self.methods.setdefault(node["parent_class"], []).append(node["name"])
+        self.edges_out: Dict[str, List[Dict]] = {}
+        self.edges_in:  Dict[str, List[Dict]] = {}
+        self._summaries: Dict[str, Dict] = {}
+        self._summary_chars: Dict[str, int] = {}
+
+    def add_relations(self, nodes: List[Dict], edges: List[Dict]):
+        """Index one Linker batch's edges under the batch's own nodes."""
+        ids = {n["id"] for n in nodes}
+        for e in edges:
+            source, target = e.get("source"), e.get("target")
+            if source in ids:
+                self.edges_out.setdefault(source, []).append(e)
+            if target in ids and target != source:
+                self.edges_in.setdefault(target, []).append(e)
+
+    def relations(self, node_id: str) -> List[Dict]:
+        """Edges the node's Linker batch returned with the node as source, then as target."""
+        return self.edges_out.get(node_id, []) + self.edges_in.get(node_id, [])
+
+    def summary(self, node: Dict) -> Dict:
+        """The node's LLM summary (_prepare_node_summary), built once. Callers must not modify it."""
+        summary = self._summaries.get(node["id"])
+        if summary is None:
+            summary = self._summaries[node["id"]] = _prepare_node_summary(node, self)
+        return summary
+
+    def summary_chars(self, node: Dict) -> int:
+        chars = self._summary_chars.get(node["id"])
+        if chars is None:
+            chars = self._summary_chars[node["id"]] = _summary_chars(self.summary(node))
+        return chars
+
 # ---------------------------------------------------------------------------
 # NODE SUMMARY BUILDER
 # ---------------------------------------------------------------------------
 
-def _prepare_node_summary(node: Dict, all_nodes: List[Dict]) -> Dict:
+def _prepare_node_summary(node: Dict, ctx: OrchestratorContext) -> Dict:
     """Enriched summary of a node for LLM consumption."""
     summary: Dict[str, Any] = {
         "id":       node["id"],
@@ -428,18 +961,34 @@ def _prepare_node_summary(node: Dict, all_nodes: List[Dict]) -> Dict:
             "betweenness":      round(node.get("betweenness_centrality", 0.0), 4),
             "depth_from_entry": node.get("depth_from_entry", -1),
             "reachable_sinks":  node.get("reachable_sink_count", 0),
+            "blast_radius":     node.get("blast_radius_score", 1),
         }
 
     sec_flags = {
         k: node[k] for k in (
             "has_eval", "has_shell_call", "has_file_access",
-            "has_env_access", "has_lock_usage", "has_async_await",
+            "has_env_access", "has_hardcoded_secret", "has_lock_usage", "has_async_await",
             "has_try_catch", "has_loop", "has_conditional",
         ) if node.get(k)
     }
     if sec_flags:
         summary["security_flags"] = sec_flags
 
+    if "cyclomatic_complexity" in node:
+        summary["complexity"] = {
+            "cyclomatic": node["cyclomatic_complexity"],
+            "cognitive":  node.get("cognitive_complexity", 0),
+            "nesting":    node.get("max_nesting", 0),
+        }
+
+    findings = node.get("risk_findings")
+    if findings:
+        summary["rule_findings"] = [
+            {"rule": f["rule"], "line": f.get("line"), "confidence": f["confidence"],
+             **({"sanitized": True} if f.get("sanitized") else {})}
+            for f in sorted(findings, key=lambda f: -f["confidence"])[:5]
+        ]
+
     risk_ast = node.get("risk_ast")
     if risk_ast:
         summary["risk_ast"] = {
@@ -448,6 +997,9 @@ def _prepare_node_summary(node: Dict, all_nodes: List[Dict]) -> Dict:
             "entry":                risk_ast.get("entry", False),
             "external_interactions":risk_ast.get("external_interactions", [])[:5],
         }
+        taint = risk_ast.get("taint")
+        if taint:
+            summary["risk_ast"]["taint_path"] = taint.get("feasible_path", False)
 
     if node["type"] == "function":
         calls = node.get("calls", [])
@@ -459,7 +1011,7 @@ def _prepare_node_summary(node: Dict, all_nodes: List[Dict]) -> Dict:
         if node.get("is_entry_point"):
             summary["entry_point"] = node.get("entry_type", "unknown")
     elif node["type"] == "class":
-        summary["methods"]  = [n["name"] for n in all_nodes if n.get("parent_class") == node["name"]][:10]
+        summary["methods"]  = ctx.methods.get(node["id"], [])[:10]
         summary["inherits"] = node.get("inherits", [])
     elif node["type"] == "module":
         summary["imports"]  = node.get("imports", [])[:10]
@@ -467,149 +1019,205 @@ def _prepare_node_summary(node: Dict, all_nodes: List[Dict]) -> Dict:
     return summary
 
 # ---------------------------------------------------------------------------
-# MAPPER — parallel batch classification
+# MAPPER — batch classification
 # ---------------------------------------------------------------------------
 
-@traceable(project_name="CodeForge")
-def classify_nodes(client, nodes: List[Dict], all_nodes: List[Dict]) -> Dict[str, Dict]:
-    """Classify a single batch. Called by parallel workers."""
-    cfg       = MODEL_ROLES["mapper"]
-    summaries = [_prepare_node_summary(n, all_nodes) for n in nodes]
-    prompt    = (
+def _default_classification() -> Dict[str, Any]:
+    """Tier-1 fallback for nodes whose Mapper batch failed or did not parse."""
+    return {
+        "classification": "unknown", "risk_tier": 1,
+        "deep_reasoning_required": False,
+        "external_interaction_likelihood": "low", "confidence": 0.5,
+    }
+
+def _mapper_prompt(nodes: List[Dict], ctx: OrchestratorContext, fmt: Optional[str] = None) -> str:
+    summaries = [ctx.summary(n) for n in nodes]
+    return (
         f"Classify the following {len(summaries)} AST nodes.\n"
         "Assign each node a risk_tier (0-3), classification, and whether "
         "deep reasoning is required.\n\n"
-        f"Nodes:\n{json.dumps(summaries, indent=2)}"
+        f"{prompt_format.encode_nodes(summaries, fmt)}"
     )
-    raw    = _call_model(client, "Mapper", cfg["model_id"], SYSTEM_PROMPT_MAPPER, prompt, cfg["temperature"])
+
+def _mapper_result(raw: str, nodes: List[Dict]) -> Dict[str, Dict]:
     parsed = _parse_json_response(raw)
     if not parsed or "classifications" not in parsed:
         print("[Mapper] Failed to parse response — defaulting to Tier 1.")
-        return {
-            n["id"]: {
-                "classification": "unknown", "risk_tier": 1,
-                "deep_reasoning_required": False,
-                "external_interaction_likelihood": "low", "confidence": 0.5,
-            }
-            for n in nodes
-        }
-    return {c["id"]: c for c in parsed["classifications"] if "id" in c}
+        return {n["id"]: _default_classification() for n in nodes}
+    # Compact prompts reference ids through the batch's string table
+    table = prompt_format.string_table(nodes)
+    return {c["id"]: c for c in (_expand_ids(c, table, ("id",)) for c in parsed["classifications"])
+            if "id" in c}
 
+def _expand_ids(item: Any, table: List[str], keys: Tuple[str, ...]) -> Any:
+    """`item` with its id fields (`keys`) expanded from '@k' references."""
+    if not isinstance(item, dict):
+        return {}
+    return {**item, **{k: prompt_format.expand(item[k], table) for k in keys if k in item}}
 
-def _run_mapper_parallel(client, nodes_to_classify: List[Dict],
-                          all_nodes: List[Dict],
-                          batch_size: int = 20) -> Dict[str, Dict]:
+
+@traceable(project_name="CodeForge")
+def classify_nodes(client, nodes: List[Dict], ctx: OrchestratorContext,
+                   on_item: Optional[Callable[[Dict], None]] = None) -> Dict[str, Dict]:
     """
-    Split nodes into batches and classify them all concurrently.
-    Workers=5 keeps us well within the 10 req/s ceiling even at max batch rate.
+    Classify a single batch. Called by parallel workers. `on_item` gets each
+    classification while the answer is still streaming; of an answer
+    aborted off-schema, the classifications streamed before are kept.
     """
-    batches = [nodes_to_classify[i:i + batch_size]
-               for i in range(0, len(nodes_to_classify), batch_size)]
-    tier_map: Dict[str, Dict] = {}
+    cfg    = MODEL_ROLES["mapper"]
+    stream = _answer_stream("mapper", nodes, on_item)
+    try:
+        raw = _call_model(client, "Mapper", cfg["model_id"], SYSTEM_PROMPT_MAPPER,
+                          _mapper_prompt(nodes, ctx), cfg["temperature"], len(nodes), stream)
+    except OffSchema:
+        raw = stream.answer()
+    return _mapper_result(raw, nodes)
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {
-            executor.submit(classify_nodes, client, batch, all_nodes): batch
-            for batch in batches
-        }
-        for future in as_completed(futures):
-            try:
-                tier_map.update(future.result())
-            except Exception as e:
-                batch = futures[future]
-                print(f"[Mapper] Batch failed ({[n['id'] for n in batch[:3]]}…): {e}")
-                # Fallback: assign Tier 1 to every node in the failed batch
-                for n in batch:
-                    tier_map[n["id"]] = {
-                        "classification": "unknown", "risk_tier": 1,
-                        "deep_reasoning_required": False,
-                        "external_interaction_likelihood": "low", "confidence": 0.5,
-                    }
-    return tier_map
 
 # ---------------------------------------------------------------------------
-# LINKER — parallel batch relation extraction (no overlap)
+# LINKER — batch relation extraction (no overlap)
 # ---------------------------------------------------------------------------
 
-@traceable(project_name="CodeForge")
-def extract_relations(client, nodes: List[Dict], all_nodes: List[Dict]) -> Dict[str, Any]:
-    """Extract semantic relationships for a single batch."""
-    cfg       = MODEL_ROLES["linker"]
-    summaries = [_prepare_node_summary(n, all_nodes) for n in nodes]
-    prompt    = (
+def _linker_prompt(nodes: List[Dict], ctx: OrchestratorContext, fmt: Optional[str] = None) -> str:
+    summaries = [ctx.summary(n) for n in nodes]
+    return (
         f"Analyze the following {len(summaries)} AST nodes.\n"
         "Extract semantic relations and assign architectural roles.\n\n"
         "IMPORTANT: NO REDUNDANT EDGES between the same source and target. "
         "Pick the MOST SPECIFIC edge type.\n\n"
-        f"Nodes:\n{json.dumps(summaries, indent=2)}"
+        f"{prompt_format.encode_nodes(summaries, fmt)}"
     )
-    raw    = _call_model(client, "linker", cfg["model_id"], SYSTEM_PROMPT_LINKER, prompt, cfg["temperature"])
+
+def _linker_result(raw: str, nodes: List[Dict]) -> Dict[str, Any]:
     parsed = _parse_json_response(raw)
     if not parsed:
         print("[Linker] Failed to parse response.")
         return {"results": [], "relationships": []}
+    table = prompt_format.string_table(nodes)
+    if isinstance(parsed.get("results"), list):
+        parsed["results"] = [_expand_ids(r, table, ("id",)) for r in parsed["results"]]
+    if isinstance(parsed.get("relationships"), list):
+        parsed["relationships"] = [_expand_ids(r, table, ("source", "target"))
+                                   for r in parsed["relationships"]]
     return parsed
 
+def _collect_linker_result(result: Dict[str, Any], all_edges: List[Dict],
+                           node_result_map: Dict[str, Dict]):
+    """Fold one batch's relationships / per-node results into the run totals."""
+    if "relationships" in result:
+        all_edges.extend(result["relationships"])
+    if "results" in result:
+        for nd in result["results"]:
+            nid = nd.get("id")
+            if nid:
+                node_result_map[nid] = nd
 
-def _run_linker_parallel(client, nodes_for_extraction: List[Dict],
-                          all_nodes: List[Dict],
-                          batch_size: int = 8) -> tuple:
-    """
-    Split nodes into batches and extract relations concurrently.
-    Overlap removed — each node appears in exactly one batch.
-    Returns (all_edges, node_result_map).
-    """
-    batches = [nodes_for_extraction[i:i + batch_size]
-               for i in range(0, len(nodes_for_extraction), batch_size)]
-
-    all_edges: List[Dict]        = []
-    node_result_map: Dict[str, Dict] = {}
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = {
-            executor.submit(extract_relations, client, batch, all_nodes): batch
-            for batch in batches
-        }
-        for future in as_completed(futures):
-            try:
-                result = future.result()
-                if "relationships" in result:
-                    all_edges.extend(result["relationships"])
-                if "results" in result:
-                    for nd in result["results"]:
-                        nid = nd.get("id")
-                        if nid:
-                            node_result_map[nid] = nd
-            except Exception as e:
-                batch = futures[future]
-                print(f"[Linker] Batch failed ({[n['id'] for n in batch[:3]]}…): {e}")
+@traceable(project_name="CodeForge")
+def extract_relations(client, nodes: List[Dict], ctx: OrchestratorContext) -> Dict[str, Any]:
+    """Extract semantic relationships for a single batch (what streamed of an off-schema answer)."""
+    cfg    = MODEL_ROLES["linker"]
+    stream = _answer_stream("linker", nodes)
+    try:
+        raw = _call_model(client, "linker", cfg["model_id"], SYSTEM_PROMPT_LINKER,
+                          _linker_prompt(nodes, ctx), cfg["temperature"], len(nodes), stream)
+    except OffSchema:
+        raw = stream.answer()
+    return _linker_result(raw, nodes)
 
-    return all_edges, node_result_map
 
 # ---------------------------------------------------------------------------
-# SENTINEL — deep risk analysis (parallel, higher worker count)
+# SENTINEL — per-node deep risk analysis
 # ---------------------------------------------------------------------------
 
-@traceable(project_name="CodeForge")
-def analyze_risk_deep(client, node: Dict, relations: List[Dict]) -> Optional[Dict]:
-    """Deep security reasoning on a single node."""
-    cfg    = MODEL_ROLES["sentinel"]
-    prompt = (
-        "Analyze the following node for security and stability risks.\n\n"
-        f"Node:\n{json.dumps(node, indent=2)}\n\n"
-        f"Known relations:\n{json.dumps(relations, indent=2)}"
-    )
-    for attempt in range(cfg["max_retries"]):
-        try:
-            raw    = _call_model(client, "sentinel", cfg["model_id"],
-                                 SYSTEM_PROMPT_SENTINEL, prompt, cfg["temperature"])
-            parsed = _parse_json_response(raw)
-            if parsed and "risk_breakdown" in parsed:
-                return parsed
-        except Exception as e:
-            print(f"[Sentinel] Attempt {attempt + 1} failed: {e}")
-            time.sleep(2 ** attempt)
+MAX_SENTINEL_RELATIONS = 10   # fallback context when no attack path exists
+SENTINEL_SNIPPET_BYTES = 2400 # ≈ 600 tokens of source per Sentinel prompt
+SENTINEL_BATCH_SIZE    = int(os.getenv("SENTINEL_BATCH_SIZE", 4))   # 1 = one call per node
+SENTINEL_SHARED_KEYS   = ("file", "language", "parent_class")
+SENTINEL_VECTORS       = ("injection", "authorization", "concurrency", "exposure")
 
+def _sentinel_prompt(node: Dict, attack_paths: List[str],
+                     relations: Optional[List[Dict]] = None) -> List[str]:
+    """
+    The model sees the concrete entry → node → sink paths; only when there
+    are none does it get a capped list of direct relations instead.
+    Segments, stable first: instructions + context, then the node.
+    """
+    if attack_paths:
+        context = "Attack paths (entry -> ... -> sink):\n" + "\n".join(f"- {p}" for p in attack_paths)
+    else:
+        lines = [f"- {r.get('source')} -[{r.get('type', 'related')}]-> {r.get('target')}"
+                 for r in (relations or [])[:MAX_SENTINEL_RELATIONS]]
+        context = "Known relations:\n" + ("\n".join(lines) if lines else "- none")
+    return [
+        f"Analyze the following node for security and stability risks.\n\n{context}\n\n",
+        f"Node:\n{prompt_format.encode_node(node)}",
+    ]
+
+def _sentinel_batch_prompt(items: List[Tuple[Dict, List[str], List[Dict]]],
+                           only: Optional[str] = None) -> List[str]:
+    """
+    Several related nodes in one prompt. Fields every node shares (file,
+    language, parent class), the attack paths and the known relations are
+    written once in a shared section; each node lists the paths through it
+    by reference ("attack_paths": ["P1"]). Segments: instructions + shared
+    context, then the nodes — `only` keeps just that node in the second, so
+    a per-node retry reuses the batch's (cached) prefix.
+    """
+    contexts = [context for context, _, _ in items]
+    first    = contexts[0]
+    common   = {k: first[k] for k in SENTINEL_SHARED_KEYS
+                if first.get(k) and all(c.get(k) == first[k] for c in contexts[1:])}
+    path_refs: Dict[str, str] = {}
+    relation_lines: List[str] = []
+    node_lines: List[str] = []
+    for context, paths, relations in items:
+        node = {k: v for k, v in context.items() if k not in common}
+        if paths:
+            node["attack_paths"] = [path_refs.setdefault(p, f"P{len(path_refs) + 1}") for p in paths]
+        else:
+            for r in (relations or [])[:MAX_SENTINEL_RELATIONS]:
+                line = f"- {r.get('source')} -[{r.get('type', 'related')}]-> {r.get('target')}"
+                if line not in relation_lines:
+                    relation_lines.append(line)
+        if only is None or context["id"] == only:
+            node_lines.append(prompt_format.encode_node(node))
+
+    shared = []
+    if common:
+        shared.append(f"Common fields of every node: {json.dumps(common, separators=(',', ':'), default=str)}")
+    if path_refs:
+        shared.append("Attack paths (entry -> ... -> sink):\n"
+                      + "\n".join(f"- [{ref}] {p}" for p, ref in path_refs.items()))
+    shared.append("Known relations:\n" + ("\n".join(relation_lines) if relation_lines else "- none"))
+    return [
+        "Analyze the following related nodes for security and stability risks.\n"
+        "Return one report per node, keyed by its id.\n\n"
+        "Shared context:\n" + "\n".join(shared) + "\n\n",
+        "Nodes:\n" + "\n".join(node_lines),
+    ]
+
+def _valid_report(report: Any) -> bool:
+    """A Sentinel report with every risk vector and an overall level."""
+    if not isinstance(report, dict) or not isinstance(report.get("risk_breakdown"), dict):
+        return False
+    breakdown = report["risk_breakdown"]
+    return (all(isinstance(breakdown.get(v), dict) and "level" in breakdown[v] for v in SENTINEL_VECTORS)
+            and isinstance(report.get("overall_risk"), str))
+
+def _sentinel_batch_result(raw: str, ids: List[str]) -> Dict[str, Dict]:
+    """Valid reports of a batched answer by node id; missing / malformed ids are left out."""
+    parsed  = _parse_json_response(raw)
+    reports = parsed.get("reports") if isinstance(parsed, dict) else None
+    wanted  = set(ids)
+    out: Dict[str, Dict] = {}
+    for report in reports if isinstance(reports, list) else []:
+        if isinstance(report, dict) and report.get("id") in wanted and _valid_report(report):
+            out[report["id"]] = {k: v for k, v in report.items() if k != "id"}
+    return out
+
+def _sentinel_failure() -> Dict[str, Any]:
+    """Report used once every Sentinel attempt for a node has failed."""
     return {
         "risk_breakdown": {
             "injection":     {"level": "unknown", "reason": "Analysis failed"},
@@ -618,42 +1226,151 @@ def analyze_risk_deep(client, node: Dict, relations: List[Dict]) -> Optional[Dic
             "exposure":      {"level": "unknown", "reason": "Analysis failed"},
         },
         "overall_risk":     "unknown",
-        "blast_radius":     0,
         "confidence_score": 0.4,
         "risk_summary":     "Deep risk analysis failed. Manual review recommended.",
     }
 
+def _risk_update(risk_report: Dict) -> Dict[str, Any]:
+    """Node update fields for a Sentinel report."""
+    overall        = risk_report.get("overall_risk", "low")
+    risk_breakdown = risk_report.get("risk_breakdown", {})
+    return {
+        "risk_level":    overall,
+        "risk_analysis": {
+            "overall_risk": overall,
+            "risk_factors": {
+                k + "_risk": v for k, v in risk_breakdown.items()
+            },
+        },
+        "failure_reason":  risk_report.get("risk_summary", ""),
+        "confidence_score":risk_report.get("confidence_score", 0.0),
+    }
+
+
+@traceable(project_name="CodeForge")
+def analyze_risk_deep(client, node: Dict, attack_paths: List[str],
+                      relations: Optional[List[Dict]] = None) -> Optional[Dict]:
+    """Deep security reasoning on a single node (see _sentinel_prompt)."""
+    cfg    = MODEL_ROLES["sentinel"]
+    prompt = _sentinel_prompt(node, attack_paths, relations)
+    for attempt in range(cfg["max_retries"]):
+        try:
+            raw    = _call_model(client, "sentinel", cfg["model_id"],
+                                 SYSTEM_PROMPT_SENTINEL, prompt, cfg["temperature"], 1)
+            parsed = _parse_json_response(raw)
+            if parsed and "risk_breakdown" in parsed:
+                return parsed
+        except Exception as e:
+            print(f"[Sentinel] Attempt {attempt + 1} failed: {e}")
+            time.sleep(2 ** attempt)
+
+    return _sentinel_failure()
+
+
+@traceable(project_name="CodeForge")
+def analyze_risk_batch(client, items: List[Tuple[Dict, List[str], List[Dict]]]) -> Dict[str, Dict]:
+    """
+    One Sentinel call for several related nodes (see _sentinel_batch_prompt);
+    `items` are (context, attack_paths, relations). Only the ids whose report
+    is missing or fails validation are retried, one node per call, behind
+    the same shared context.
+    """
+    cfg     = MODEL_ROLES["sentinel"]
+    reports: Dict[str, Dict] = {}
+    try:
+        raw     = _call_model(client, "sentinel", cfg["model_id"], SYSTEM_PROMPT_SENTINEL,
+                              _sentinel_batch_prompt(items), cfg["temperature"], len(items))
+        reports = _sentinel_batch_result(raw, [context["id"] for context, _, _ in items])
+    except Exception as e:
+        print(f"[Sentinel] Batch of {len(items)} failed: {e}")
+    retry = [context["id"] for context, _, _ in items if context["id"] not in reports]
+    if retry:
+        print(f"[Sentinel] Retrying {len(retry)}/{len(items)} nodes individually.")
+    for nid in retry:
+        reports[nid] = _sentinel_retry(client, items, nid)
+    return reports
+
+
+def _sentinel_retry(client, items: List[Tuple[Dict, List[str], List[Dict]]], nid: str) -> Dict:
+    """One node of a batch, alone behind the batch's shared context (up to max_retries)."""
+    cfg = MODEL_ROLES["sentinel"]
+    for attempt in range(cfg["max_retries"]):
+        try:
+            raw    = _call_model(client, "sentinel", cfg["model_id"], SYSTEM_PROMPT_SENTINEL,
+                                 _sentinel_batch_prompt(items, only=nid), cfg["temperature"], 1)
+            report = _sentinel_batch_result(raw, [nid]).get(nid)
+            if report:
+                return report
+        except Exception as e:
+            print(f"[Sentinel] Retry {attempt + 1} for {nid} failed: {e}")
+            time.sleep(2 ** attempt)
+    return _sentinel_failure()
+
 # ---------------------------------------------------------------------------
 # HEURISTIC FALLBACK
 # ---------------------------------------------------------------------------
 
-def _create_heuristic_relationships(nodes: List[Dict]) -> List[Dict]:
-    """Basic structural edges when LLM connectivity is low."""
+HEURISTIC_MIN_SHARED_VARS  = 3     # shared variables for a "flow" edge
+HEURISTIC_MAX_CALL_TARGETS = 20    # same-name callees linked per call
+HEURISTIC_MAX_FLOW_EDGES   = 20    # "flow" edges per node, most shared variables first
+HEURISTIC_MAX_VAR_NODES    = 500   # a variable in more nodes than this proposes no candidates
+
+def _create_heuristic_relationships(nodes: List[Dict],
+                                    ctx: Optional[OrchestratorContext] = None) -> List[Dict]:
+    """
+    Basic structural edges when LLM connectivity is low. Calls are matched
+    through the name index and shared-state candidates come from an
+    inverted variable → nodes index, so the cost follows the matches, not
+    N². Below the caps the edges are those of comparing every pair.
+    """
+    ctx = ctx or OrchestratorContext(nodes)
+    var_sets: List[set] = []
+    postings: Dict[str, List[int]] = {}    # variable → indexes of nodes that could share 3
+    for i, node in enumerate(nodes):
+        node_vars = set(node.get("variables", []))
+        var_sets.append(node_vars)
+        if len(node_vars) >= HEURISTIC_MIN_SHARED_VARS:
+            for var in node_vars:
+                postings.setdefault(var, []).append(i)
+
     edges = []
-    for node in nodes:
+    for i, node in enumerate(nodes):
         for call_name in node.get("calls", []):
-            for other in nodes:
-                if other["name"] == call_name and other["id"] != node["id"]:
-                    edges.append({
-                        "source":      node["id"],
-                        "target":      other["id"],
-                        "type":        "calls",
-                        "description": f"{node['name']} calls {other['name']}",
-                        "confidence":  0.9,
-                    })
-        node_vars = set(node.get("variables", []))
-        if len(node_vars) >= 3:
-            for other in nodes:
-                if other["id"] != node["id"]:
-                    shared = node_vars & set(other.get("variables", []))
-                    if len(shared) >= 3:
-                        edges.append({
-                            "source":      node["id"],
-                            "target":      other["id"],
-                            "type":        "flow",
-                            "description": f"Shared data: {', '.join(list(shared)[:2])}...",
-                            "confidence":  0.8,
-                        })
+            if not isinstance(call_name, str):
+                continue
+            targets = [t for t in ctx.ids_by_name.get(call_name, []) if t != node["id"]]
+            for target in targets[:HEURISTIC_MAX_CALL_TARGETS]:
+                edges.append({
+                    "source":      node["id"],
+                    "target":      target,
+                    "type":        "calls",
+                    "description": f"{node['name']} calls {call_name}",
+                    "confidence":  0.9,
+                })
+        node_vars = var_sets[i]
+        if len(node_vars) < HEURISTIC_MIN_SHARED_VARS:
+            continue
+        candidates = set()
+        for var in node_vars:
+            posting = postings[var]
+            if len(posting) <= HEURISTIC_MAX_VAR_NODES:   # "self", "data", ... are no sign of shared state
+                candidates.update(posting)
+        candidates.discard(i)
+        # Exact intersections for the candidates; the most shared kept, in node order
+        shared_with = []
+        for j in candidates:
+            shared = node_vars & var_sets[j]
+            if len(shared) >= HEURISTIC_MIN_SHARED_VARS:
+                shared_with.append((j, shared))
+        shared_with.sort(key=lambda js: (-len(js[1]), js[0]))
+        for j, shared in sorted(shared_with[:HEURISTIC_MAX_FLOW_EDGES], key=lambda js: js[0]):
+            edges.append({
+                "source":      node["id"],
+                "target":      nodes[j]["id"],
+                "type":        "flow",
+                "description": f"Shared data: {', '.join(list(shared)[:2])}...",
+                "confidence":  0.8,
+            })
     seen   = set()
     unique = []
     for e in edges:
@@ -666,46 +1383,45 @@ def _create_heuristic_relationships(nodes: List[Dict]) -> List[Dict]:
 # ---------------------------------------------------------------------------
 # MAIN ORCHESTRATOR
 # ---------------------------------------------------------------------------
+# Everything between the LLM calls lives in _triage / StreamingRun, shared by
+# discover_relations_orchestrated (thread pools) and
+# async_orchestrator.discover_relations_async (one event loop).
 
-@traceable(project_name="CodeForge")
-def discover_relations_orchestrated(nodes: List[Dict[str, Any]]) -> Dict[str, Any]:
-    """
-    Multi-model orchestrated relation discovery.
+def _no_llm_result(nodes: List[Dict]) -> Dict[str, Any]:
+    """Result when Bedrock is unavailable: static secret exposure only."""
+    return {"edges": [], "node_updates": _apply_secret_exposure([n for n in nodes if n.get("id")], {})}
 
-    Pipeline:
-      0. Result cache      — skip nodes seen in a previous run
-      0b. Heuristic filter — auto-assign obvious Tier-0 nodes without LLM
-      1. Mapper (parallel) — classify remaining nodes, assign tiers
-      2. Linker (parallel) — extract relations, no overlap
-      3. Sentinel (×6)     — deep risk analysis on Tier 2-3
-      4. Heuristic fallback if connectivity is low
 
-    Returns: {"edges": [...], "node_updates": {...}}
-    """
-    # ── Credentials check ─────────────────────────────────────────────
-    if not os.getenv("AWS_ACCESS_KEY_ID") or not os.getenv("AWS_SECRET_ACCESS_KEY"):
-        print("Warning: No AWS credentials. Skipping orchestrated analysis.")
-        return {"edges": [], "node_updates": {}}
+# Impact fields computed in graph_features; they depend on the node's position
+# in the graph, which neither the Linker nor the cache key (_node_hash) sees
+_STATIC_IMPACT_FIELDS = ("blast_radius_score", "dominated_count", "reverse_reach_count")
 
-    try:
-        client = _get_bedrock_client()
-    except Exception as e:
-        print(f"Warning: Failed to create Bedrock client: {e}")
-        return {"edges": [], "node_updates": {}}
 
-    valid_nodes = [n for n in nodes if n.get("id")]
-    if not valid_nodes:
-        return {"edges": [], "node_updates": {}}
+def _with_static_impact(impact: Optional[Dict], node: Dict) -> Dict:
+    """impact_analysis with the node's current graph-derived values over any stored ones."""
+    impact = dict(impact or {})
+    impact["blast_radius_score"] = node.get("blast_radius_score", 1)
+    for field in _STATIC_IMPACT_FIELDS[1:]:
+        if field in impact or field in node:
+            impact[field] = node.get(field, impact.get(field))
+    return impact
 
-    all_edges:    List[Dict]      = []
-    node_updates: Dict[str, Dict] = {}
 
+def _triage(valid_nodes: List[Dict], node_updates: Dict[str, Dict]) -> Dict[str, List[Dict]]:
+    """
+    Steps 0–0b: result cache, analysis scope and the heuristic Tier-0 /
+    Tier-1 pre-filter. Fills node_updates for everything that needs no LLM
+    call and returns the node groups ("cached", "tier0", "tier1", "mapper").
+    """
     # ── Step 0: Result cache — skip unchanged nodes from prior runs ────
     cached_nodes   = []
     uncached_nodes = []
     for node in valid_nodes:
         cached = _cache_get(node)
         if cached:
+            # The cache key ignores graph position: callers may have changed since
+            if "impact_analysis" in cached:
+                cached = {**cached, "impact_analysis": _with_static_impact(cached["impact_analysis"], node)}
             node_updates[node["id"]] = cached
             cached_nodes.append(node)
         else:
@@ -715,20 +1431,42 @@ def discover_relations_orchestrated(nodes: List[Dict[str, Any]]) -> Dict[str, An
         print(f"[Orchestrator] Cache hit: {len(cached_nodes)} nodes skipped "
               f"({len(uncached_nodes)} to analyse).")
 
-    nodes_to_process = uncached_nodes
+    # ── Step 0a: Analysis scope — skipped / collapsed nodes get no LLM call
+    nodes_to_process = []
+    out_of_scope     = []
+    for node in uncached_nodes:
+        scope = node.get("analysis_scope") or {}
+        if scope.get("decision") in ("skip", "collapsed"):
+            out_of_scope.append(node)
+            node_updates[node["id"]] = {
+                "risk_tier":      0,
+                "classification": "out_of_scope",
+                "deep_reasoning_required": False,
+                "external_interaction_likelihood": "none",
+                "risk_level":     "none",
+                "failure_reason": f"Out of analysis scope — {scope.get('reason', 'policy')}",
+                "confidence_score": 0.6,
+            }
+        else:
+            nodes_to_process.append(node)
+    if out_of_scope:
+        print(f"[Orchestrator] Scope policy: {len(out_of_scope)} nodes skipped / collapsed (no LLM call).")
 
-    # ── Step 0b: Heuristic Tier-0 pre-filter ──────────────────────────
+    # ── Step 0b: Heuristic Tier-0 / Tier-1 pre-filter ─────────────────
     heuristic_tier0 = []
+    heuristic_tier1 = []
     needs_mapper    = []
     for node in nodes_to_process:
         if _is_heuristic_tier0(node):
             heuristic_tier0.append(node)
+        elif _is_heuristic_tier1(node):
+            heuristic_tier1.append(node)
         else:
             needs_mapper.append(node)
 
-    if heuristic_tier0:
+    if heuristic_tier0 or heuristic_tier1:
         print(f"[Orchestrator] Heuristic pre-filter: {len(heuristic_tier0)} nodes "
-              f"auto-assigned Tier 0 (no LLM call).")
+              f"auto-assigned Tier 0, {len(heuristic_tier1)} Tier 1 (no Mapper call).")
 
     tier0_update = {
         "risk_tier":      0,
@@ -746,149 +1484,493 @@ def discover_relations_orchestrated(nodes: List[Dict[str, Any]]) -> Dict[str, An
         node_updates[node["id"]] = update
         _cache_set(node, update)
 
-    # ── Phase 1: Mapper — parallel batch classification ────────────────
-    tier_map: Dict[str, Dict] = {}
-    if needs_mapper:
-        print(f"[Orchestrator] Phase 1: Classifying {len(needs_mapper)} nodes "
-              f"(parallel batches, batch_size=20)...")
-        tier_map = _run_mapper_parallel(client, needs_mapper, valid_nodes, batch_size=20)
-
-    # Partition by tier
-    tier_buckets: Dict[int, List[Dict]] = {0: [], 1: [], 2: [], 3: []}
-    for node in needs_mapper:
-        tier_info = tier_map.get(node["id"], {})
-        tier      = max(0, min(3, tier_info.get("risk_tier", 1)))
-        tier_buckets[tier].append(node)
-        node_updates[node["id"]] = {
-            "risk_tier":      tier,
-            "classification": tier_info.get("classification", "unknown"),
-            "deep_reasoning_required": tier_info.get("deep_reasoning_required", False),
-            "external_interaction_likelihood": tier_info.get("external_interaction_likelihood", "none"),
-        }
+    return {"cached": cached_nodes, "tier0": heuristic_tier0,
+            "tier1": heuristic_tier1, "mapper": needs_mapper}
+
 
-    # Include heuristic Tier-0 in the bucket for reporting
-    tier_buckets[0].extend(heuristic_tier0)
+def _hard_signal(node: Dict) -> bool:
+    """
+    Tier 3 regardless of what the Mapper says: eval / shell calls, or an
+    unsanitized sink matched with high confidence. Such nodes go to the
+    Sentinel as soon as the run starts (unless the scope policy caps them).
+    """
+    if (node.get("analysis_scope") or {}).get("decision") == "deprioritise":
+        return False
+    return bool(node.get("has_eval") or node.get("has_shell_call")) or _finding_tier_floor(node) >= 3
 
-    t0 = len(tier_buckets[0])
-    t1 = len(tier_buckets[1])
-    t2 = len(tier_buckets[2])
-    t3 = len(tier_buckets[3])
-    print(f"[Orchestrator] Tiers: T0={t0} skip, T1={t1} light, T2={t2} moderate, T3={t3} deep")
 
-    if (t2 + t3) == 0 and len(valid_nodes) > 10:
-        print("[Orchestrator] WARNING: Zero nodes classified as Tier 2 or 3. "
-              "Sentinel will be skipped.")
+def _summary_chars(summary: Dict) -> int:
+    """Prompt size of one node summary (compact: without string-table savings)."""
+    if prompt_format.resolve(None) == "json":
+        return len(json.dumps([summary], indent=2))
+    return len(prompt_format.encode_summary(summary, [])) + 1
 
-    # LLM-classified Tier 0 nodes
-    for node in tier_buckets[0]:
-        if node["id"] not in node_updates or "risk_level" not in node_updates[node["id"]]:
-            update = {
-                **node_updates.get(node["id"], {}),
+
+def _pack(nodes: List[Dict], role: str, ctx: OrchestratorContext) -> List[List[Dict]]:
+    """
+    Mapper / Linker batches packed to the role's token budgets from the
+    ledger's cost estimates (batch_packer.py); MAPPER_BATCH_SIZE and
+    LINKER_BATCH_SIZE are now upper bounds on the node count.
+    """
+    if not nodes:
+        return []
+    cfg = MODEL_ROLES[role]
+    if role == "mapper":
+        cap, overhead = MAPPER_BATCH_SIZE, len(SYSTEM_PROMPT_MAPPER) + len(_mapper_prompt([], ctx))
+    else:
+        cap, overhead = LINKER_BATCH_SIZE, len(SYSTEM_PROMPT_LINKER) + len(_linker_prompt([], ctx))
+    # Size of each summary as the prompt embeds it
+    chars = [ctx.summary_chars(n) for n in nodes]
+    return pack_batches(nodes, chars, _get_token_ledger(), role, cfg["model_id"], cap,
+                        cfg["batch_input_tokens"], cfg["max_tokens"], overhead)
+
+
+class StreamingRun:
+    """
+    Dataflow state of one orchestrated run, shared by both drivers (thread
+    pools here, the event loop in async_orchestrator). Instead of three
+    barriers between phases, work flows per batch / per node:
+
+      start()      → Mapper batches, Linker batches for heuristic Tier-1
+                     nodes, and hard-signal nodes for the Sentinel right away
+      on_classified() → one streamed classification; a Linker batch as
+                     soon as the batch's Tier 1–3 nodes fill one
+      on_mapper()  → the rest of that batch's Tier 1–3 nodes as Linker batches
+      on_linker()  → that batch's nodes routed to the Sentinel, with the
+                     relations the batch returned for them
+      on_sentinel()
+
+    Nodes released to the Sentinel come as batches of related nodes
+    (sentinel_batches) for analyze_risk_batch; single-node batches use
+    analyze_risk_deep.
+      finish()     → edge dedupe / fallback, secret exposure, cache stats
+
+    The driver submits whatever each call returns. Risk fields are applied
+    and the node's result cached once its last stage completes. Attack paths come from the static graph,
+    which is complete before the run starts; Linker edges reach the Sentinel
+    as "Known relations" of the batch that produced them.
+    """
+
+    def __init__(self, valid_nodes: List[Dict], reach_index: Optional[ReachabilityIndex] = None,
+                 snippets: Optional[SnippetStore] = None):
+        self.valid_nodes  = valid_nodes
+        self.context      = OrchestratorContext(valid_nodes)
+        self.node_by_id   = self.context.node_by_id
+        self.reach_index  = reach_index
+        self.snippets     = snippets
+        self.node_updates: Dict[str, Dict] = {}
+        self.all_edges:    List[Dict]      = []
+        self.groups       = _triage(valid_nodes, self.node_updates)
+        self.tier_buckets: Dict[int, List[Dict]] = {0: list(self.groups["tier0"]), 1: [], 2: [], 3: []}
+        self._stages: Dict[str, set] = {}        # node id → stages still to run
+        self._final: Dict[str, Dict] = {}        # applied last, as in the phased order
+        self._early: set = set()                 # hard-signal ids sent to the Sentinel at start
+        self._failed: set = set()                # Sentinel raised — not cached
+        self._classified: set = set()            # ids whose Mapper classification is applied
+        self._to_link: Dict[str, List[Dict]] = {}   # Mapper batch → nodes not yet in a Linker batch
+        self._prepare = None
+
+    # ------------------------------------------------------------------
+    # Events
+    # ------------------------------------------------------------------
+
+    def start(self) -> Tuple[List[List[Dict]], List[List[Dict]], List[List[Dict]]]:
+        """(Mapper batches, Linker batches, Sentinel batches) that can run immediately."""
+        for node in self.groups["mapper"]:
+            self._stages[node["id"]] = {"mapper"}
+        # Heuristic Tier-1: skip the Mapper, still go through the Linker
+        for node in self.groups["tier1"]:
+            self.tier_buckets[1].append(node)
+            self.node_updates[node["id"]] = {
+                "risk_tier":      1,
+                "classification": "utility",
+                "deep_reasoning_required": False,
+                "external_interaction_likelihood": "none",
+            }
+            self._stages[node["id"]] = {"linker"}
+        early = [n for n in self.groups["mapper"] if _hard_signal(n)]
+        for node in early:
+            self._early.add(node["id"])
+            self._stages[node["id"]].add("sentinel")
+        to_mapper, to_link = self._local_triage(self.groups["mapper"])
+        mapper_batches = _pack(to_mapper, "mapper", self.context)
+        linker_batches = (_pack(self.groups["tier1"], "linker", self.context)
+                          + _pack(to_link, "linker", self.context))
+        print(f"[Orchestrator] Streaming: {len(mapper_batches)} Mapper batches, "
+              f"{len(linker_batches)} Tier-1 Linker batches, {len(early)} hard-signal "
+              f"nodes sent to the Sentinel immediately.")
+        return mapper_batches, linker_batches, self.sentinel_batches(early)
+
+    def _local_triage(self, nodes: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Classify the nodes the local triage model is confident about, as the
+        Mapper's answers would be. Returns (nodes for the Mapper, nodes now
+        bound for the Linker).
+        """
+        model, _ = _get_triage()
+        if model is None or not nodes:
+            return nodes, []
+        to_mapper, to_link = [], []
+        for node, prediction in zip(nodes, model.predict(nodes)):
+            if prediction is None:
+                to_mapper.append(node)
+            elif self._classify(node, prediction):
+                to_link.append(node)
+        print(f"[Triage] Local model classified {len(nodes) - len(to_mapper)} of {len(nodes)} nodes "
+              f"(confidence ≥ {model.threshold:.2f}); {len(to_mapper)} go to the Mapper.")
+        return to_mapper, to_link
+
+    def on_classified(self, batch: List[Dict], classification: Dict) -> List[List[Dict]]:
+        """
+        One classification of a Mapper batch still streaming. Returns a Linker
+        batch once the batch's nodes bound for the Linker fill one — packed
+        as on_mapper would, the open batch is held back until it is full.
+        """
+        nid  = classification.get("id")
+        node = next((n for n in batch if n["id"] == nid), None)
+        if node is None or nid in self._classified:
+            return []
+        to_link = self._to_link.setdefault(batch[0]["id"], [])
+        if self._classify(node, classification):
+            to_link.append(node)
+        packed = _pack(to_link, "linker", self.context)
+        if len(packed) <= 1:
+            return []
+        to_link[:] = packed[-1]
+        return packed[:-1]
+
+    def on_mapper(self, batch: List[Dict], tier_map: Dict[str, Dict]) -> List[List[Dict]]:
+        """Bucket one Mapper batch; returns Linker batches for its Tier 1–3 nodes not yet released."""
+        to_link = self._to_link.pop(batch[0]["id"], [])
+        for node in batch:
+            if node["id"] not in self._classified and self._classify(node, tier_map.get(node["id"], {})):
+                to_link.append(node)
+        return _pack(to_link, "linker", self.context)
+
+    def _classify(self, node: Dict, tier_info: Dict) -> bool:
+        """Apply a node's Mapper classification; True if it goes on to the Linker."""
+        nid  = node["id"]
+        self._classified.add(nid)
+        _record_label(node, tier_info)
+        tier = max(0, min(3, tier_info.get("risk_tier", 1)))
+        tier = max(tier, _finding_tier_floor(node))
+        if _hard_signal(node):
+            tier = 3
+        if (node.get("analysis_scope") or {}).get("decision") == "deprioritise":
+            tier = min(tier, 1)   # scope policy: Mapper + Linker only
+        self.tier_buckets[tier].append(node)
+        # update(), not assignment: an early Sentinel result may already be here
+        self.node_updates.setdefault(nid, {}).update({
+            "risk_tier":      tier,
+            "classification": tier_info.get("classification", "unknown"),
+            "deep_reasoning_required": tier_info.get("deep_reasoning_required", False),
+            "external_interaction_likelihood": tier_info.get("external_interaction_likelihood", "none"),
+        })
+        if tier == 0:
+            # LLM-classified Tier 0: no Linker, no Sentinel
+            self.node_updates[nid].update({
                 "risk_level":     "none",
                 "failure_reason": "Trivial node — skipped deep analysis",
                 "architectural_role": "utility",
                 "confidence_score": 0.95,
                 "node_summary":   f"Trivial: {node['name']}",
-            }
-            node_updates[node["id"]] = update
-            _cache_set(node, update)
-
-    # ── Phase 2: Linker — parallel, no overlap ────────────────────────
-    nodes_for_extraction = tier_buckets[1] + tier_buckets[2] + tier_buckets[3]
-    if nodes_for_extraction:
-        print(f"[Orchestrator] Phase 2: Extracting relations for "
-              f"{len(nodes_for_extraction)} nodes (parallel, batch_size=8, no overlap)...")
-        linker_edges, linker_results = _run_linker_parallel(
-            client, nodes_for_extraction, valid_nodes, batch_size=8
-        )
-        all_edges.extend(linker_edges)
-
-        for nid, nd in linker_results.items():
-            if nid in node_updates:
-                node_updates[nid].update({
+            })
+        else:
+            self._stages[nid].add("linker")
+            if tier == 2 and not _needs_sentinel(node, 2):
+                self._final[nid] = {
+                    "risk_level": "low",
+                    "failure_reason": "No feasible source-to-sink path (taint summary) — Sentinel skipped",
+                    "confidence_score": 0.7}
+            elif tier >= 2 and nid not in self._early:
+                self._stages[nid].add("sentinel")
+        self._done(node, "mapper")
+        return tier > 0
+
+    def on_linker(self, batch: List[Dict], result: Dict[str, Any]) -> List[List[Dict]]:
+        """Merge one Linker batch; returns Sentinel batches of its nodes that are now ready."""
+        batch_edges: List[Dict] = []
+        results:     Dict[str, Dict] = {}
+        _collect_linker_result(result, batch_edges, results)
+        self.all_edges.extend(batch_edges)
+        self.context.add_relations(batch, batch_edges)
+        for nid, nd in results.items():
+            if nid in self.node_updates:
+                # Blast radius is computed statically in graph_features — the
+                # Linker no longer estimates it, so inject the graph value.
+                impact = _with_static_impact(nd.get("impact_analysis"), self.node_by_id.get(nid, {}))
+                self.node_updates[nid].update({
                     "architectural_role":  nd.get("architectural_role", "unknown"),
                     "node_summary":        nd.get("node_summary", ""),
                     "entry_point":         nd.get("entry_point", {}),
                     "sensitive_behaviors": nd.get("sensitive_behaviors", {}),
-                    "impact_analysis":     nd.get("impact_analysis", {}),
+                    "impact_analysis":     impact,
                     "confidence_score":    nd.get("confidence_score", 0.0),
                 })
+        ready = []
+        for node in batch:
+            nid = node["id"]
+            if "sentinel" in self._stages.get(nid, ()) and nid not in self._early:
+                ready.append(node)
+            self._done(node, "linker")
+        return self.sentinel_batches(ready)
+
+    def sentinel_batches(self, nodes: List[Dict]) -> List[List[Dict]]:
+        """
+        Related nodes — same file, or linked by a relation the Linker just
+        returned — placed next to each other and packed into Sentinel batches
+        of at most SENTINEL_BATCH_SIZE nodes, within the Sentinel's token budgets.
+        """
+        if SENTINEL_BATCH_SIZE <= 1 or len(nodes) <= 1:
+            return [[n] for n in nodes]
+        ids    = {n["id"] for n in nodes}
+        parent = {nid: nid for nid in ids}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        by_file: Dict[str, str] = {}
+        for node in nodes:
+            nid = node["id"]
+            if node.get("file"):
+                parent[find(nid)] = find(by_file.setdefault(node["file"], nid))
+            for e in self._relations(nid):
+                other = e.get("target") if e.get("source") == nid else e.get("source")
+                if other in ids:
+                    parent[find(nid)] = find(other)
+        order: Dict[str, int] = {}
+        for node in nodes:
+            order.setdefault(find(node["id"]), len(order))
+        grouped = sorted(nodes, key=lambda n: order[find(n["id"])])   # stable: file order within a group
+
+        cfg   = MODEL_ROLES["sentinel"]
+        extra = SENTINEL_SNIPPET_BYTES if self.snippets is not None else 0
+        chars = [len(prompt_format.encode_node(n)) + extra for n in grouped]
+        return pack_batches(grouped, chars, _get_token_ledger(), "sentinel", cfg["model_id"],
+                            SENTINEL_BATCH_SIZE, cfg["batch_input_tokens"], cfg["max_tokens"],
+                            len(SYSTEM_PROMPT_SENTINEL))
+
+    def sentinel_inputs(self, node: Dict) -> Tuple[Dict, List[str], List[Dict]]:
+        """(context, attack_paths, relations) for one Sentinel call."""
+        if self._prepare is None:
+            self._prepare = _sentinel_inputs(self.context, self.reach_index, self.snippets)
+        context, paths = self._prepare(node)
+        return context, paths, self._relations(node["id"])
+
+    def _relations(self, node_id: str) -> List[Dict]:
+        # Hard-signal nodes go to the Sentinel before their Linker batch:
+        # whether it has returned by then is timing, so they get none
+        return [] if node_id in self._early else self.context.relations(node_id)
+
+    def on_sentinel(self, node: Dict, risk_report: Optional[Dict]):
+        """Apply a Sentinel report (None when the call raised)."""
+        if risk_report:
+            # held until the node's last stage, so a Linker batch returning
+            # after an early Sentinel cannot overwrite the risk fields
+            self._final[node["id"]] = _risk_update(risk_report)
+        else:
+            self._failed.add(node["id"])
+        self._done(node, "sentinel")
+
+    def _done(self, node: Dict, stage: str):
+        nid    = node["id"]
+        stages = self._stages.get(nid)
+        if stages is None:
+            return
+        stages.discard(stage)
+        if stages:
+            return
+        del self._stages[nid]
+        update = self.node_updates[nid]
+        update.update(self._final.pop(nid, {}))
+        if update.get("risk_tier") == 1 and "risk_level" not in update:
+            # Tier-1 defaults (no Sentinel)
+            update.update({"risk_level": "low",
+                           "failure_reason": "Low-risk node — lightweight analysis only",
+                           "confidence_score": 0.75})
+        if nid not in self._failed:
+            _cache_set(node, update)
 
-    # ── Phase 3: Sentinel — parallel, 6 workers ───────────────────────
-    MAX_PARALLEL_RISK  = 6   # raised from 3; rate limiter keeps us at ≤10 req/s
-    nodes_for_deep_risk = tier_buckets[2] + tier_buckets[3]
-    if nodes_for_deep_risk:
-        print(f"[Orchestrator] Phase 3: Deep risk analysis for "
-              f"{len(nodes_for_deep_risk)} nodes (parallel, workers={MAX_PARALLEL_RISK})...")
-
-        node_relation_map = {
-            node["id"]: [
-                e for e in all_edges
-                if e.get("source") == node["id"] or e.get("target") == node["id"]
-            ]
-            for node in nodes_for_deep_risk
-        }
+    # ------------------------------------------------------------------
+    # Result
+    # ------------------------------------------------------------------
 
-        def _analyze_single(node):
-            nid = node["id"]
-            return nid, analyze_risk_deep(client, node, node_relation_map[nid])
+    def finish(self) -> Dict[str, Any]:
+        """Edge dedupe / heuristic fallback, secret exposure and cache stats."""
+        t0, t1, t2, t3 = (len(self.tier_buckets[t]) for t in range(4))
+        print(f"[Orchestrator] Tiers: T0={t0} skip, T1={t1} light, T2={t2} moderate, T3={t3} deep")
+        if (t2 + t3) == 0 and len(self.valid_nodes) > 10:
+            print("[Orchestrator] WARNING: Zero nodes classified as Tier 2 or 3. "
+                  "Sentinel was skipped.")
 
-        with ThreadPoolExecutor(max_workers=MAX_PARALLEL_RISK) as executor:
-            futures = {executor.submit(_analyze_single, node): node
-                       for node in nodes_for_deep_risk}
-            for future in as_completed(futures):
-                node = futures[future]
-                try:
-                    nid, risk_report = future.result()
-                    if risk_report:
-                        overall        = risk_report.get("overall_risk", "low")
-                        risk_breakdown = risk_report.get("risk_breakdown", {})
-                        update = {
-                            "risk_level":    overall,
-                            "risk_analysis": {
-                                "overall_risk": overall,
-                                "risk_factors": {
-                                    k + "_risk": v for k, v in risk_breakdown.items()
-                                },
-                            },
-                            "failure_reason":  risk_report.get("risk_summary", ""),
-                            "confidence_score":risk_report.get("confidence_score", 0.0),
-                        }
-                        node_updates[nid].update(update)
-                        _cache_set(node, node_updates[nid])
-                except Exception as e:
-                    print(f"[Sentinel] Parallel analysis failed for {node['id']}: {e}")
+        # ── Deduplication ─────────────────────────────────────────────────
+        edge_table = EdgeTable.from_dicts(self.all_edges).drop_invalid().dedupe()
+
+        # ── Heuristic fallback ────────────────────────────────────────────
+        if len(edge_table) < len(self.valid_nodes) * 0.1:
+            print("[Orchestrator] Low connectivity — adding heuristic relationships...")
+            edge_table.extend(_create_heuristic_relationships(self.valid_nodes, self.context)).drop_invalid().dedupe()
+        unique_edges = edge_table.to_dicts()
 
-    # Tier-1 defaults (no Sentinel)
-    for node in tier_buckets[1]:
+        _apply_secret_exposure(self.valid_nodes, self.node_updates)
+
+        cache_stats = _cache_stats()
+        groups = self.groups
+        print(f"[Orchestrator] Done. {len(unique_edges)} edges, "
+              f"{len(groups['cached'])} cache hits ({cache_stats.get('hit_rate', 0.0):.0%} hit rate), "
+              f"{len(groups['tier0'])} heuristic Tier-0 / {len(groups['tier1'])} Tier-1 skips.")
+
+        return {"edges": unique_edges, "node_updates": self.node_updates, "cache": cache_stats,
+                "token_ledger": _get_token_ledger().snapshot()}
+
+
+def _sentinel_inputs(ctx: OrchestratorContext, reach_index: Optional[ReachabilityIndex],
+                     snippets: Optional[SnippetStore]):
+    """
+    Build the attack-path engine over the static graph once, and return
+    prepare(node) -> (context, attack_paths) for each Sentinel call.
+    """
+    entry_ids   = [n["id"] for n in ctx.nodes if n.get("is_entry_point")]
+    sink_labels = {n["id"]: (n.get("risk_ast") or {}).get("sinks")
+                   for n in ctx.nodes if (n.get("risk_ast") or {}).get("sinks")}
+    graph_edges = []
+    if reach_index is not None:
+        graph_edges = [{"source": u, "target": v, "type": d.get("type")}
+                       for u, v, d in reach_index.G.edges(data=True)]
+    path_engine = AttackPathEngine(graph_edges, entry_ids, sink_labels)
+    names       = {nid: n.get("name", nid) for nid, n in ctx.node_by_id.items()}
+
+    def prepare(node):
         nid = node["id"]
-        if "risk_level" not in node_updates.get(nid, {}):
-            update = {"risk_level": "low",
-                      "failure_reason": "Low-risk node — lightweight analysis only",
-                      "confidence_score": 0.75}
-            node_updates[nid].update(update)
-            _cache_set(node, node_updates[nid])
-
-    # ── Deduplication ─────────────────────────────────────────────────
-    seen_edges   = set()
-    unique_edges = []
-    for edge in all_edges:
-        key = (edge.get("source"), edge.get("target"), edge.get("type"))
-        if key not in seen_edges and edge.get("source") and edge.get("target"):
-            seen_edges.add(key)
-            unique_edges.append(edge)
-
-    # ── Heuristic fallback ────────────────────────────────────────────
-    if len(unique_edges) < len(valid_nodes) * 0.1:
-        print("[Orchestrator] Low connectivity — adding heuristic relationships...")
-        for e in _create_heuristic_relationships(valid_nodes):
-            key = (e["source"], e["target"], e["type"])
-            if key not in seen_edges:
-                seen_edges.add(key)
-                unique_edges.append(e)
-
-    print(f"[Orchestrator] Done. {len(unique_edges)} edges, "
-          f"{len(cached_nodes)} cache hits, "
-          f"{len(heuristic_tier0)} heuristic Tier-0 skips.")
-
-    return {"edges": unique_edges, "node_updates": node_updates}
+        context = node
+        if reach_index is not None:
+            context = {**node, "reachable_from_entries":
+                       reach_index.reachable_from_any(entry_ids, nid)[:5]}
+        if snippets is not None:
+            source = snippets.get(nid, max_bytes=SENTINEL_SNIPPET_BYTES)
+            if source:
+                context = {**context, "source": source}
+        return context, path_engine.format_paths(nid, names, sink_labels)
+
+    return prepare
+
+
+@traceable(project_name="CodeForge")
+def discover_relations_orchestrated(nodes: List[Dict[str, Any]],
+                                    reach_index: Optional[ReachabilityIndex] = None,
+                                    snippets: Optional[SnippetStore] = None) -> Dict[str, Any]:
+    """
+    Multi-model orchestrated relation discovery.
+
+    Pipeline:
+      0. Result cache      — skip nodes seen in a previous run
+      0a. Scope policy     — drop skipped / collapsed nodes, cap deprioritised ones
+      0b. Heuristic filter — auto-assign obvious Tier-0 nodes without LLM
+      1. Mapper (×5)       — classify remaining nodes, assign tiers
+      2. Linker (×5)       — extract relations, no overlap; a Mapper batch's
+                             Tier 1–3 nodes are queued as soon as its streamed
+                             classifications fill a Linker batch
+      3. Sentinel (×6)     — deep risk analysis on Tier 3 and Tier 2 nodes
+                             with a feasible taint path, as soon as the node's
+                             Linker batch returns (hard-signal nodes at once),
+                             related nodes batched into one call
+      4. Heuristic fallback if connectivity is low
+
+    Stages stream into each other (StreamingRun), so the wall clock follows
+    the longest per-node chain rather than the sum of per-phase maxima.
+
+    `reach_index` (built once per job) lets the Sentinel see which entry
+    points reach each risky node without a per-node graph traversal.
+    `snippets` (the job's snippet store) supplies bounded function source
+    for Sentinel prompts.
+
+    Returns: {"edges": [...], "node_updates": {...}, "cache": {...}}
+    """
+    # ── Credentials check ─────────────────────────────────────────────
+    if not os.getenv("AWS_ACCESS_KEY_ID") or not os.getenv("AWS_SECRET_ACCESS_KEY"):
+        print("Warning: No AWS credentials. Skipping orchestrated analysis.")
+        return _no_llm_result(nodes)
+
+    try:
+        client = _get_bedrock_client()
+    except Exception as e:
+        print(f"Warning: Failed to create Bedrock client: {e}")
+        return _no_llm_result(nodes)
+
+    valid_nodes = [n for n in nodes if n.get("id")]
+    if not valid_nodes:
+        return {"edges": [], "node_updates": {}}
+
+    run = StreamingRun(valid_nodes, reach_index, snippets)
+    mapper_batches, linker_batches, sentinel_batches = run.start()
+
+    MAX_PARALLEL_RISK = 6   # raised from 3; rate limiter keeps us at ≤10 req/s
+
+    def _analyze(batch):
+        items = [run.sentinel_inputs(node) for node in batch]
+        if len(items) == 1:
+            return {batch[0]["id"]: analyze_risk_deep(client, *items[0])}
+        return analyze_risk_batch(client, items)
+
+    # Workers post (stage, batch, payload) events: streamed classifications
+    # while a Mapper call is still running, then the finished future
+    events: "queue.Queue[Tuple[str, List[Dict], Any]]" = queue.Queue()
+    with ThreadPoolExecutor(max_workers=5) as mapper_pool, \
+            ThreadPoolExecutor(max_workers=5) as linker_pool, \
+            ThreadPoolExecutor(max_workers=MAX_PARALLEL_RISK) as sentinel_pool:
+        outstanding = 0
+
+        def submit(pool, stage, batch, fn, *args):
+            nonlocal outstanding
+            outstanding += 1
+            pool.submit(fn, *args).add_done_callback(lambda f: events.put((stage, batch, f)))
+
+        def submit_mapper(batch):
+            submit(mapper_pool, "mapper", batch, classify_nodes, client, batch, run.context,
+                   lambda item: events.put(("classified", batch, item)))
+
+        def submit_linker(batch):
+            submit(linker_pool, "linker", batch, extract_relations, client, batch, run.context)
+
+        def submit_sentinel(batch):
+            submit(sentinel_pool, "sentinel", batch, _analyze, batch)
+
+        for batch in mapper_batches:
+            submit_mapper(batch)
+        for batch in linker_batches:
+            submit_linker(batch)
+        for batch in sentinel_batches:
+            submit_sentinel(batch)
+
+        # Only this thread touches `run` — workers just make the LLM calls.
+        # A call's streamed events are queued before its done callback fires.
+        while outstanding:
+            stage, item, payload = events.get()
+            if stage == "classified":
+                for batch in run.on_classified(item, payload):
+                    submit_linker(batch)
+                continue
+            outstanding -= 1
+            try:
+                result = payload.result()
+            except Exception as e:
+                print(f"[{stage.capitalize()}] Batch failed ({[n['id'] for n in item[:3]]}…): {e}")
+                result = None
+            if stage == "mapper":
+                # Fallback: Tier 1 for every node of a failed batch
+                tier_map = result if result is not None else {n["id"]: _default_classification() for n in item}
+                for batch in run.on_mapper(item, tier_map):
+                    submit_linker(batch)
+            elif stage == "linker":
+                for batch in run.on_linker(item, result or {}):
+                    submit_sentinel(batch)
+            else:
+                for node in item:
+                    run.on_sentinel(node, (result or {}).get(node["id"]))
+
+    result = run.finish()
+    result["rate_limits"] = rate_limiter.metrics()
+    return result
@@ -0,0 +1,256 @@
+"""
+prompt_format.py - Compact serialization of node summaries for LLM prompts
+
+The Mapper and Linker used to embed their node summaries as indented JSON
+(json.dumps(summaries, indent=2)): most of those input tokens were
+indentation, the same dozen key names on every node and the same file
+path / module prefix spelled out in full on every node of a batch.
+
+PROMPT_FORMAT=compact (the default) writes a batch as:
+
+    Strings: ["./snippet_store.py","snippet_store.SnippetStore"]
+    Nodes:
+    {"i":"@1.__len__","t":"function","f":"@0","l":76,"loc":2,...}
+    {"i":"@1.get","t":"function","f":"@0","l":80,"loc":9,...}
+
+  - one node per line, no indentation
+  - short keys, explained once by LEGEND in the (cacheable) system prompt
+  - a per-batch string table: a file path or id prefix shared by two or
+    more nodes is written once and referenced as "@k"
+  - "name" omitted when it is the last part of the id; null / empty /
+    false values omitted; security flags as a list without "has_"
+
+The model answers with ids as written ("@1.get"); expand() maps them back
+through the same table, which is rebuilt from the batch's nodes.
+PROMPT_FORMAT=json keeps the previous indented JSON, for A/B runs
+(bench_prompt_format.py) and as a fallback.
+"""
+
+import json
+import os
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+PROMPT_FORMAT = os.getenv("PROMPT_FORMAT", "compact").lower()
+FORMATS = ("compact", "json")
+
+MIN_ALIAS_CHARS = 6   # shorter prefixes cost more as "@k" + table entry than they save
+
+# Summary key -> compact key (applies at every nesting level)
+SHORT_KEYS: Dict[str, str] = {
+    "id": "i", "name": "n", "type": "t", "file": "f", "line": "l", "loc": "loc",
+    "language": "lang",
+    "graph": "g", "fan_in": "fi", "fan_out": "fo", "betweenness": "bc",
+    "depth_from_entry": "de", "reachable_sinks": "rs", "blast_radius": "br",
+    "security_flags": "sf",
+    "complexity": "cx", "cyclomatic": "cy", "cognitive": "cg", "nesting": "ns",
+    "rule_findings": "rf", "rule": "r", "confidence": "cf", "sanitized": "san",
+    "risk_ast": "ra", "sources": "src", "sinks": "snk", "entry": "e",
+    "external_interactions": "ext", "taint_path": "tp",
+    "calls": "c", "api_calls": "api", "parameters": "p", "variables": "v",
+    "entry_point": "ep", "methods": "m", "inherits": "inh", "imports": "imp",
+}
+LONG_KEYS: Dict[str, str] = {v: k for k, v in SHORT_KEYS.items()}
+
+LEGEND_TITLE = "COMPACT NODE FORMAT:"
+LEGEND = f"""{LEGEND_TITLE}
+Nodes are given one per line after "Nodes:", with short keys:
+  i=id  n=name (omitted when it is the last part of the id)  t=type  f=file
+  l=line  loc=loc  lang=language
+  g=graph {{fi=fan_in fo=fan_out bc=betweenness de=depth_from_entry
+           rs=reachable_sinks br=blast_radius}}
+  sf=security_flags, listed without the has_ prefix (["eval"] means has_eval=true)
+  cx=complexity {{cy=cyclomatic cg=cognitive ns=nesting}}
+  rf=rule_findings {{r=rule l=line cf=confidence san=sanitized}}
+  ra=risk_ast {{src=sources snk=sinks e=entry ext=external_interactions tp=taint_path}}
+  c=calls  api=api_calls  p=parameters  v=variables  ep=entry_point
+  m=methods  inh=inherits  imp=imports
+Null, empty and false fields are omitted.
+"Strings:" lists file paths and id prefixes shared by several nodes; "@k"
+at the start of a value stands for entry k (e.g. "@1.run" is entry 1
+followed by ".run"). Write every id in your answer exactly as given,
+including its "@k"."""
+
+# Raw-node fields that mean nothing to the Sentinel (byte offsets, hashes)
+SENTINEL_OMIT = ("byte_start", "byte_end", "content_hash")
+
+_REF_RE  = re.compile(r"^@(\d+)")
+_SEP_RE  = re.compile(r"[./:]")
+_LAST_RE = re.compile(r"(?:\.|::|/)([^./:]+)$")
+
+
+def resolve(fmt: Optional[str]) -> str:
+    fmt = (fmt or PROMPT_FORMAT).lower()
+    return fmt if fmt in FORMATS else "compact"
+
+
+def with_legend(system_prompt: str, fmt: Optional[str] = None) -> str:
+    """`system_prompt` with the compact-format legend appended (or removed for json)."""
+    base = system_prompt.split("\n\n" + LEGEND_TITLE)[0]
+    return base if resolve(fmt) == "json" else f"{base}\n\n{LEGEND}"
+
+
+# ---------------------------------------------------------------------------
+# STRING TABLE
+# ---------------------------------------------------------------------------
+
+def _prefixes(node_id: str) -> List[str]:
+    """Proper prefixes of an id ending just before a '.', ':' or '/' separator."""
+    out = []
+    for m in _SEP_RE.finditer(node_id):
+        j = m.start()
+        if j and node_id[j - 1] not in ".:/":
+            out.append(node_id[:j])
+    return out
+
+
+def string_table(nodes: Iterable[Dict]) -> List[str]:
+    """
+    Shared strings of a batch: file paths used by two or more nodes, and the
+    longest id prefix each node shares with another node. Deterministic in
+    the batch, so encoding (from summaries) and expansion (from the raw
+    nodes) rebuild the same table.
+    """
+    nodes  = list(nodes)
+    counts: Dict[str, int] = {}
+    for n in nodes:
+        for s in {*_prefixes(n["id"]), n["id"]}:
+            counts[s] = counts.get(s, 0) + 1
+        if n.get("file"):
+            counts[n["file"]] = counts.get(n["file"], 0) + 1
+    table: List[str] = []
+    seen = set()
+    for n in nodes:
+        picks = [n.get("file")] if n.get("file") and counts[n["file"]] >= 2 else []
+        shared = [p for p in _prefixes(n["id"]) if counts[p] >= 2]
+        if shared:
+            picks.append(shared[-1])
+        for s in picks:
+            if len(s) >= MIN_ALIAS_CHARS and s not in seen:
+                seen.add(s)
+                table.append(s)
+    return table
+
+
+def _ref(value: str, table: List[str], index: Dict[str, int]) -> str:
+    """`value` with its longest table prefix replaced by '@k'."""
+    if value in index:
+        return f"@{index[value]}"
+    for p in reversed(_prefixes(value)):
+        if p in index:
+            return f"@{index[p]}{value[len(p):]}"
+    return value
+
+
+def expand(value: Any, table: List[str]) -> Any:
+    """Inverse of the '@k' references; anything else is returned unchanged."""
+    if isinstance(value, str):
+        m = _REF_RE.match(value)
+        if m and int(m.group(1)) < len(table):
+            return table[int(m.group(1))] + value[m.end():]
+    return value
+
+
+# ---------------------------------------------------------------------------
+# ENCODE / DECODE
+# ---------------------------------------------------------------------------
+
+def _empty(value: Any) -> bool:
+    return value is None or value is False or value == "" or value == [] or value == {}
+
+
+def _shorten(value: Any) -> Any:
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            if k == "security_flags" and isinstance(v, dict):
+                v = [f[4:] if f.startswith("has_") else f for f, on in v.items() if on]
+            v = _shorten(v)
+            if not _empty(v):
+                out[SHORT_KEYS.get(k, k)] = v
+        return out
+    if isinstance(value, list):
+        return [_shorten(v) for v in value]
+    return value
+
+
+def _lengthen(value: Any) -> Any:
+    if isinstance(value, dict):
+        out = {}
+        for k, v in value.items():
+            key = LONG_KEYS.get(k, k)
+            if key == "security_flags" and isinstance(v, list):
+                out[key] = {f"has_{f}": True for f in v}
+            else:
+                out[key] = _lengthen(v)
+        return out
+    if isinstance(value, list):
+        return [_lengthen(v) for v in value]
+    return value
+
+
+def _last_part(node_id: str) -> str:
+    m = _LAST_RE.search(node_id)
+    return m.group(1) if m else node_id
+
+
+def encode_summary(summary: Dict, table: List[str]) -> str:
+    """One node summary as a compact JSON line, strings referenced through `table`."""
+    index = {s: k for k, s in enumerate(table)}
+    node  = dict(summary)
+    if node.get("name") == _last_part(node["id"]):
+        node.pop("name")
+    node["id"] = _ref(node["id"], table, index)
+    if node.get("file"):
+        node["file"] = _ref(node["file"], table, index)
+    return json.dumps(_shorten(node), separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def encode_nodes(summaries: List[Dict], fmt: Optional[str] = None) -> str:
+    """The node block of a Mapper / Linker prompt, from 'Nodes:' on (plus its string table)."""
+    if resolve(fmt) == "json":
+        return f"Nodes:\n{json.dumps(summaries, indent=2)}"
+    table = string_table(summaries)
+    lines = [encode_summary(s, table) for s in summaries]
+    head  = f"Strings: {json.dumps(table, separators=(',', ':'), ensure_ascii=False)}\n" if table else ""
+    return head + "Nodes:\n" + "\n".join(lines)
+
+
+def decode_nodes(prompt: str) -> Tuple[List[Dict], List[str]]:
+    """
+    (summaries, string table) from a prompt in either format. Summaries have
+    their full key names back; ids and files keep their '@k' references as
+    written (expand() resolves them), name is restored from the id.
+    """
+    head, _, tail = prompt.partition("Nodes:\n")
+    table: List[str] = []
+    m = re.search(r"^Strings: (.*)$", head, re.MULTILINE)
+    if m:
+        try:
+            table = json.loads(m.group(1))
+        except json.JSONDecodeError:
+            table = []
+    if tail.lstrip().startswith("["):
+        try:
+            nodes = json.loads(tail)
+        except json.JSONDecodeError:
+            return [], table
+        return [n for n in nodes if isinstance(n, dict) and n.get("id")], table
+    nodes = []
+    for line in tail.splitlines():
+        try:
+            node = _lengthen(json.loads(line))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(node, dict) and node.get("id"):
+            node.setdefault("name", _last_part(expand(node["id"], table)))
+            nodes.append(node)
+    return nodes, table
+
+
+def encode_node(node: Dict, fmt: Optional[str] = None) -> str:
+    """A single raw node for the Sentinel prompt (keys unchanged, noise dropped when compact)."""
+    if resolve(fmt) == "json":
+        return json.dumps(node, separators=(",", ":"), default=str)
+    slim = {k: v for k, v in node.items() if k not in SENTINEL_OMIT and not _empty(v)}
+    return json.dumps(slim, separators=(",", ":"), ensure_ascii=False, default=str)
@@ -0,0 +1,300 @@
+"""
+rate_limiter.py - Per-model adaptive rate limiting for Bedrock calls
+
+Bedrock quotas are per model: requests per minute AND tokens per minute.
+AdaptiveRateLimiter keeps two token buckets per model id and paces callers
+against both:
+
+  - a call books its request (and estimated tokens) under a short lock and
+    gets a ticket on each bucket; it then sleeps OUTSIDE the lock
+    (time.sleep in threads, asyncio.sleep on the event loop) until the
+    refill reaches its tickets, so one waiter never blocks the others
+  - waiters re-check every RECHECK_SECONDS against the CURRENT rate, so a
+    backoff slows the whole queue at once and a recovery speeds it up —
+    bookings made at an old rate neither fire as a burst nor linger
+  - AIMD: a ThrottlingException halves the model's rate (once per burst:
+    calls sent before the last decrease don't count again); once calls
+    have succeeded for INCREASE_INTERVAL without a throttle the rate grows
+    by INCREASE_STEP of the ceiling per INCREASE_INTERVAL, up to the
+    configured quota — time-based, so a busy model does not climb back
+    faster than a quiet one
+  - actual token usage from the response settles the estimate
+  - metrics() reports current rates, bucket levels, throttles and waits
+
+Quotas come from the environment (see from_env):
+  BEDROCK_CALLS_PER_SECOND   request ceiling per model (default 10)
+  BEDROCK_TOKENS_PER_MINUTE  token ceiling per model (default 400000)
+  BEDROCK_MODEL_QUOTAS       JSON overrides, {"<model id>": {"rpm": 500, "tpm": 800000}}
+"""
+
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+DEFAULT_REQUESTS_PER_SECOND = 10.0
+DEFAULT_TOKENS_PER_MINUTE   = 400_000
+
+BURST_SECONDS      = 1.0    # bucket capacity, in seconds of the current rate
+RECHECK_SECONDS    = 0.25   # waiters pick up rate changes this often
+DECREASE_FACTOR    = 0.5    # multiplicative decrease on throttling
+DECREASE_COOLDOWN  = 1.0    # seconds; when the caller gives no send time
+INCREASE_STEP      = 0.05   # additive increase, fraction of the ceiling ...
+INCREASE_INTERVAL  = 0.5    # ... per this many seconds without a throttle
+MIN_SCALE          = 0.05   # never drop below 5% of the ceiling
+
+BACKOFF_BASE = 0.5    # retry backoff (full jitter): uniform(0, BASE * 2**attempt) ...
+BACKOFF_CAP  = 8.0    # ... capped — spreads retries from one burst across the window
+
+EXPECTED_OUTPUT_TOKENS = 800   # output share of the per-call token estimate
+
+THROTTLE_CODES  = {"ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"}
+TRANSIENT_CODES = {"ServiceUnavailableException", "InternalServerException", "ModelNotReadyException",
+                   "ModelStreamErrorException"}
+
+
+def error_code(exc: BaseException) -> str:
+    """
+    AWS error code of a botocore ClientError or async_orchestrator.BedrockError.
+    Errors inside an event stream name their type in camelCase
+    ("throttlingException"); they are returned capitalised like the rest.
+    """
+    code = getattr(exc, "code", None)
+    if not isinstance(code, str):
+        response = getattr(exc, "response", None)
+        code = response.get("Error", {}).get("Code", "") if isinstance(response, dict) else ""
+    return code[:1].upper() + code[1:]
+
+
+def is_throttle(exc: BaseException) -> bool:
+    return error_code(exc) in THROTTLE_CODES
+
+
+def is_transient(exc: BaseException) -> bool:
+    return error_code(exc) in TRANSIENT_CODES
+
+
+def backoff_delay(attempt: int) -> float:
+    """Jittered pause before retry `attempt` of a throttled / transiently failed call."""
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+
+def estimate_tokens(request: Dict[str, Any]) -> int:
+    """Rough token count of a Converse request (≈4 chars / token) plus expected output."""
+    chars = sum(len(b.get("text", "")) for b in request.get("system", []))
+    chars += sum(len(b.get("text", "")) for m in request.get("messages", []) for b in m.get("content", []))
+    max_out = (request.get("inferenceConfig") or {}).get("maxTokens", EXPECTED_OUTPUT_TOKENS)
+    return chars // 4 + min(max_out, EXPECTED_OUTPUT_TOKENS)
+
+
+class TokenBucket:
+    """
+    Continuously refilled bucket that may go negative: a reservation larger
+    than the current level is granted at once as a ticket on `filled` (the
+    total ever refilled) and is covered when the refill reaches it. The
+    wait is derived from the current rate each time it is asked for.
+    """
+
+    def __init__(self, rate: float, now: float):
+        self.rate     = rate
+        self.capacity = max(1.0, rate * BURST_SECONDS)
+        self.level    = self.capacity
+        self.filled   = 0.0
+        self.updated  = now
+
+    def _refill(self, now: float):
+        added        = (now - self.updated) * self.rate
+        self.filled += added
+        self.level   = min(self.capacity, self.level + added)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Take `amount`; return the ticket that covers it."""
+        self._refill(now)
+        self.level -= amount
+        return self.filled + max(0.0, -self.level)
+
+    def remaining(self, ticket: float, now: float) -> float:
+        """Seconds until `ticket` is covered at the current rate."""
+        self._refill(now)
+        return max(0.0, (ticket - self.filled) / self.rate)
+
+    def adjust(self, amount: float, now: float):
+        """Return (positive) or take (negative) units without waiting."""
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+    def set_rate(self, rate: float, now: float):
+        self._refill(now)
+        self.rate     = rate
+        self.capacity = max(1.0, rate * BURST_SECONDS)
+        self.level    = min(self.level, self.capacity)
+
+
+class _ModelBudget:
+    """Request and token buckets for one model, scaled together by AIMD."""
+
+    def __init__(self, requests_per_second: float, tokens_per_minute: float, now: float):
+        self.ceiling_rps   = requests_per_second
+        self.ceiling_tps   = tokens_per_minute / 60.0
+        self.scale         = 1.0
+        self.requests      = TokenBucket(self.ceiling_rps, now)
+        self.tokens        = TokenBucket(self.ceiling_tps, now)
+        self.last_change   = float("-inf")
+        self.last_throttle = float("-inf")
+        self.last_decrease = float("-inf")
+        self.counters      = {"reservations": 0, "throttles": 0, "backoffs": 0, "waits": 0, "wait_seconds": 0.0}
+
+    def remaining(self, tickets: Tuple[float, float], now: float) -> float:
+        return max(self.requests.remaining(tickets[0], now), self.tokens.remaining(tickets[1], now))
+
+    def rescale(self, scale: float, now: float):
+        self.scale = max(MIN_SCALE, min(1.0, scale))
+        self.requests.set_rate(self.ceiling_rps * self.scale, now)
+        self.tokens.set_rate(self.ceiling_tps * self.scale, now)
+
+
+class AdaptiveRateLimiter:
+    """Thread-safe; usable from worker threads and from an event loop alike."""
+
+    def __init__(self, requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+                 tokens_per_minute: float = DEFAULT_TOKENS_PER_MINUTE,
+                 quotas: Optional[Dict[str, Dict[str, float]]] = None):
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute   = tokens_per_minute
+        self.quotas  = quotas or {}
+        self._lock   = threading.Lock()
+        self._models: Dict[str, _ModelBudget] = {}
+
+    @classmethod
+    def from_env(cls) -> "AdaptiveRateLimiter":
+        quotas = {}
+        raw = os.getenv("BEDROCK_MODEL_QUOTAS", "").strip()
+        if raw:
+            try:
+                quotas = json.loads(raw)
+            except json.JSONDecodeError as e:
+                print(f"[RateLimit] Ignoring BEDROCK_MODEL_QUOTAS: {e}")
+        return cls(float(os.getenv("BEDROCK_CALLS_PER_SECOND", DEFAULT_REQUESTS_PER_SECOND)),
+                   float(os.getenv("BEDROCK_TOKENS_PER_MINUTE", DEFAULT_TOKENS_PER_MINUTE)),
+                   quotas)
+
+    def _budget(self, model_id: str, now: float) -> _ModelBudget:
+        budget = self._models.get(model_id)
+        if budget is None:
+            quota = self.quotas.get(model_id, {})
+            rps   = quota["rpm"] / 60.0 if "rpm" in quota else self.requests_per_second
+            budget = self._models[model_id] = _ModelBudget(rps, quota.get("tpm", self.tokens_per_minute), now)
+        return budget
+
+    # ------------------------------------------------------------------
+    # Pacing
+    # ------------------------------------------------------------------
+
+    def reserve(self, model_id: str, tokens: int = 0) -> float:
+        """Book one request of ~`tokens`; returns the delay at the current rate."""
+        return self._reserve(model_id, tokens)[0]
+
+    def _reserve(self, model_id: str, tokens: int) -> Tuple[float, Tuple[float, float]]:
+        with self._lock:
+            now     = time.monotonic()
+            budget  = self._budget(model_id, now)
+            tickets = (budget.requests.reserve(1, now), budget.tokens.reserve(tokens, now))
+            budget.counters["reservations"] += 1
+            return budget.remaining(tickets, now), tickets
+
+    def _remaining(self, model_id: str, tickets: Tuple[float, float]) -> float:
+        with self._lock:
+            return self._models[model_id].remaining(tickets, time.monotonic())
+
+    def _waited(self, model_id: str, seconds: float):
+        with self._lock:
+            counters = self._models[model_id].counters
+            counters["waits"] += 1
+            counters["wait_seconds"] += seconds
+
+    def wait(self, model_id: str, tokens: int = 0):
+        delay, tickets = self._reserve(model_id, tokens)
+        if delay <= 0:
+            return
+        start = time.monotonic()
+        while delay > 0:
+            time.sleep(min(delay, RECHECK_SECONDS))   # outside the lock
+            delay = self._remaining(model_id, tickets)
+        self._waited(model_id, time.monotonic() - start)
+
+    async def wait_async(self, model_id: str, tokens: int = 0):
+        delay, tickets = self._reserve(model_id, tokens)
+        if delay <= 0:
+            return
+        start = time.monotonic()
+        while delay > 0:
+            await asyncio.sleep(min(delay, RECHECK_SECONDS))
+            delay = self._remaining(model_id, tickets)
+        self._waited(model_id, time.monotonic() - start)
+
+    # ------------------------------------------------------------------
+    # Feedback (AIMD)
+    # ------------------------------------------------------------------
+
+    def record_success(self, model_id: str, estimated_tokens: int = 0, used_tokens: Optional[int] = None):
+        """Additive increase, and settle the token estimate against real usage."""
+        with self._lock:
+            now    = time.monotonic()
+            budget = self._budget(model_id, now)
+            if used_tokens is not None:
+                budget.tokens.adjust(estimated_tokens - used_tokens, now)
+            quiet = now - max(budget.last_change, budget.last_throttle)
+            if budget.scale < 1.0 and quiet >= INCREASE_INTERVAL:
+                budget.last_change = now
+                budget.rescale(budget.scale + INCREASE_STEP, now)
+
+    def record_throttle(self, model_id: str, sent_at: Optional[float] = None):
+        """
+        Multiplicative decrease, once per burst: a throttle on a call sent
+        (time.monotonic()) before the last decrease was paced at the old
+        rate and is not counted again. Without `sent_at`, once per
+        DECREASE_COOLDOWN.
+        """
+        with self._lock:
+            now    = time.monotonic()
+            budget = self._budget(model_id, now)
+            budget.counters["throttles"] += 1
+            budget.last_throttle = now
+            if sent_at is None:
+                sent_at = now - DECREASE_COOLDOWN
+            if sent_at >= budget.last_decrease:
+                budget.last_decrease = budget.last_change = now
+                budget.counters["backoffs"] += 1
+                # Drop any unused burst too: the quota is already spent
+                budget.requests.level = min(budget.requests.level, 0.0)
+                budget.tokens.level   = min(budget.tokens.level, 0.0)
+                budget.rescale(budget.scale * DECREASE_FACTOR, now)
+                print(f"[RateLimit] {model_id} throttled — backing off to "
+                      f"{budget.requests.rate:.2f} req/s ({budget.scale:.0%} of quota)")
+
+    # ------------------------------------------------------------------
+    # Metrics
+    # ------------------------------------------------------------------
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            out = {}
+            for model_id, b in self._models.items():
+                b.requests._refill(now)
+                b.tokens._refill(now)
+                out[model_id] = {
+                    "requests_per_second": round(b.requests.rate, 3),
+                    "tokens_per_minute":   round(b.tokens.rate * 60),
+                    "ceiling_rps":         round(b.ceiling_rps, 3),
+                    "ceiling_tpm":         round(b.ceiling_tps * 60),
+                    "scale":               round(b.scale, 3),
+                    "request_budget":      round(b.requests.level, 2),
+                    "token_budget":        round(b.tokens.level),
+                    **{k: round(v, 3) if isinstance(v, float) else v for k, v in b.counters.items()},
+                }
+            return out
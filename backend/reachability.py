@@ -0,0 +1,181 @@
+"""
+reachability.py - Reachability index for "can A reach B" queries
+
+Built once per job over the SCC condensation of the code graph:
+  - every strongly connected component collapses to one DAG vertex
+    (nodes in the same SCC trivially reach each other)
+  - a topological rank gives an O(1) negative cut (u after v ⇒ no path)
+  - GRAIL-style interval labels from several randomised DFS traversals give
+    O(1) negative answers for the vast majority of unreachable pairs
+  - the first traversal's spanning tree gives O(1) positive answers for
+    tree-ancestor pairs
+Only the remaining ambiguous pairs fall back to a DFS that prunes every
+child whose labels already rule the target out.
+"""
+
+import random
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+import networkx as nx
+
+
+class ReachabilityIndex:
+    """Answers reachability and example-path queries over a directed code graph."""
+
+    def __init__(self, G: nx.DiGraph, num_labels: int = 3, seed: int = 42):
+        self.G = G
+        C = nx.condensation(G)
+        self._comp: Dict[str, int] = C.graph["mapping"]
+        n = C.number_of_nodes()
+        self._succ: List[List[int]] = [list(C.successors(c)) for c in range(n)]
+
+        order = list(nx.topological_sort(C))
+        self._topo = [0] * n
+        for rank, c in enumerate(order):
+            self._topo[c] = rank
+
+        roots = [c for c in order if C.in_degree(c) == 0]
+        rng   = random.Random(seed)
+        self._labels: List[tuple] = []   # [(low, post)] per traversal
+        self._pre:  List[int] = []
+        self._post: List[int] = []
+        for i in range(max(1, num_labels)):
+            low, post, pre = self._label_traversal(roots, rng, shuffle=i > 0)
+            self._labels.append((low, post))
+            if i == 0:
+                self._pre, self._post = pre, post
+
+        print(f"[Reach] Indexed {G.number_of_nodes()} nodes as {n} components "
+              f"({len(self._labels)} interval labels)")
+
+    @classmethod
+    def from_edges(cls, nodes: Iterable[Dict], edges: Iterable[Dict], **kwargs) -> "ReachabilityIndex":
+        """Build an index from node / edge dicts (as produced by build_cpg)."""
+        G = nx.DiGraph()
+        G.add_nodes_from(n["id"] for n in nodes if n.get("id"))
+        G.add_edges_from((e["source"], e["target"]) for e in edges
+                         if e.get("source") in G and e.get("target") in G)
+        return cls(G, **kwargs)
+
+    # ------------------------------------------------------------------
+    # Index construction
+    # ------------------------------------------------------------------
+
+    def _label_traversal(self, roots: List[int], rng: random.Random, shuffle: bool):
+        """One DFS over the condensation DAG producing (low, post, pre) ranks."""
+        n    = len(self._succ)
+        low  = [0] * n
+        post = [-1] * n
+        pre  = [-1] * n
+        counter_pre = counter_post = 0
+
+        starts = roots[:]
+        if shuffle:
+            rng.shuffle(starts)
+        for root in starts:
+            if pre[root] != -1:
+                continue
+            pre[root] = counter_pre
+            counter_pre += 1
+            children = self._succ[root][:]
+            if shuffle:
+                rng.shuffle(children)
+            stack = [(root, iter(children))]
+            while stack:
+                c, it = stack[-1]
+                for child in it:
+                    if pre[child] == -1:
+                        pre[child] = counter_pre
+                        counter_pre += 1
+                        grandchildren = self._succ[child][:]
+                        if shuffle:
+                            rng.shuffle(grandchildren)
+                        stack.append((child, iter(grandchildren)))
+                        break
+                else:
+                    stack.pop()
+                    post[c] = counter_post
+                    counter_post += 1
+                    low[c] = min([post[c]] + [low[s] for s in self._succ[c]])
+        return low, post, pre
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _may_reach(self, cu: int, cv: int) -> bool:
+        """False only when the labels prove cu cannot reach cv."""
+        if self._topo[cu] > self._topo[cv]:
+            return False
+        for low, post in self._labels:
+            if not (low[cu] <= low[cv] and post[cv] <= post[cu]):
+                return False
+        return True
+
+    def _comp_reaches(self, cu: int, cv: int) -> bool:
+        if cu == cv:
+            return True
+        if not self._may_reach(cu, cv):
+            return False
+        # Spanning-tree ancestor in the first traversal ⇒ definitely reachable
+        if self._pre[cu] <= self._pre[cv] and self._post[cv] <= self._post[cu]:
+            return True
+        seen  = {cu}
+        stack = [cu]
+        while stack:
+            c = stack.pop()
+            for s in self._succ[c]:
+                if s == cv:
+                    return True
+                if s not in seen and self._may_reach(s, cv):
+                    seen.add(s)
+                    stack.append(s)
+        return False
+
+    def reaches(self, source: str, target: str) -> bool:
+        """True if a directed path source → target exists."""
+        if source not in self._comp or target not in self._comp:
+            return False
+        return self._comp_reaches(self._comp[source], self._comp[target])
+
+    def reachable_from_any(self, sources: Iterable[str], target: str) -> List[str]:
+        """Subset of `sources` that can reach `target`."""
+        return [s for s in sources if self.reaches(s, target)]
+
+    def path(self, source: str, target: str, max_len: Optional[int] = None) -> Optional[List[str]]:
+        """
+        Shortest example path source → target, or None.
+
+        BFS over the original graph that only expands neighbours the index
+        says can still reach the target, so it never wanders into dead ends.
+        """
+        if not self.reaches(source, target):
+            return None
+        if source == target:
+            return [source]
+        ct     = self._comp[target]
+        parent = {source: None}
+        queue  = deque([(source, 0)])
+        while queue:
+            u, depth = queue.popleft()
+            if max_len is not None and depth >= max_len:
+                continue
+            for w in self.G.successors(u):
+                if w in parent or not self._comp_reaches(self._comp[w], ct):
+                    continue
+                parent[w] = u
+                if w == target:
+                    out = [w]
+                    while parent[out[-1]] is not None:
+                        out.append(parent[out[-1]])
+                    return out[::-1]
+                queue.append((w, depth + 1))
+        return None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "nodes":      self.G.number_of_nodes(),
+            "components": len(self._succ),
+            "labels":     len(self._labels),
+        }
@@ -3,12 +3,250 @@ risk_ast.py - Risk AST Builder for Security Analysis
 Generates per-function abstract Risk AST profiles derived from the graph + features.
 """
 
-from typing import List, Dict
+from typing import List, Dict, Optional, Set
 
+import networkx as nx
 
-def build_risk_ast(nodes: List[Dict], edges: List[Dict]) -> Dict[str, Dict]:
+from reachability import ReachabilityIndex
+from risk_rules import finding_labels
+
+
+# ---------------------------------------------------------------------------
+# CALL CLASSIFICATION — sources and sinks per call site
+# ---------------------------------------------------------------------------
+# Files with a rule pack get call sites tagged at parse time ("sink" /
+# "source" from a confident risk_rules finding; see attach_findings), and
+# those tags are authoritative. The tables below only classify calls from
+# files no rule pack scanned. Dotted patterns match the full call name or
+# its trailing segments (`self.cursor.execute` matches "cursor.execute");
+# bare patterns match only the whole name, so `pattern.exec` or
+# `webbrowser.open` never read as the builtin.
+_SOURCE_CALLS = {
+    'env':        ('os.getenv', 'getenv', 'os.environ.get', 'process.env', 'os.Getenv'),
+    'file':       ('open', 'fs.readFile', 'fs.readFileSync', 'os.ReadFile'),
+    'user_input': ('input', 'request.args.get', 'request.form.get', 'request.get_json',
+                   'request.json', 'req.body', 'req.query', 'req.params'),
+}
+_SINK_CALLS = {
+    'eval':        ('eval', 'exec', 'execfile'),
+    'shell':       ('os.system', 'os.popen', 'subprocess.run', 'subprocess.call',
+                    'subprocess.Popen', 'subprocess.check_output', 'subprocess.check_call',
+                    'child_process.exec', 'child_process.execSync', 'child_process.spawn',
+                    'exec.Command'),
+    'sql':         ('cursor.execute', 'cursor.executemany', 'cursor.executescript'),
+    'deserialize': ('pickle.loads', 'pickle.load', 'yaml.load', 'marshal.loads'),
+}
+
+
+def _match_call(call_name: str, table: Dict[str, tuple]) -> Optional[str]:
+    """Label of the longest pattern matching `call_name`, or None."""
+    best, best_len = None, 0
+    for label, patterns in table.items():
+        for pattern in patterns:
+            matches = call_name == pattern or ('.' in pattern and call_name.endswith('.' + pattern))
+            if matches and len(pattern) > best_len:
+                best, best_len = label, len(pattern)
+    return best
+
+
+def classify_call(call_name: str) -> tuple:
+    """(kind, label) for a call name from an unscanned file — kind is 'sink', 'source' or None."""
+    sink = _match_call(call_name, _SINK_CALLS)
+    if sink:
+        return 'sink', sink
+    source = _match_call(call_name, _SOURCE_CALLS)
+    if source:
+        return 'source', source
+    return None, None
+
+
+def classify_call_site(call: Dict, scanned: bool) -> tuple:
+    """
+    (kind, label) for one call of a function. `scanned` functions come from
+    a file a rule pack ran over, so only their parse-time tags count.
+    """
+    if call.get('sink'):
+        return 'sink', call['sink']
+    if call.get('source'):
+        return 'source', call['source']
+    if scanned:
+        return None, None
+    return classify_call(call.get('name', ''))
+
+
+def _own_sources(node: Dict) -> Set[str]:
+    sources = set()
+    if node.get('has_env_access'):
+        sources.add('env')
+    if node.get('has_file_access'):
+        sources.add('file')
+    # HTTP handlers receive request data through their parameters
+    if node.get('is_entry_point') and node.get('entry_type') == 'http':
+        sources.add('user_input')
+    sources.update(finding_labels(node.get('risk_findings', []), 'source'))
+    return sources
+
+
+def _own_sinks(node: Dict) -> Set[str]:
+    sinks = set()
+    if node.get('has_eval'):
+        sinks.add('eval')
+    if node.get('has_shell_call'):
+        sinks.add('shell')
+    sinks.update(finding_labels(node.get('risk_findings', []), 'sink'))
+    return sinks
+
+
+# ---------------------------------------------------------------------------
+# INTERPROCEDURAL TAINT SUMMARIES
+# ---------------------------------------------------------------------------
+
+def compute_taint_summaries(nodes: List[Dict], edges: List[Dict]) -> Dict[str, Dict]:
+    """
+    Per-function taint summaries solved over the call graph.
+
+    Bottom-up (callees before callers) on the SCC condensation:
+      sinks_reachable   — sink labels reachable through transitive calls
+      param_sinks       — parameter index -> sink labels it can flow into
+      returned_sources  — source labels a function hands back to its caller
+    Top-down (callers before callees):
+      inbound_sources   — source labels passed in by (transitive) callers
+    Each SCC is iterated to a local fixpoint, so the whole solve is
+    near-linear in the size of the call graph.
+
+    A function has a feasible source-to-sink path if source data it holds
+    can reach a sink below it, or data passed in by a caller reaches a sink
+    through one of its parameters.
+    """
+    funcs = {n['id']: n for n in nodes if n.get('type') == 'function' and n.get('id')}
+
+    call_targets: Dict[str, List[str]] = {}
+    for e in edges:
+        if e.get('type') == 'calls' and e['source'] in funcs and e['target'] in funcs:
+            call_targets.setdefault(e['source'], []).append(e['target'])
+
+    # ── Local facts ───────────────────────────────────────────────────
+    own_sources, own_sinks, direct_param_sinks = {}, {}, {}
+    call_sites: Dict[str, List[tuple]] = {}     # fid -> [(callee_id, args)]
+    assigned:   Dict[str, Set[str]] = {}        # fid -> callee ids whose result is kept
+    for fid, node in funcs.items():
+        params  = node.get('parameters', [])
+        scanned = 'risk_findings' in node
+        sources = _own_sources(node)
+        sinks   = _own_sinks(node)
+        psinks: Dict[int, Set[str]] = {}
+        returned_calls = {df.get('src') for df in node.get('data_flows', [])
+                          if df.get('type') == 'returns_to'}
+        by_name = {}
+        for t in call_targets.get(fid, []):
+            by_name.setdefault(funcs[t].get('name'), t)
+
+        sites, kept = [], set()
+        for call in node.get('calls', []):
+            if isinstance(call, str):
+                call = {'name': call}
+            name = call.get('name', '')
+            args = call.get('args', [])
+            kind, label = classify_call_site(call, scanned)
+            if kind == 'source':
+                sources.add(label)
+            elif kind == 'sink':
+                sinks.add(label)
+                for ids in args:
+                    for i, p in enumerate(params):
+                        if p in ids:
+                            psinks.setdefault(i, set()).add(label)
+            callee = by_name.get(name.split('.')[-1])
+            if callee:
+                sites.append((callee, args))
+                if name in returned_calls:
+                    kept.add(callee)
+
+        own_sources[fid], own_sinks[fid], direct_param_sinks[fid] = sources, sinks, psinks
+        call_sites[fid], assigned[fid] = sites, kept
+
+    # ── Condensation of the call graph ────────────────────────────────
+    CG = nx.DiGraph()
+    CG.add_nodes_from(funcs)
+    CG.add_edges_from((f, g) for f, sites in call_sites.items() for g, _ in sites)
+    C     = nx.condensation(CG)
+    order = list(nx.topological_sort(C))
+    members = nx.get_node_attributes(C, 'members')
+
+    sinks_reach = {f: set(own_sinks[f]) for f in funcs}
+    param_sinks = {f: {i: set(v) for i, v in direct_param_sinks[f].items()} for f in funcs}
+    returned    = {f: set(own_sources[f]) for f in funcs}
+    inbound     = {f: set() for f in funcs}
+
+    def _self_offset(callee: str) -> int:
+        params = funcs[callee].get('parameters', [])
+        return 1 if params and params[0] in ('self', 'cls') else 0
+
+    def _bottom_up(f: str) -> bool:
+        before = (len(sinks_reach[f]), sum(len(v) for v in param_sinks[f].values()), len(returned[f]))
+        params = funcs[f].get('parameters', [])
+        for g, args in call_sites[f]:
+            sinks_reach[f] |= sinks_reach[g]
+            if g in assigned[f]:
+                returned[f] |= returned[g]
+            offset = _self_offset(g)
+            for j, ids in enumerate(args):
+                labels = param_sinks[g].get(j + offset)
+                if not labels:
+                    continue
+                for i, p in enumerate(params):
+                    if p in ids:
+                        param_sinks[f].setdefault(i, set()).update(labels)
+        after = (len(sinks_reach[f]), sum(len(v) for v in param_sinks[f].values()), len(returned[f]))
+        return after != before
+
+    def _local_sources(f: str) -> Set[str]:
+        out = set(own_sources[f])
+        for g in assigned[f]:
+            out |= returned[g]
+        return out
+
+    def _top_down(g: str) -> bool:
+        before = len(inbound[g])
+        for f in CG.predecessors(g):
+            if any(args for callee, args in call_sites[f] if callee == g):
+                inbound[g] |= _local_sources(f) | inbound[f]
+        return len(inbound[g]) != before
+
+    for c in reversed(order):
+        group   = members[c]
+        changed = True
+        while changed:
+            changed = any([_bottom_up(f) for f in group])
+
+    for c in order:
+        group   = members[c]
+        changed = True
+        while changed:
+            changed = any([_top_down(f) for f in group])
+
+    summaries = {}
+    for fid, node in funcs.items():
+        params  = node.get('parameters', [])
+        local   = _local_sources(fid)
+        psinks  = {params[i]: sorted(v) for i, v in param_sinks[fid].items() if i < len(params)}
+        summaries[fid] = {
+            "sources_in":      sorted(local | inbound[fid]),
+            "sinks_reachable": sorted(sinks_reach[fid]),
+            "param_sinks":     psinks,
+            "feasible_path":   bool((local and sinks_reach[fid]) or (inbound[fid] and psinks)),
+        }
+    return summaries
+
+
+def build_risk_ast(nodes: List[Dict], edges: List[Dict],
+                   reach_index: Optional[ReachabilityIndex] = None) -> Dict[str, Dict]:
     """Generate per-function abstract Risk AST profiles derived from the graph + features."""
     risk_profiles = {}
+    if reach_index is None:
+        reach_index = ReachabilityIndex.from_edges(nodes, edges)
+    entry_ids = [n['id'] for n in nodes if n.get('is_entry_point')]
+    taint = compute_taint_summaries(nodes, edges)
     
     # Pre-compute edge lookups
     node_out_edges = {}
@@ -26,11 +264,10 @@ def build_risk_ast(nodes: List[Dict], edges: List[Dict]) -> Dict[str, Dict]:
             
         nid = node['id']
         
-        # Sources / Sinks (from features)
-        sources = ['env'] if node.get('has_env_access') else []
-        sources += ['file'] if node.get('has_file_access') else []
-        sinks = ['eval'] if node.get('has_eval') else []
-        sinks += ['shell'] if node.get('has_shell_call') else []
+        # Sources / Sinks (from features + parse-time rule findings)
+        sources = sorted(_own_sources(node) - {'user_input'} |
+                         set(finding_labels(node.get('risk_findings', []), 'source')))
+        sinks = sorted(_own_sinks(node))
         
         # External interactions (APIs)
         external = [n for n in node.get('api_calls', [])]
@@ -38,6 +275,9 @@ def build_risk_ast(nodes: List[Dict], edges: List[Dict]) -> Dict[str, Dict]:
         # Call neighbors
         call_neighbors = [e['target'] for e in node_out_edges.get(nid, []) if e['type'] == 'calls']
         
+        # Entry points that can reach this function (index lookup, no traversal)
+        reaching_entries = reach_index.reachable_from_any(entry_ids, nid)
+
         # Control flags
         control_flags = {
             'has_conditional': node.get('has_conditional', False),
@@ -57,10 +297,12 @@ def build_risk_ast(nodes: List[Dict], edges: List[Dict]) -> Dict[str, Dict]:
                 "sources": sources,
                 "sinks": sinks,
                 "entry": node.get('is_entry_point', False),
+                "reachable_from_entries": reaching_entries[:5],
                 "external_interactions": external,
                 "control_flags": control_flags,
                 "data_flow_neighbors": data_flow_neighbors,
-                "call_neighbors": call_neighbors
+                "call_neighbors": call_neighbors,
+                "taint": taint.get(nid, {})
             }
         }
     
@@ -0,0 +1,334 @@
+"""
+risk_rules.py - Declarative security rule packs evaluated at parse time
+
+Each language has a rule pack of sources, sinks, sanitizers and dangerous
+argument patterns. Rules are Tree-sitter queries whose outer capture is
+`@match`; the pack is compiled once per language into a single Query and
+run over the tree produced by the parse pass, so precise findings cost one
+extra tree scan instead of a Sentinel call.
+
+Finding:
+    {"rule": "py.subprocess-shell", "kind": "sink", "category": "shell",
+     "confidence": 0.95, "line": 12, "start_byte": 340, "end_byte": 377}
+"""
+
+from typing import Dict, List, Set
+
+# ---------------------------------------------------------------------------
+# RULE PACKS
+# ---------------------------------------------------------------------------
+# Keep one pattern per rule and never put predicates inside `[...]`
+# alternations — the tree-sitter 0.21 bindings corrupt memory on those.
+# kind:       source | sink | sanitizer
+# category:   env | file | user_input | eval | shell | sql | deserialize
+#             (secret_scanner adds "secret" sources from string literals)
+#             (sanitizers name the sink category they neutralise)
+# confidence: how sure a match is a real instance of the category
+# bound_to:   optional (module, "module" | "member"); the rule's @callee must be
+#             bound to that module in the file — the module object itself (or
+#             one of its conventional aliases), or one of its members
+
+_PY_RULES = [
+    # ── Sinks ──
+    {"id": "py.eval", "kind": "sink", "category": "eval", "confidence": 0.95,
+     "query": '((call function: (identifier) @fn) @match (#match? @fn "^(eval|exec)$"))'},
+    {"id": "py.subprocess-shell", "kind": "sink", "category": "shell", "confidence": 0.95,
+     "query": '((call function: (attribute object: (identifier) @mod) '
+              'arguments: (argument_list (keyword_argument name: (identifier) @kw value: (true)))) @match '
+              '(#eq? @mod "subprocess") (#eq? @kw "shell"))'},
+    {"id": "py.subprocess", "kind": "sink", "category": "shell", "confidence": 0.7,
+     "query": '((call function: (attribute object: (identifier) @mod attribute: (identifier) @fn)) @match '
+              '(#eq? @mod "subprocess") (#match? @fn "^(run|call|Popen|check_output|check_call)$"))'},
+    {"id": "py.asyncio-subprocess", "kind": "sink", "category": "shell", "confidence": 0.9,
+     "query": '((call function: (attribute object: (identifier) @mod attribute: (identifier) @fn)) @match '
+              '(#eq? @mod "asyncio") (#match? @fn "^create_subprocess_(shell|exec)$"))'},
+    {"id": "py.os-system", "kind": "sink", "category": "shell", "confidence": 0.9,
+     "query": '((call function: (attribute object: (identifier) @mod attribute: (identifier) @fn)) @match '
+              '(#eq? @mod "os") (#match? @fn "^(system|popen|execv|execvp|execl)$"))'},
+    {"id": "py.sql-formatted", "kind": "sink", "category": "sql", "confidence": 0.9,
+     "query": '((call function: (attribute attribute: (identifier) @fn) '
+              'arguments: (argument_list . [(string (interpolation)) (binary_operator)])) @match '
+              '(#match? @fn "^(execute|executemany|executescript|raw)$"))'},
+    {"id": "py.sql-format-call", "kind": "sink", "category": "sql", "confidence": 0.9,
+     "query": '((call function: (attribute attribute: (identifier) @fn) '
+              'arguments: (argument_list . (call function: (attribute attribute: (identifier) @fmt)))) @match '
+              '(#match? @fn "^(execute|executemany|executescript|raw)$") (#eq? @fmt "format"))'},
+    {"id": "py.sql-execute", "kind": "sink", "category": "sql", "confidence": 0.4,
+     "query": '((call function: (attribute attribute: (identifier) @fn)) @match '
+              '(#match? @fn "^(execute|executemany|executescript)$"))'},
+    {"id": "py.deserialize", "kind": "sink", "category": "deserialize", "confidence": 0.85,
+     "query": '((call function: (attribute object: (identifier) @mod attribute: (identifier) @fn)) @match '
+              '(#match? @mod "^(pickle|cPickle|marshal|dill)$") (#match? @fn "^loads?$"))'},
+    {"id": "py.yaml-load", "kind": "sink", "category": "deserialize", "confidence": 0.7,
+     "query": '((call function: (attribute object: (identifier) @mod attribute: (identifier) @fn)) @match '
+              '(#eq? @mod "yaml") (#eq? @fn "load"))'},
+    # ── Sources ──
+    {"id": "py.getenv", "kind": "source", "category": "env", "confidence": 0.9,
+     "query": '((call function: (attribute object: (identifier) @mod attribute: (identifier) @fn)) @match '
+              '(#eq? @mod "os") (#eq? @fn "getenv"))'},
+    {"id": "py.environ", "kind": "source", "category": "env", "confidence": 0.9,
+     "query": '((attribute object: (identifier) @mod attribute: (identifier) @fn) @match '
+              '(#eq? @mod "os") (#eq? @fn "environ"))'},
+    {"id": "py.open", "kind": "source", "category": "file", "confidence": 0.8,
+     "query": '((call function: (identifier) @fn) @match (#eq? @fn "open"))'},
+    {"id": "py.path-read", "kind": "source", "category": "file", "confidence": 0.7,
+     "query": '((call function: (attribute attribute: (identifier) @fn)) @match '
+              '(#match? @fn "^(read_text|read_bytes)$"))'},
+    {"id": "py.request", "kind": "source", "category": "user_input", "confidence": 0.85,
+     "query": '((attribute object: (identifier) @obj attribute: (identifier) @attr) @match '
+              '(#eq? @obj "request") (#match? @attr "^(args|form|json|values|files|cookies|headers|data|get_json)$"))'},
+    {"id": "py.input", "kind": "source", "category": "user_input", "confidence": 0.8,
+     "query": '((call function: (identifier) @fn) @match (#eq? @fn "input"))'},
+    # ── Sanitizers ──
+    {"id": "py.shlex-quote", "kind": "sanitizer", "category": "shell", "confidence": 0.9,
+     "query": '((call function: (attribute object: (identifier) @mod attribute: (identifier) @fn)) @match '
+              '(#eq? @mod "shlex") (#eq? @fn "quote"))'},
+    {"id": "py.safe-load", "kind": "sanitizer", "category": "deserialize", "confidence": 0.9,
+     "query": '((call function: (attribute attribute: (identifier) @fn)) @match (#eq? @fn "safe_load"))'},
+]
+
+_JS_RULES = [
+    {"id": "js.eval", "kind": "sink", "category": "eval", "confidence": 0.95,
+     "query": '((call_expression function: (identifier) @fn) @match (#eq? @fn "eval"))'},
+    {"id": "js.new-function", "kind": "sink", "category": "eval", "confidence": 0.9,
+     "query": '((new_expression constructor: (identifier) @ctor) @match (#eq? @ctor "Function"))'},
+    {"id": "js.child-process", "kind": "sink", "category": "shell", "confidence": 0.9,
+     "bound_to": ("child_process", "module"),
+     "query": '((call_expression function: (member_expression object: (identifier) @callee '
+              'property: (property_identifier) @fn)) @match '
+              '(#match? @fn "^(exec|execSync|spawn|spawnSync|execFile)$"))'},
+    {"id": "js.child-process-require", "kind": "sink", "category": "shell", "confidence": 0.9,
+     "query": '((call_expression function: (member_expression object: (call_expression function: (identifier) @req '
+              'arguments: (arguments . (string) @mod)) property: (property_identifier) @fn)) @match '
+              '(#eq? @req "require") (#match? @mod "^.(node:)?child_process.$") '
+              '(#match? @fn "^(exec|execSync|spawn|spawnSync|execFile)$"))'},
+    {"id": "js.child-process-import", "kind": "sink", "category": "shell", "confidence": 0.8,
+     "bound_to": ("child_process", "member"),
+     "query": '((call_expression function: (identifier) @callee) @match)'},
+    {"id": "js.sql-template", "kind": "sink", "category": "sql", "confidence": 0.85,
+     "query": '((call_expression function: (member_expression property: (property_identifier) @fn) '
+              'arguments: (arguments . [(template_string (template_substitution)) (binary_expression)])) @match '
+              '(#match? @fn "^(query|execute|raw)$"))'},
+    {"id": "js.process-env", "kind": "source", "category": "env", "confidence": 0.9,
+     "query": '((member_expression object: (identifier) @obj property: (property_identifier) @prop) @match '
+              '(#eq? @obj "process") (#eq? @prop "env"))'},
+    {"id": "js.fs-read", "kind": "source", "category": "file", "confidence": 0.8,
+     "query": '((call_expression function: (member_expression object: (identifier) @obj '
+              'property: (property_identifier) @fn)) @match '
+              '(#match? @obj "^(fs|fsp|fsPromises)$") (#match? @fn "^(readFile|readFileSync|createReadStream)$"))'},
+    {"id": "js.request", "kind": "source", "category": "user_input", "confidence": 0.85,
+     "query": '((member_expression object: (identifier) @obj property: (property_identifier) @prop) @match '
+              '(#match? @obj "^(req|request|ctx)$") (#match? @prop "^(body|query|params|headers|cookies)$"))'},
+]
+
+_JAVA_RULES = [
+    {"id": "java.runtime-exec", "kind": "sink", "category": "shell", "confidence": 0.9,
+     "query": '((method_invocation object: (method_invocation name: (identifier) @rt) name: (identifier) @fn) @match '
+              '(#eq? @fn "exec") (#eq? @rt "getRuntime"))'},
+    {"id": "java.process-builder", "kind": "sink", "category": "shell", "confidence": 0.85,
+     "query": '((object_creation_expression type: (type_identifier) @t) @match (#eq? @t "ProcessBuilder"))'},
+    {"id": "java.sql-concat", "kind": "sink", "category": "sql", "confidence": 0.85,
+     "query": '((method_invocation name: (identifier) @fn arguments: (argument_list . (binary_expression))) @match '
+              '(#match? @fn "^(executeQuery|executeUpdate|execute|prepareStatement)$"))'},
+    {"id": "java.deserialize", "kind": "sink", "category": "deserialize", "confidence": 0.8,
+     "query": '((method_invocation name: (identifier) @fn) @match (#eq? @fn "readObject"))'},
+    {"id": "java.getenv", "kind": "source", "category": "env", "confidence": 0.9,
+     "query": '((method_invocation object: (identifier) @obj name: (identifier) @fn) @match '
+              '(#eq? @obj "System") (#match? @fn "^(getenv|getProperty)$"))'},
+    {"id": "java.request", "kind": "source", "category": "user_input", "confidence": 0.8,
+     "query": '((method_invocation name: (identifier) @fn) @match '
+              '(#match? @fn "^(getParameter|getHeader|getInputStream|getQueryString)$"))'},
+]
+
+_GO_RULES = [
+    {"id": "go.exec-command", "kind": "sink", "category": "shell", "confidence": 0.9,
+     "query": '((call_expression function: (selector_expression operand: (identifier) @pkg field: (field_identifier) @fn)) @match '
+              '(#eq? @pkg "exec") (#match? @fn "^(Command|CommandContext)$"))'},
+    {"id": "go.sql-formatted", "kind": "sink", "category": "sql", "confidence": 0.85,
+     "query": '((call_expression function: (selector_expression field: (field_identifier) @fn) '
+              'arguments: (argument_list . (call_expression function: (selector_expression field: (field_identifier) @fmt)))) @match '
+              '(#match? @fn "^(Query|QueryRow|Exec|QueryContext|ExecContext)$") (#match? @fmt "^(Sprintf|Sprint|Sprintln)$"))'},
+    {"id": "go.sql-concat", "kind": "sink", "category": "sql", "confidence": 0.85,
+     "query": '((call_expression function: (selector_expression field: (field_identifier) @fn) '
+              'arguments: (argument_list . (binary_expression))) @match '
+              '(#match? @fn "^(Query|QueryRow|Exec|QueryContext|ExecContext)$"))'},
+    {"id": "go.getenv", "kind": "source", "category": "env", "confidence": 0.9,
+     "query": '((call_expression function: (selector_expression operand: (identifier) @pkg field: (field_identifier) @fn)) @match '
+              '(#eq? @pkg "os") (#match? @fn "^(Getenv|LookupEnv|Environ)$"))'},
+    {"id": "go.file-read", "kind": "source", "category": "file", "confidence": 0.8,
+     "query": '((call_expression function: (selector_expression operand: (identifier) @pkg field: (field_identifier) @fn)) @match '
+              '(#match? @pkg "^(os|ioutil)$") (#match? @fn "^(ReadFile|Open|OpenFile)$"))'},
+    {"id": "go.request", "kind": "source", "category": "user_input", "confidence": 0.8,
+     "query": '((call_expression function: (selector_expression field: (field_identifier) @fn)) @match '
+              '(#match? @fn "^(FormValue|PostFormValue|ParseForm)$"))'},
+]
+
+RULE_PACKS: Dict[str, List[Dict]] = {
+    "python":     _PY_RULES,
+    "javascript": _JS_RULES,
+    "typescript": _JS_RULES,
+    "java":       _JAVA_RULES,
+    "go":         _GO_RULES,
+}
+
+# Module bindings: (declarator | import) patterns capturing @names and the
+# module string @mod. A plain identifier under @names binds the module object;
+# identifiers inside destructuring / named imports bind its members.
+_JS_BINDINGS = [
+    '((variable_declarator name: (_) @names value: (call_expression function: (identifier) @req '
+    'arguments: (arguments . (string) @mod))) (#eq? @req "require"))',
+    '(import_statement (import_clause) @names source: (string) @mod)',
+]
+
+BINDING_PACKS: Dict[str, List[str]] = {
+    "javascript": _JS_BINDINGS,
+    "typescript": _JS_BINDINGS,
+}
+
+MODULE_ALIASES: Dict[str, Set[str]] = {
+    "child_process": {"child_process", "cp"},
+}
+
+# Findings below this confidence are kept for context but do not set flags
+FLAG_CONFIDENCE = 0.5
+
+# ---------------------------------------------------------------------------
+# COMPILATION
+# ---------------------------------------------------------------------------
+
+_compiled: Dict[str, tuple] = {}   # language -> (Query | None, [rule, ...], bindings Query | None)
+
+
+def _compile(language_name: str, ts_language) -> tuple:
+    """Compile a language's rule pack into one Query (cached per language)."""
+    if language_name in _compiled:
+        return _compiled[language_name]
+
+    rules, patterns = [], []
+    for rule in RULE_PACKS.get(language_name, []):
+        pattern = rule["query"].replace("@match", f"@rule_{len(rules)}")
+        try:
+            ts_language.query(pattern)   # validate individually so one bad rule can't sink the pack
+        except Exception as e:
+            print(f"[Rules] Skipping {rule['id']} for {language_name}: {e}")
+            continue
+        rules.append(rule)
+        patterns.append(pattern)
+
+    query    = ts_language.query("\n".join(patterns)) if patterns else None
+    bindings = BINDING_PACKS.get(language_name)
+    bindings = ts_language.query("\n".join(bindings)) if bindings and query else None
+    _compiled[language_name] = (query, rules, bindings)
+    return _compiled[language_name]
+
+
+def _module_name(string_node) -> str:
+    return string_node.text.decode("utf-8", "replace")[1:-1].split(":", 1)[-1]
+
+
+_MEMBER_BINDERS = ("object_pattern", "named_imports")
+
+
+def _bound_names(root, bindings) -> Dict[tuple, Set[str]]:
+    """(module, "module" | "member") -> local names a file binds (require declarators and imports)."""
+    bound: Dict[tuple, Set[str]] = {}
+    if bindings is None:
+        return bound
+    for _, captures in bindings.matches(root):
+        if "mod" not in captures:
+            continue
+        module = _module_name(captures["mod"])
+        stack  = [(captures["names"], "module")]
+        while stack:
+            node, kind = stack.pop()
+            if node.type == "import_specifier" and node.child_by_field_name("alias") is not None:
+                node = node.child_by_field_name("alias")   # `{ exec as run }` binds only `run`
+            if node.type == "pair_pattern":
+                node = node.child_by_field_name("value")   # `{ spawn: sp }` binds only `sp`
+            if node.type in ("identifier", "shorthand_property_identifier_pattern"):
+                bound.setdefault((module, kind), set()).add(node.text.decode("utf-8", "replace"))
+            else:
+                kind = "member" if node.type in _MEMBER_BINDERS else kind
+                stack.extend((child, kind) for child in node.children)
+    return bound
+
+
+def has_rule_pack(language_name: str) -> bool:
+    return bool(RULE_PACKS.get(language_name))
+
+# ---------------------------------------------------------------------------
+# EVALUATION
+# ---------------------------------------------------------------------------
+
+def scan_tree(root, language_name: str, ts_language) -> List[Dict]:
+    """
+    Run the language's rule pack over a parsed tree.
+
+    Rules with `bound_to` only match when their callee names that module
+    (see _bound_names). Overlapping matches of the same category on the same
+    node keep only the most confident rule. Sinks that contain a matching sanitizer are kept but
+    marked `sanitized` with their confidence halved.
+    """
+    query, rules, bindings = _compile(language_name, ts_language)
+    if query is None:
+        return []
+
+    bound: Dict[str, Set[str]] = {}
+    if any("bound_to" in rule for rule in rules):
+        bound = _bound_names(root, bindings)
+
+    best: Dict[tuple, Dict] = {}
+    for index, captures in query.matches(root):
+        node = captures.get(f"rule_{index}")
+        if node is None:
+            continue   # the 0.21 bindings report matches whose predicates failed with no captures
+        rule = rules[index]
+        if "bound_to" in rule:
+            module, kind = rule["bound_to"]
+            callee = captures["callee"].text.decode("utf-8", "replace")
+            aliases = MODULE_ALIASES.get(module, {module}) if kind == "module" else ()
+            if callee not in aliases and callee not in bound.get(rule["bound_to"], ()):
+                continue
+        key  = (node.start_byte, node.end_byte, rule["kind"], rule["category"])
+        if key in best and best[key]["confidence"] >= rule["confidence"]:
+            continue
+        best[key] = {
+            "rule":       rule["id"],
+            "kind":       rule["kind"],
+            "category":   rule["category"],
+            "confidence": rule["confidence"],
+            "line":       node.start_point[0] + 1,
+            "start_byte": node.start_byte,
+            "end_byte":   node.end_byte,
+        }
+
+    findings    = sorted(best.values(), key=lambda f: (f["start_byte"], f["rule"]))
+    sanitizers  = [f for f in findings if f["kind"] == "sanitizer"]
+    for f in findings:
+        if f["kind"] != "sink":
+            continue
+        if any(s["category"] == f["category"] and f["start_byte"] <= s["start_byte"] and s["end_byte"] <= f["end_byte"]
+               for s in sanitizers):
+            f["sanitized"]  = True
+            f["confidence"] = round(f["confidence"] * 0.5, 2)
+    return findings
+
+
+def flags_from_findings(findings: List[Dict]) -> Dict[str, bool]:
+    """Security flags implied by a function's findings (replaces substring checks)."""
+    def _any(kind, category):
+        return any(f["kind"] == kind and f["category"] == category and f["confidence"] >= FLAG_CONFIDENCE
+                   for f in findings)
+    return {
+        "has_eval":        _any("sink", "eval"),
+        "has_shell_call":  _any("sink", "shell"),
+        "has_file_access": _any("source", "file"),
+        "has_env_access":  _any("source", "env"),
+        "has_hardcoded_secret": _any("source", "secret"),
+    }
+
+
+def finding_labels(findings: List[Dict], kind: str) -> List[str]:
+    """Distinct categories of confident, unsanitised findings of one kind."""
+    return sorted({f["category"] for f in findings
+                   if f["kind"] == kind and f["confidence"] >= FLAG_CONFIDENCE and not f.get("sanitized")})
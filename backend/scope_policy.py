@@ -0,0 +1,248 @@
+"""
+scope_policy.py - Analysis-scope policies applied before the orchestrator
+
+Decides, per node, how much LLM effort it deserves:
+  analyse       — full Mapper → Linker → Sentinel treatment
+  deprioritise  — Mapper + Linker only, tier capped at 1 (no Sentinel)
+  skip          — no LLM call; static defaults are recorded instead
+  collapsed     — member of a dead module; no LLM call of its own
+
+Policies (configurable through the environment, see load_scope_policy):
+  unreachable   — functions with no path from any entry point
+  tests         — test / fixture code, by path pattern or framework marker
+  dead_modules  — modules nobody imports, without entry points, whose
+                  functions are all unreachable
+
+Every node gets an `analysis_scope` record ({"decision", "reason"}), and
+the returned report estimates the LLM calls the policies save. Batches are
+counted at the node caps of batch_packer.py; token packing can only split
+them further, so the call counts are lower bounds.
+"""
+
+import math
+import os
+import re
+from typing import Dict, List, Optional
+
+from batch_packer import MAPPER_BATCH_SIZE, LINKER_BATCH_SIZE
+
+DECISIONS = ("analyse", "deprioritise", "skip", "collapsed")
+
+# Shared API nodes are deduplicated across files, so they are never scoped out
+SCOPED_TYPES = ("module", "class", "function")
+
+DEFAULT_POLICY = {
+    "unreachable":  "deprioritise",   # analyse | deprioritise | skip
+    "tests":        "skip",           # analyse | deprioritise | skip
+    "dead_modules": "collapse",       # analyse | collapse
+}
+POLICY_CHOICES = {
+    "unreachable":  ("analyse", "deprioritise", "skip"),
+    "tests":        ("analyse", "deprioritise", "skip"),
+    "dead_modules": ("analyse", "collapse"),
+}
+
+# ---------------------------------------------------------------------------
+# TEST / FIXTURE DETECTION
+# ---------------------------------------------------------------------------
+
+_TEST_DIR_RE = re.compile(
+    r"(^|/)(tests?|__tests__|__mocks__|spec|specs|fixtures?|testdata|test_data|mocks?)/", re.I
+)
+_TEST_FILE_RE = re.compile(
+    r"(^|/)(test_[^/]*\.py|[^/]*_test\.(py|go)|conftest\.py|[^/]*\.(test|spec)\.[jt]sx?|[^/]*Tests?\.java)$"
+)
+# Imported modules that mark a file as test code (the name itself or a submodule of it)
+_TEST_FRAMEWORKS = ("pytest", "unittest", "org.junit", "org.testng", "org.mockito",
+                    "testing", "jest", "@jest", "mocha", "vitest", "@testing-library", "chai", "sinon")
+_QUOTED_RE    = re.compile(r"""["'`]([^"'`]+)["'`]""")
+_PY_FROM_RE   = re.compile(r"^from\s+([\w.]+)\s+import\b")
+_PY_IMPORT_RE = re.compile(r"^import\s+([\w.]+(?:\s+as\s+\w+)?(?:\s*,\s*[\w.]+(?:\s+as\s+\w+)?)*)\s*$")
+_JAVA_RE      = re.compile(r"^import\s+(?:static\s+)?([\w.]+)")
+
+
+def _norm_path(path: str) -> str:
+    return (path or "").replace("\\", "/")
+
+
+def is_test_path(path: str) -> bool:
+    p = _norm_path(path)
+    return bool(_TEST_DIR_RE.search(p) or _TEST_FILE_RE.search(p))
+
+
+def imported_modules(statement: str) -> List[str]:
+    """Module names a raw import statement (as cpg_builder records it) imports."""
+    statement = (statement or "").strip()
+    m = _PY_FROM_RE.match(statement)
+    if m:
+        return [m.group(1)]
+    m = _PY_IMPORT_RE.match(statement)
+    if m:
+        return [part.split()[0] for part in m.group(1).split(",")]
+    quoted = _QUOTED_RE.findall(statement)          # JS / TS `from 'x'`, Go `"x"`
+    if quoted:
+        return quoted
+    m = _JAVA_RE.match(statement)
+    return [m.group(1)] if m else []
+
+
+def _is_test_framework(module_name: str) -> bool:
+    return any(module_name == fw or module_name.startswith((fw + ".", fw + "/")) for fw in _TEST_FRAMEWORKS)
+
+
+def _imports_test_framework(imports: List[str]) -> bool:
+    return any(_is_test_framework(name) for imp in imports for name in imported_modules(imp))
+
+
+def _test_reason(node: Dict, test_files: Dict[str, str]) -> Optional[str]:
+    # Only whole files are test code: a `test_connection` or `TestRunner` in
+    # application code is production code and keeps its analysis
+    return test_files.get(node.get("file"))
+
+# ---------------------------------------------------------------------------
+# POLICY
+# ---------------------------------------------------------------------------
+
+def _checked(key: str, value: str, source: str) -> str:
+    """A policy value if it is one of the key's choices, otherwise the default (with a warning)."""
+    value = str(value).strip().lower()
+    if value in POLICY_CHOICES[key]:
+        return value
+    print(f"[Scope] Warning: ignoring {source}={value!r} (expected {' | '.join(POLICY_CHOICES[key])}); "
+          f"using {DEFAULT_POLICY[key]}")
+    return DEFAULT_POLICY[key]
+
+
+def load_scope_policy() -> Dict[str, str]:
+    """DEFAULT_POLICY overridden by SCOPE_UNREACHABLE / SCOPE_TESTS / SCOPE_DEAD_MODULES."""
+    policy = dict(DEFAULT_POLICY)
+    for key in policy:
+        env = f"SCOPE_{key.upper()}"
+        value = os.getenv(env)
+        if value:
+            policy[key] = _checked(key, value, env)
+    return policy
+
+
+def _decide(node: Dict, decision: str, reason: str):
+    node["analysis_scope"] = {"decision": decision, "reason": reason}
+
+
+def apply_scope_policy(nodes: List[Dict], edges: List[Dict],
+                       policy: Optional[Dict[str, str]] = None,
+                       module_imports: Optional[Dict[str, List[str]]] = None) -> Dict:
+    """
+    Record an `analysis_scope` decision on every node and return a report
+    with per-decision counts and the estimated LLM-call savings.
+
+    module_imports is build_cpg's {module_id: [raw import statements]}
+    (cpg_data["imports"]); module nodes themselves carry no imports.
+    """
+    policy  = {key: _checked(key, value, key) if key in POLICY_CHOICES else value
+               for key, value in {**DEFAULT_POLICY, **(policy or {})}.items()}
+    module_imports = module_imports or {}
+    by_id   = {n["id"]: n for n in nodes if n.get("id")}
+    modules = [n for n in by_id.values() if n.get("type") == "module"]
+    members: Dict[str, List[Dict]] = {m["id"]: [] for m in modules}
+    module_of_file = {m.get("file"): m["id"] for m in modules}
+    scoped = [n for n in by_id.values() if n.get("type") in SCOPED_TYPES]
+    for n in scoped:
+        mid = module_of_file.get(n.get("file"))
+        if mid and n["id"] != mid:
+            members[mid].append(n)
+
+    for n in by_id.values():
+        _decide(n, "analyse", "in scope")
+
+    has_entries = any(n.get("is_entry_point") for n in by_id.values())
+
+    # 1. Tests / fixtures
+    test_files = {}
+    for m in modules:
+        if is_test_path(m.get("file", "")):
+            test_files[m.get("file")] = "test / fixture path"
+        elif _imports_test_framework(module_imports.get(m["id"]) or m.get("imports", [])):
+            test_files[m.get("file")] = "imports a test framework"
+    if policy["tests"] != "analyse":
+        for n in scoped:
+            reason = _test_reason(n, test_files)
+            if reason:
+                _decide(n, policy["tests"], reason)
+
+    # 2. Dead modules — nobody imports them, no entry point, nothing reachable
+    if policy["dead_modules"] == "collapse" and has_entries:
+        imported = {e["target"] for e in edges
+                    if e.get("type") == "depends_on" and e.get("source") != e.get("target")}
+        for m in modules:
+            if m["analysis_scope"]["decision"] != "analyse" or m["id"] in imported:
+                continue
+            code = [n for n in members[m["id"]] if n.get("type") in ("function", "class")]
+            if not code or any(n.get("is_entry_point") or n.get("depth_from_entry", -1) != -1 for n in code):
+                continue
+            _decide(m, "deprioritise", f"dead module ({len(code)} members collapsed)")
+            for n in members[m["id"]]:
+                n["analysis_scope"] = {"decision": "collapsed", "reason": "member of a dead module",
+                                       "collapsed_into": m["id"]}
+
+    # 3. Unreachable functions
+    if policy["unreachable"] != "analyse" and has_entries:
+        for n in scoped:
+            if (n.get("type") == "function" and n["analysis_scope"]["decision"] == "analyse"
+                    and n.get("depth_from_entry", -1) == -1 and not n.get("is_entry_point")):
+                _decide(n, policy["unreachable"], "unreachable from every entry point")
+
+    return _scope_report(list(by_id.values()), policy, has_entries)
+
+# ---------------------------------------------------------------------------
+# SAVINGS ESTIMATE
+# ---------------------------------------------------------------------------
+
+def _likely_sentinel(node: Dict) -> bool:
+    """Static guess at whether a node would reach the Sentinel."""
+    if node.get("type") != "function":
+        return False
+    if any(f.get("kind") == "sink" and f.get("confidence", 0) >= 0.5 for f in node.get("risk_findings", [])):
+        return True
+    taint = (node.get("risk_ast") or {}).get("taint") or {}
+    return bool(taint.get("feasible_path") or node.get("is_entry_point"))
+
+
+def estimate_llm_calls(nodes: List[Dict], scoped: bool = True) -> int:
+    """
+    Mapper + Linker + Sentinel call count for a set of nodes — a lower
+    bound, with every batch filled to its node cap.
+    """
+    mapper = linker = sentinel = 0
+    for n in nodes:
+        decision = n.get("analysis_scope", {}).get("decision", "analyse") if scoped else "analyse"
+        if decision in ("skip", "collapsed"):
+            continue
+        mapper += 1
+        linker += 1
+        if decision == "analyse" and _likely_sentinel(n):
+            sentinel += 1
+    return math.ceil(mapper / MAPPER_BATCH_SIZE) + math.ceil(linker / LINKER_BATCH_SIZE) + sentinel
+
+
+def _scope_report(nodes: List[Dict], policy: Dict[str, str], has_entries: bool) -> Dict:
+    counts = {d: 0 for d in DECISIONS}
+    for n in nodes:
+        counts[n["analysis_scope"]["decision"]] += 1
+    before = estimate_llm_calls(nodes, scoped=False)
+    after  = estimate_llm_calls(nodes, scoped=True)
+    report = {
+        "policy":   policy,
+        "counts":   counts,
+        "estimated_llm_calls": {
+            "without_policy": before,
+            "with_policy":    after,
+            "saved":          before - after,
+            "saved_pct":      round(100.0 * (before - after) / before, 1) if before else 0.0,
+            "basis":          "lower bound — batches at their node caps",
+        },
+    }
+    if not has_entries:
+        report["note"] = "no entry points detected — reachability policies not applied"
+    print(f"[Scope] {counts['skip']} skipped, {counts['collapsed']} collapsed, "
+          f"{counts['deprioritise']} deprioritised — est. LLM calls ≥{before} → ≥{after}")
+    return report
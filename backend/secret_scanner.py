@@ -0,0 +1,167 @@
+"""
+secret_scanner.py - Hard-coded secret detection over string literals
+
+Runs in the parse pass: the CPG walk collects every string literal node it
+visits (no extra tree scan), then each literal goes through
+  - a single compiled alternation of provider-specific token formats
+    (AWS, GitHub, Slack, Stripe, Google, private keys, JWTs, credentialed URLs)
+  - Shannon-entropy scoring, weighted by whether the literal is assigned to a
+    secret-looking name (password, token, api_key, ...)
+Findings use the risk_rules shape (kind "source", category "secret") so they
+are attributed to functions / modules and reach risk_ast like any other
+source. The secret itself is never stored — only a 4-character preview.
+"""
+
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+
+# ---------------------------------------------------------------------------
+# PATTERNS
+# ---------------------------------------------------------------------------
+
+# (rule id, regex, confidence) — merged into one alternation below
+_PROVIDER_PATTERNS = [
+    ("secret.aws-access-key",  r"(?:AKIA|ASIA)[0-9A-Z]{16}",                         0.95),
+    ("secret.github-token",    r"gh[pousr]_[A-Za-z0-9]{36,}",                         0.95),
+    ("secret.slack-token",     r"xox[abposr]-[A-Za-z0-9-]{10,}",                      0.9),
+    ("secret.stripe-key",      r"(?:sk|rk)_live_[0-9A-Za-z]{20,}",                    0.95),
+    ("secret.google-api-key",  r"AIza[0-9A-Za-z_\-]{35}",                             0.9),
+    ("secret.private-key",     r"-----BEGIN (?:RSA |EC |DSA |OPENSSH |PGP )?PRIVATE KEY", 0.95),
+    ("secret.jwt",             r"eyJ[A-Za-z0-9_-]{10,}\.eyJ[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}", 0.8),
+    ("secret.credential-url",  r"[a-z][a-z0-9+.-]*://[^\s:/@]+:[^\s:/@]{3,}@",        0.85),
+    ("secret.api-key-prefix",  r"\bsk-[A-Za-z0-9_-]{32,}",                            0.85),
+]
+
+_PROVIDER_RE = re.compile("|".join(
+    f"(?P<p{i}>{pattern})" for i, (_, pattern, _) in enumerate(_PROVIDER_PATTERNS)
+))
+
+# Literal substrings every provider pattern contains; prose is only regex-
+# searched when one of these is present
+_PROVIDER_ANCHORS = ("AKIA", "ASIA", "gh", "xox", "_live_", "AIza", "PRIVATE KEY", "eyJ", "://", "sk-")
+
+_SECRET_NAME_RE = re.compile(
+    r"(?i)(passw(or)?d|passwd|pwd|secret|token|api_?key|apikey|private_?key|credential|auth_?key|access_?key)"
+)
+
+# Values that are obviously not real secrets
+_PLACEHOLDER_RE = re.compile(
+    r"(?i)^(changeme|password|secret|token|example|dummy|test|xxx+|\*+|<[^>]*>|\$\{[^}]*\}|\{\{[^}]*\}\}|your[_-].*)$"
+)
+
+_HEX_RE = re.compile(r"[0-9a-fA-F]+")
+
+# Letters and separators only: header names, auth schemes, MIME types
+# ("X-Auth-Token", "Bearer", "application/json") held in secret-looking names
+_WORDS_ONLY_RE = re.compile(r"[A-Za-z]+(?:[-_./: ][A-Za-z]+)*")
+
+MIN_LITERAL_LEN  = 8
+MAX_LITERAL_LEN  = 4096   # longer literals are templates / blobs, not keys
+ENTROPY_MIN_LEN  = 20
+ENTROPY_BASE64   = 4.3    # bits per char for mixed-alphabet strings
+ENTROPY_HEX      = 3.0    # bits per char for hex-only strings
+NAMED_MIN_LEN    = 8      # shorter values of secret-looking names are labels, not secrets
+NAMED_ENTROPY    = 2.5    # bits per char a named literal needs ("aaaaaaaa" is not a password)
+
+# String literal node types across the supported grammars
+STRING_LITERAL_TYPES = {
+    "string", "template_string", "string_literal",
+    "interpreted_string_literal", "raw_string_literal",
+}
+
+# Plain words / identifiers ("has_eval", "utf-8") are never scored
+_WORD_RE = re.compile(r"[a-z_.\-]+|[A-Z_]+")
+
+# ---------------------------------------------------------------------------
+# SCORING
+# ---------------------------------------------------------------------------
+
+def shannon_entropy(value: str) -> float:
+    """Bits per character of a string."""
+    if not value:
+        return 0.0
+    n = len(value)
+    return -sum(c / n * math.log2(c / n) for c in Counter(value).values())
+
+
+def _literal_value(raw: str) -> str:
+    """Strip prefixes and quotes from a literal's source text."""
+    raw = raw.lstrip("rRbBuUfF")
+    for quote in ('"""', "'''", '"', "'", "`"):
+        if raw.startswith(quote) and raw.endswith(quote) and len(raw) >= 2 * len(quote):
+            return raw[len(quote):-len(quote)]
+    return raw
+
+
+def _assigned_name(node, source: bytes) -> str:
+    """Name the literal is assigned / passed to, if any (walks up to 3 parents)."""
+    curr = node
+    for _ in range(3):
+        curr = curr.parent
+        if curr is None:
+            return ""
+        for field in ("left", "name", "key"):
+            target = curr.child_by_field_name(field)
+            if target is not None and target.start_byte < node.start_byte:
+                return source[target.start_byte:target.end_byte].decode("utf-8", errors="ignore")
+    return ""
+
+
+def score_literal(value: str, name: str = "") -> Optional[Dict]:
+    """Best secret match for one literal value, or None."""
+    m = _PROVIDER_RE.search(value)
+    if m:
+        rule, _, confidence = _PROVIDER_PATTERNS[int(m.lastgroup[1:])]
+        return {"rule": rule, "confidence": confidence}
+
+    if " " in value or _PLACEHOLDER_RE.match(value):
+        return None
+    named = bool(name and _SECRET_NAME_RE.search(name))
+    if len(value) >= ENTROPY_MIN_LEN:
+        is_hex = bool(_HEX_RE.fullmatch(value))
+        if shannon_entropy(value) >= (ENTROPY_HEX if is_hex else ENTROPY_BASE64):
+            if named:
+                return {"rule": "secret.high-entropy", "confidence": 0.8}
+            if not is_hex:   # unnamed hex is nearly always a hash / id
+                return {"rule": "secret.high-entropy", "confidence": 0.4}
+    if (named and len(value) >= NAMED_MIN_LEN and not _WORDS_ONLY_RE.fullmatch(value)
+            and shannon_entropy(value) >= NAMED_ENTROPY):
+        return {"rule": "secret.named-literal", "confidence": 0.6}
+    return None
+
+# ---------------------------------------------------------------------------
+# EVALUATION
+# ---------------------------------------------------------------------------
+
+def scan_secrets(literals: Iterable, source: bytes) -> List[Dict]:
+    """
+    Secret findings (risk_rules shape) for a file's string literal nodes.
+    Cheap rejections (length, whitespace, plain words) run before any
+    Tree-sitter parent lookups.
+    """
+    findings = []
+    for node in literals:
+        size = node.end_byte - node.start_byte
+        if size < MIN_LITERAL_LEN or size > MAX_LITERAL_LEN:
+            continue
+        value = _literal_value(source[node.start_byte:node.end_byte].decode("utf-8", errors="ignore"))
+        if _WORD_RE.fullmatch(value):
+            continue
+        if (" " in value or "\n" in value) and not (
+                any(a in value for a in _PROVIDER_ANCHORS) and _PROVIDER_RE.search(value)):
+            continue   # prose, SQL, docstrings — unless they embed a token
+        hit = score_literal(value, _assigned_name(node, source))
+        if hit is None:
+            continue
+        findings.append({
+            **hit,
+            "kind":       "source",
+            "category":   "secret",
+            "line":       node.start_point[0] + 1,
+            "preview":    value[:4] + "…",
+            "start_byte": node.start_byte,
+            "end_byte":   node.end_byte,
+        })
+    return findings
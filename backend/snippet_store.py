@@ -0,0 +1,106 @@
+"""
+snippet_store.py - Per-job compressed source snippet store
+
+Node dicts only carry `byte_start` / `byte_end`; the code itself lives in a
+per-job store written once during the parse pass:
+  snippets.pack   — zlib-compressed snippets, one independent stream each
+  snippets.idx    — JSON {node_id: [offset, compressed_len, raw_len]}
+The pack is memory-mapped read-only, so fetching a snippet is one dict lookup
+plus one slice + decompress, independent of repository size, and the store
+survives the upload temp dir being cleaned up.
+"""
+
+import json
+import mmap
+import os
+import zlib
+from typing import Dict, List, Optional
+
+PACK_FILE  = "snippets.pack"
+INDEX_FILE = "snippets.idx"
+
+# Snippets larger than this are truncated on write (generated / minified code)
+MAX_SNIPPET_BYTES = 256 * 1024
+
+
+class SnippetStoreWriter:
+    """Append-only writer used during the parse pass; finalize() makes it immutable."""
+
+    def __init__(self, directory: str, level: int = 6):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.level     = level
+        self._index: Dict[str, List[int]] = {}
+        self._pack   = open(os.path.join(directory, PACK_FILE + ".tmp"), "wb")
+        self._offset = 0
+        self._raw    = 0
+
+    def add(self, node_id: str, snippet: bytes):
+        # build_cpg keeps the last node for a duplicate id (property getter /
+        # setter, redefinitions), so the last definition wins here too; the
+        # earlier one stays in the pack unreferenced
+        if node_id in self._index:
+            self._raw -= self._index[node_id][2]
+        snippet = snippet[:MAX_SNIPPET_BYTES]
+        packed  = zlib.compress(snippet, self.level)
+        self._pack.write(packed)
+        self._index[node_id] = [self._offset, len(packed), len(snippet)]
+        self._offset += len(packed)
+        self._raw    += len(snippet)
+
+    def finalize(self) -> "SnippetStore":
+        """Flush, atomically publish pack + index, and return a reader."""
+        self._pack.close()
+        os.replace(self._pack.name, os.path.join(self.directory, PACK_FILE))
+        idx_tmp = os.path.join(self.directory, INDEX_FILE + ".tmp")
+        with open(idx_tmp, "w") as f:
+            json.dump(self._index, f, separators=(",", ":"))
+        os.replace(idx_tmp, os.path.join(self.directory, INDEX_FILE))
+        ratio = self._raw / self._offset if self._offset else 0.0
+        print(f"[Snippets] Stored {len(self._index)} snippets "
+              f"({self._raw // 1024} KB → {self._offset // 1024} KB, {ratio:.1f}x)")
+        return SnippetStore(self.directory)
+
+
+class SnippetStore:
+    """Read-only, memory-mapped view over a finalized store."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE)) as f:
+            self._index: Dict[str, List[int]] = json.load(f)
+        self._file = open(os.path.join(directory, PACK_FILE), "rb")
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+
+    def __contains__(self, node_id: str) -> bool:
+        return node_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get(self, node_id: str, max_bytes: Optional[int] = None) -> Optional[str]:
+        """
+        Source of a node, or None. With max_bytes the snippet is cut at the
+        last full line that fits and a truncation marker is appended.
+        """
+        entry = self._index.get(node_id)
+        if entry is None or self._map is None:
+            return None
+        offset, size, raw_len = entry
+        raw = zlib.decompress(self._map[offset:offset + size])
+        if max_bytes is not None and raw_len > max_bytes:
+            cut = raw.rfind(b"\n", 0, max_bytes)
+            raw = raw[:cut if cut > 0 else max_bytes]
+            return raw.decode("utf-8", errors="ignore") + f"\n... [truncated, {raw_len - len(raw)} more bytes]"
+        return raw.decode("utf-8", errors="ignore")
+
+    def size(self, node_id: str) -> int:
+        """Uncompressed snippet size in bytes (0 if absent)."""
+        entry = self._index.get(node_id)
+        return entry[2] if entry else 0
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
@@ -0,0 +1,340 @@
+"""
+triage_model.py - Local triage model in front of the Mapper
+
+Most of what the Mapper sees is structured: security flags, risk_ast
+sources / sinks, rule findings, complexity and graph metrics. A small
+CPU-only model trained on those features and the Mapper's own past
+answers predicts risk_tier and classification with a calibrated
+confidence; nodes it is confident about skip the Mapper call, the rest
+are batched to it as before. Tier floors, hard signals and the scope cap
+still apply on top of a local prediction, exactly as on the Mapper's.
+
+  - LabelLog: every Mapper classification the orchestrator applies is
+    appended (features + answer, keyed by the node's cache key) to a JSON
+    lines file, so labels accumulate with normal use
+  - train: gradient boosting per target (tier, classification), each
+    calibrated (CalibratedClassifierCV) so its probabilities can gate the
+    Mapper; a stable share of the labels is held out for the report
+  - evaluate: agreement with held-out Mapper labels — accuracy, the share
+    of nodes above the confidence threshold (Mapper calls saved), agreement
+    and under-tiering on that share, calibration error and a tier confusion
+    matrix
+
+GNN embeddings are computed after the orchestrator runs (main.py), so the
+model uses only features the node carries at triage time.
+
+Configured through the environment:
+  TRIAGE_LABELS_PATH  label log ("off" disables recording)
+  TRIAGE_MODEL_PATH   trained model ("off" or a missing file: every node goes to the Mapper)
+  TRIAGE_CONFIDENCE   minimum calibrated confidence to skip the Mapper (default 0.9)
+
+Run from the backend directory:
+    python triage_model.py train    [--labels PATH] [--out triage_model.pkl] [--holdout 0.2]
+    python triage_model.py evaluate [--labels PATH] [--model triage_model.pkl]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_LABELS_PATH = os.path.join(tempfile.gettempdir(), "codeforge_triage_labels.jsonl")
+DEFAULT_MODEL_PATH  = os.path.join(os.path.dirname(os.path.abspath(__file__)), "triage_model.pkl")
+DEFAULT_CONFIDENCE  = 0.9
+HOLDOUT_SHARE       = 0.2
+MIN_LABELS          = 100    # fewer and the report says nothing
+MIN_CLASS_LABELS    = 5      # rarer answers are left to the Mapper
+CALIBRATION_BINS    = 10
+REPORT_THRESHOLDS   = (0.7, 0.8, 0.9, 0.95)
+
+FLAG_FEATURES = (
+    "has_eval", "has_shell_call", "has_file_access", "has_env_access", "has_hardcoded_secret",
+    "has_lock_usage", "has_async_await", "has_try_catch", "has_loop", "has_conditional", "is_entry_point",
+)
+NUMERIC_FEATURES = (
+    "loc", "cyclomatic_complexity", "cognitive_complexity", "max_nesting", "fan_in", "fan_out",
+    "betweenness_centrality", "depth_from_entry", "reachable_sink_count", "blast_radius_score",
+)
+NODE_TYPES = ("function", "class", "module")
+
+
+def triage_features(node: Dict) -> Dict[str, float]:
+    """Named numeric features of a node, from what it carries before the Mapper runs."""
+    features = {k: float(bool(node.get(k))) for k in FLAG_FEATURES}
+    for k in NUMERIC_FEATURES:
+        value = node.get(k)
+        features[k] = float(value) if isinstance(value, (int, float)) else -1.0
+    for t in NODE_TYPES:
+        features[f"type_{t}"] = float(node.get("type") == t)
+    risk_ast = node.get("risk_ast") or {}
+    taint    = risk_ast.get("taint") or {}
+    findings = [f for f in node.get("risk_findings", []) if isinstance(f, dict)]
+    sinks    = [f for f in findings if f.get("kind") == "sink" and not f.get("sanitized")]
+    features.update({
+        "ast_sources":       float(len(risk_ast.get("sources", []))),
+        "ast_sinks":         float(len(risk_ast.get("sinks", []))),
+        "ast_entry":         float(bool(risk_ast.get("entry"))),
+        "ast_external":      float(len(risk_ast.get("external_interactions", []))),
+        "taint_summary":     float(bool(taint)),
+        "taint_path":        float(bool(taint.get("feasible_path"))),
+        "findings":          float(len(findings)),
+        "sink_findings":     float(len(sinks)),
+        "max_sink_confidence": max((f.get("confidence", 0.0) for f in sinks), default=0.0),
+        "calls":             float(len(node.get("calls", []))),
+        "api_calls":         float(len(node.get("api_calls", []))),
+        "parameters":        float(len(node.get("parameters", []))),
+        "imports":           float(len(node.get("imports", []))),
+        "scope_deprioritise": float((node.get("analysis_scope") or {}).get("decision") == "deprioritise"),
+    })
+    return features
+
+
+FEATURE_NAMES: Tuple[str, ...] = tuple(triage_features({}))
+
+
+def _matrix(feature_dicts: List[Dict[str, float]]) -> np.ndarray:
+    return np.array([[f.get(name, 0.0) for name in FEATURE_NAMES] for f in feature_dicts], dtype=float)
+
+# ---------------------------------------------------------------------------
+# LABELS
+# ---------------------------------------------------------------------------
+
+class LabelLog:
+    """Append-only JSON-lines log of Mapper answers with the node's features. Thread-safe."""
+
+    def __init__(self, path: str = DEFAULT_LABELS_PATH):
+        self.path  = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> Optional["LabelLog"]:
+        path = os.getenv("TRIAGE_LABELS_PATH", DEFAULT_LABELS_PATH)
+        if path.strip().lower() in ("", "off", "none", "0"):
+            return None
+        return cls(path)
+
+    def record(self, key: str, node: Dict, classification: Dict, model_id: str = ""):
+        """One Mapper answer (risk_tier, classification) for the node with cache key `key`."""
+        line = json.dumps({
+            "key": key, "features": triage_features(node), "model": model_id, "time": round(time.time()),
+            "risk_tier": max(0, min(3, int(classification.get("risk_tier", 1)))),
+            "classification": str(classification.get("classification", "unknown")),
+        })
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    @staticmethod
+    def read(path: str) -> List[Dict]:
+        """Labels in the file, one per key (the latest answer wins)."""
+        labels: Dict[str, Dict] = {}
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue   # a line cut short by a crash
+                labels[record["key"]] = record
+        return list(labels.values())
+
+# ---------------------------------------------------------------------------
+# MODEL
+# ---------------------------------------------------------------------------
+
+class TriageModel:
+    """Calibrated tier and classification models; predict() gates the Mapper."""
+
+    def __init__(self, tier_model, class_model, threshold: float = DEFAULT_CONFIDENCE,
+                 meta: Optional[Dict[str, Any]] = None):
+        self.tier_model  = tier_model
+        self.class_model = class_model
+        self.threshold   = threshold
+        self.meta        = meta or {}
+
+    @classmethod
+    def from_env(cls) -> Optional["TriageModel"]:
+        path = os.getenv("TRIAGE_MODEL_PATH", DEFAULT_MODEL_PATH)
+        if path.strip().lower() in ("", "off", "none", "0") or not os.path.exists(path):
+            return None
+        model = cls.load(path)
+        model.threshold = float(os.getenv("TRIAGE_CONFIDENCE", model.threshold))
+        return model
+
+    @classmethod
+    def load(cls, path: str) -> "TriageModel":
+        # Only load models you trained: unpickling runs code
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if tuple(state["features"]) != FEATURE_NAMES:
+            raise ValueError("triage model was trained on other features — retrain it")
+        return cls(state["tier"], state["classification"], state["threshold"], state["meta"])
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            pickle.dump({"tier": self.tier_model, "classification": self.class_model,
+                         "threshold": self.threshold, "features": FEATURE_NAMES, "meta": self.meta}, f)
+
+    def predict_proba(self, feature_dicts: List[Dict[str, float]]) -> List[Tuple[int, str, float]]:
+        """(tier, classification, confidence) per node; confidence is the lower of the two."""
+        if not feature_dicts:
+            return []
+        X = _matrix(feature_dicts)
+        tier_p, class_p = self.tier_model.predict_proba(X), self.class_model.predict_proba(X)
+        tiers, classes  = self.tier_model.classes_, self.class_model.classes_
+        out = []
+        for tp, cp in zip(tier_p, class_p):
+            t, c = int(np.argmax(tp)), int(np.argmax(cp))
+            out.append((int(tiers[t]), str(classes[c]), float(min(tp[t], cp[c]))))
+        return out
+
+    def predict(self, nodes: List[Dict]) -> List[Optional[Dict]]:
+        """A Mapper-shaped classification per node, or None where the model is not confident."""
+        out: List[Optional[Dict]] = []
+        for tier, classification, confidence in self.predict_proba([triage_features(n) for n in nodes]):
+            if confidence < self.threshold:
+                out.append(None)
+                continue
+            out.append({"risk_tier": tier, "classification": classification,
+                        "deep_reasoning_required": tier == 3, "confidence": round(confidence, 3)})
+        return out
+
+
+def _holdout(key: str, share: float) -> bool:
+    return int(hashlib.md5(key.encode()).hexdigest()[:8], 16) % 1000 < share * 1000
+
+
+def _fit(X: np.ndarray, y: np.ndarray, seed: int):
+    from sklearn.calibration import CalibratedClassifierCV
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    labels, counts = np.unique(y, return_counts=True)
+    common = labels[counts >= MIN_CLASS_LABELS]
+    if len(common) < 2:
+        raise ValueError(f"need at least two answers with {MIN_CLASS_LABELS}+ labels each")
+    keep = np.isin(y, common)
+    X, y = X[keep], y[keep]
+    base = HistGradientBoostingClassifier(max_iter=200, learning_rate=0.1, max_leaf_nodes=15,
+                                          l2_regularization=1.0, random_state=seed)
+    folds = max(2, min(5, int(counts[counts >= MIN_CLASS_LABELS].min())))
+    model = CalibratedClassifierCV(base, method="isotonic" if len(y) >= 1000 else "sigmoid", cv=folds)
+    return model.fit(X, y)
+
+
+def train(labels: List[Dict], holdout_share: float = HOLDOUT_SHARE, threshold: float = DEFAULT_CONFIDENCE,
+          seed: int = 0) -> Tuple[TriageModel, Dict[str, Any]]:
+    """Fit on the labels outside the holdout; the report is on the holdout."""
+    if len(labels) < MIN_LABELS:
+        raise ValueError(f"{len(labels)} labels — need at least {MIN_LABELS} Mapper answers to train")
+    train_set = [r for r in labels if not _holdout(r["key"], holdout_share)]
+    test_set  = [r for r in labels if _holdout(r["key"], holdout_share)]
+    X = _matrix([r["features"] for r in train_set])
+    model = TriageModel(
+        _fit(X, np.array([r["risk_tier"] for r in train_set]), seed),
+        _fit(X, np.array([r["classification"] for r in train_set]), seed),
+        threshold,
+        {"trained": time.strftime("%Y-%m-%dT%H:%M:%S"), "labels": len(train_set), "holdout": len(test_set),
+         "holdout_share": holdout_share},
+    )
+    report = evaluate(model, test_set)
+    model.meta["holdout_report"] = report
+    return model, report
+
+
+def evaluate(model: TriageModel, labels: List[Dict]) -> Dict[str, Any]:
+    """Agreement with the Mapper labels given (held-out ones, to be meaningful)."""
+    if not labels:
+        return {"labels": 0}
+    predicted = model.predict_proba([r["features"] for r in labels])
+    tiers     = np.array([r["risk_tier"] for r in labels])
+    classes   = np.array([r["classification"] for r in labels])
+    p_tier    = np.array([p[0] for p in predicted])
+    p_class   = np.array([p[1] for p in predicted])
+    conf      = np.array([p[2] for p in predicted])
+    tier_ok, class_ok = p_tier == tiers, p_class == classes
+
+    def at(threshold: float) -> Dict[str, float]:
+        covered = conf >= threshold
+        n = int(covered.sum())
+        return {
+            "threshold": threshold, "coverage": round(n / len(labels), 3),
+            "tier_agreement":  round(float(tier_ok[covered].mean()), 3) if n else None,
+            "class_agreement": round(float(class_ok[covered].mean()), 3) if n else None,
+            "under_tier_rate": round(float((p_tier[covered] < tiers[covered]).mean()), 3) if n else None,
+        }
+
+    # Expected calibration error: |accuracy - confidence| per confidence bin, weighted
+    both_ok = tier_ok & class_ok
+    bins    = np.minimum((conf * CALIBRATION_BINS).astype(int), CALIBRATION_BINS - 1)
+    ece = sum(abs(both_ok[bins == b].mean() - conf[bins == b].mean()) * (bins == b).sum()
+              for b in range(CALIBRATION_BINS) if (bins == b).any()) / len(labels)
+    return {
+        "labels": len(labels),
+        "tier_accuracy":  round(float(tier_ok.mean()), 3),
+        "class_accuracy": round(float(class_ok.mean()), 3),
+        "calibration_error": round(float(ece), 3),
+        "at_threshold": at(model.threshold),
+        "thresholds": [at(t) for t in REPORT_THRESHOLDS],
+        "tier_confusion": [[int(((tiers == t) & (p_tier == p)).sum()) for p in range(4)] for t in range(4)],
+    }
+
+
+def print_report(report: Dict[str, Any]):
+    if not report.get("labels"):
+        print("[Triage] No held-out labels to report on.")
+        return
+    print(f"[Triage] {report['labels']} held-out Mapper labels: tier accuracy {report['tier_accuracy']:.1%}, "
+          f"classification accuracy {report['class_accuracy']:.1%}, "
+          f"calibration error {report['calibration_error']:.3f}")
+    for row in report["thresholds"]:
+        if row["coverage"]:
+            print(f"[Triage]   confidence ≥ {row['threshold']:.2f}: {row['coverage']:6.1%} skip the Mapper — "
+                  f"tier agreement {row['tier_agreement']:.1%}, classification {row['class_agreement']:.1%}, "
+                  f"under-tiered {row['under_tier_rate']:.1%}")
+        else:
+            print(f"[Triage]   confidence ≥ {row['threshold']:.2f}: no node confident enough")
+    print("[Triage]   tier confusion (rows: Mapper tier 0-3, columns: predicted):")
+    for t, row in enumerate(report["tier_confusion"]):
+        print(f"[Triage]     {t}: " + " ".join(f"{n:6d}" for n in row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="command", required=True)
+    train_cmd = sub.add_parser("train", help="fit on the label log; report on a held-out share")
+    train_cmd.add_argument("--labels", default=os.getenv("TRIAGE_LABELS_PATH", DEFAULT_LABELS_PATH))
+    train_cmd.add_argument("--out", default=os.getenv("TRIAGE_MODEL_PATH", DEFAULT_MODEL_PATH))
+    train_cmd.add_argument("--holdout", type=float, default=HOLDOUT_SHARE)
+    train_cmd.add_argument("--threshold", type=float, default=DEFAULT_CONFIDENCE)
+    eval_cmd = sub.add_parser("evaluate", help="report a trained model on the held-out labels")
+    eval_cmd.add_argument("--labels", default=os.getenv("TRIAGE_LABELS_PATH", DEFAULT_LABELS_PATH))
+    eval_cmd.add_argument("--model", default=os.getenv("TRIAGE_MODEL_PATH", DEFAULT_MODEL_PATH))
+    eval_cmd.add_argument("--all", action="store_true", help="every label, not only the held-out ones")
+    args = parser.parse_args()
+
+    labels = LabelLog.read(args.labels)
+    print(f"[Triage] {len(labels)} Mapper labels in {args.labels}")
+    if args.command == "train":
+        model, report = train(labels, args.holdout, args.threshold)
+        model.save(args.out)
+        print(f"[Triage] Saved model to {args.out} ({model.meta['labels']} training labels)")
+    else:
+        model = TriageModel.load(args.model)
+        if not args.all:
+            share  = model.meta.get("holdout_share", HOLDOUT_SHARE)
+            labels = [r for r in labels if _holdout(r["key"], share)]
+        report = evaluate(model, labels)
+    print_report(report)
+
+
+if __name__ == "__main__":
+    main()